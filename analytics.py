@@ -0,0 +1,91 @@
+"""
+歷史資料查詢：讀 archive_store 寫入的 Parquet（只讀需要的日期分區與欄位），不碰 Google Sheets。
+
+- missions_per_township_per_day：每天各鄉鎮市區的任務數
+- fill_rate_by_skill：各能力需求的媒合率（已報名人數 / 需求人數）
+- signups_per_day：每天的報名數（志工自行報名 / 協調者指派）
+
+start / end 為 "YYYY-MM-DD"（含），不給代表不限。
+"""
+import os
+
+import pandas as pd
+
+from archive_store import ARCHIVE_DIR, PARTITION_KEY, SIGNUP_COLUMNS, SIGNUP_DATASET, SNAPSHOT_DATASET
+from facet_index import FACET_OPTIONS, facet_token
+from search_index import parse_region
+
+
+def _date_filters(start, end):
+    filters = []
+    if start:
+        filters.append((PARTITION_KEY, ">=", str(start)))
+    if end:
+        filters.append((PARTITION_KEY, "<=", str(end)))
+    return filters or None
+
+
+def read_dataset(dataset, start=None, end=None, columns=None, root=ARCHIVE_DIR) -> pd.DataFrame:
+    """讀某個資料集在日期區間內的所有分區，多一欄 day（封存日期字串）；沒有資料時回傳空的 DataFrame"""
+    path = os.path.join(root, dataset)
+    if not os.path.isdir(path) or not os.listdir(path):
+        return pd.DataFrame(columns=(columns or []) + [PARTITION_KEY])
+    if columns is not None:
+        columns = list(columns) + [PARTITION_KEY]
+    df = pd.read_parquet(path, columns=columns, filters=_date_filters(start, end))
+    return df.assign(**{PARTITION_KEY: df[PARTITION_KEY].astype(str)})
+
+
+def load_missions(start=None, end=None, columns=None, root=ARCHIVE_DIR) -> pd.DataFrame:
+    """每日快照中的受災戶任務（demand_worker > 0）"""
+    base = ["role", "demand_worker"]
+    cols = None if columns is None else list(dict.fromkeys(base + list(columns)))
+    df = read_dataset(SNAPSHOT_DATASET, start, end, cols, root)
+    return df[(df["role"] == "victim") & (df["demand_worker"] > 0)].reset_index(drop=True)
+
+
+# ---------- 查詢 ----------
+def missions_per_township_per_day(start=None, end=None, root=ARCHIVE_DIR) -> pd.DataFrame:
+    """列為日期、欄為鄉鎮市區的任務數（解析不出鄉鎮的地址歸在「未知」）"""
+    df = load_missions(start, end, ["address"], root)
+    if df.empty:
+        return pd.DataFrame()
+    # 同一個地址每天都會出現，只解析一次
+    township = {a: parse_region(a)[1] or "未知" for a in df["address"].unique()}
+    df = df.assign(township=df["address"].map(township))
+    return df.pivot_table(index=PARTITION_KEY, columns="township", values="demand_worker",
+                          aggfunc="size", fill_value=0)
+
+
+def fill_rate_by_skill(start=None, end=None, root=ARCHIVE_DIR) -> pd.DataFrame:
+    """
+    各能力需求的任務數、需求人數、已報名人數與媒合率。
+    一個任務需要多種能力時，每一種都算一次；沒有填能力的任務不列入。
+    """
+    df = load_missions(start, end, ["id_number", "skills", "selected_worker"], root)
+    columns = ["skill", "missions", "demand", "selected", "fill_rate"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    df = df.assign(skill=df["skills"].str.split(",")).explode("skill")
+    df["skill"] = df["skill"].map(facet_token)
+    df = df[df["skill"] != ""]
+    # 同一個任務重複填同一種能力只算一次
+    df = df.drop_duplicates(subset=[PARTITION_KEY, "id_number", "skill"])
+    out = df.groupby("skill").agg(
+        missions=("demand_worker", "size"),
+        demand=("demand_worker", "sum"),
+        selected=("selected_worker", "sum"),
+    )
+    out["fill_rate"] = (out["selected"].clip(upper=out["demand"]) / out["demand"]).round(3)
+    order = [s for s in FACET_OPTIONS["skills"] if s in out.index]
+    order += [s for s in out.index if s not in order]
+    return out.loc[order].reset_index()[columns]
+
+
+def signups_per_day(start=None, end=None, root=ARCHIVE_DIR) -> pd.DataFrame:
+    """列為日期、欄為報名來源（self / coordinator）的報名數"""
+    df = read_dataset(SIGNUP_DATASET, start, end, SIGNUP_COLUMNS, root)
+    if df.empty:
+        return pd.DataFrame()
+    return df.pivot_table(index=PARTITION_KEY, columns="source", values="task_id",
+                          aggfunc="size", fill_value=0)
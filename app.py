@@ -1,25 +1,19 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from sheet_store import get_spreadsheet
+from sheet_writer import WRITE_ACK_TIMEOUT, get_writer
 
 # ---------- Google Sheet 連線 ----------
-# 從 Streamlit Secrets 讀取 Service Account 資訊
-from google.oauth2.service_account import Credentials
-creds = Credentials.from_service_account_info(
-    st.secrets["google"],
-    scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-)
-
-# 授權
-gc = gspread.authorize(creds)
-
+# 共用 sheet_store 裡已授權的 client（整個 process 只授權一次）
 # 打開你的 Google Sheet，假設名稱為 "志工受災戶表單"
-sheet_id = "1PbYajOLCW3p5vsxs958v-eCPgHC1_DnHf9G_mcFx9C0"  # 從網址取得
-sheet = gc.open_by_key(sheet_id).sheet1
+@st.cache_resource
+def get_form_sheet():
+    """第一個工作表（只在 process 啟動時查一次 metadata，不是每次 rerun）"""
+    return get_spreadsheet().sheet1
+
+
+sheet = get_form_sheet()
 
 
 # ---------- Streamlit 表單 ----------
@@ -38,8 +32,16 @@ if st.button("送出"):
         new_data = pd.DataFrame([[role, name, phone, line_id]],
                                 columns=["身份", "姓名", "電話", "Line ID"])
         
-        # 2️⃣ 寫入 Google Sheet
-        sheet.append_row([role, name, phone, line_id])
+        # 2️⃣ 寫入 Google Sheet（等背景寫入器確認；逾時代表已排入佇列、稍後寫入）
+        future = get_writer().append_row([role, name, phone, line_id], worksheet=sheet.title)
+        try:
+            future.result(timeout=WRITE_ACK_TIMEOUT)
+        except FutureTimeoutError:
+            st.info("⏳ 系統忙碌中，資料將於稍後寫入。")
+        except Exception as e:
+            st.error("❌ 寫入失敗，請稍後再試。")
+            st.error(str(e))
+            st.stop()
         
         # 3️⃣ 本地備份 CSV（可選）
         import os
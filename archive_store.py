@@ -0,0 +1,133 @@
+"""
+歷史資料封存（Parquet，依日期分區），給協調者做跨日分析，不需要再讀 Google Sheets。
+
+目錄結構（ARCHIVE_DIR 底下）：
+    vol/day=YYYY-MM-DD/part-0.parquet        每天下架前的整份 vol 快照（每天一份）
+    signups/day=YYYY-MM-DD/part-<id>.parquet 報名事件（報名當天的日期）
+    signups_pending.jsonl                     尚未整理成 Parquet 的報名事件
+
+- 報名成功時 record_signup() 只在 pending 檔尾端加一行（便宜、重啟不會遺失）
+- 每晚下架前 archive_day() 寫當天快照，並把 pending 事件整理成 Parquet
+- 同一天的快照只寫一次：其他 process 已經下架過（需求已清空）時不會覆蓋掉正確的快照
+- 寫檔先寫暫存檔再 os.replace，讀取端不會讀到寫一半的檔案
+
+需要 pyarrow。查詢見 analytics.py。
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from sheet_store import FLOAT_COLUMNS, INT_COLUMNS, VOL_COLUMNS
+
+ARCHIVE_DIR = "archive"
+SNAPSHOT_DATASET = "vol"
+SIGNUP_DATASET = "signups"
+PENDING_SIGNUPS = "signups_pending.jsonl"
+PARTITION_KEY = "day"      # 不用 date：vol 本身已經有 date（任務日期）欄位
+
+# 快照保留的欄位：原始欄位 + 標準化後的電話（跨日比對同一個人用）
+SNAPSHOT_COLUMNS = VOL_COLUMNS + ["phone_norm"]
+SIGNUP_COLUMNS = ["event_time", "task_id", "volunteer_name", "volunteer_phone", "source"]
+
+TAIWAN_TZ = timezone(timedelta(hours=8))
+
+_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def partition_dir(dataset, day, root=ARCHIVE_DIR):
+    return os.path.join(root, dataset, f"{PARTITION_KEY}={day}")
+
+
+def _write_parquet(df, path):
+    """先寫暫存檔再換名，讀取端不會看到寫一半的檔案（. 開頭的檔案讀取時會略過）"""
+    folder, name = os.path.split(path)
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".{name}.{uuid.uuid4().hex}.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+# ---------- 每日快照 ----------
+def snapshot_frame(df) -> pd.DataFrame:
+    """把 vol 資料整理成固定欄位與型別（Parquet 每一欄只能有一種型別）"""
+    df = df.reindex(columns=SNAPSHOT_COLUMNS)
+    out = {}
+    for c in SNAPSHOT_COLUMNS:
+        if c in INT_COLUMNS:
+            out[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype("int64")
+        elif c in FLOAT_COLUMNS:
+            out[c] = pd.to_numeric(df[c], errors="coerce").astype("float64")
+        else:
+            out[c] = df[c].fillna("").astype(str)
+    return pd.DataFrame(out)
+
+
+def write_snapshot(df, date, root=ARCHIVE_DIR) -> bool:
+    """寫入某天的 vol 快照；該天已經有快照時不覆蓋，回傳是否有寫入"""
+    path = os.path.join(partition_dir(SNAPSHOT_DATASET, date, root), "part-0.parquet")
+    if os.path.exists(path):
+        return False
+    _write_parquet(snapshot_frame(df), path)
+    return True
+
+
+# ---------- 報名事件 ----------
+def record_signup(task_id, vol_name, vol_phone, source="self", now=None, root=ARCHIVE_DIR):
+    """
+    記錄一筆報名成功的事件（source：self 志工自行報名 / coordinator 協調者批次指派）。
+    只在 pending 檔加一行；整理成 Parquet 由 compact_signups() 負責。
+    寫檔失敗只記 log，不影響報名本身。
+    """
+    now = (now or datetime.now(TAIWAN_TZ)).astimezone(TAIWAN_TZ)
+    event = {
+        "event_time": now.isoformat(timespec="seconds"),
+        "task_id": int(task_id),
+        "volunteer_name": str(vol_name),
+        "volunteer_phone": str(vol_phone),
+        "source": source,
+    }
+    line = json.dumps(event, ensure_ascii=False) + "\n"
+    try:
+        os.makedirs(root, exist_ok=True)
+        with _lock, open(os.path.join(root, PENDING_SIGNUPS), "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError:
+        logger.exception("報名事件寫入失敗")
+
+
+def compact_signups(root=ARCHIVE_DIR) -> int:
+    """
+    把 pending 檔的事件依報名日期寫成 Parquet，回傳整理的筆數。
+    先把 pending 檔換名再處理，整理期間新的報名會寫進新的 pending 檔，不會遺失。
+    """
+    pending = os.path.join(root, PENDING_SIGNUPS)
+    with _lock:
+        if not os.path.exists(pending):
+            return 0
+        claimed = f"{pending}.{uuid.uuid4().hex}.claimed"
+        os.replace(pending, claimed)
+
+    with open(claimed, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    if events:
+        df = pd.DataFrame(events).reindex(columns=SIGNUP_COLUMNS)
+        df["task_id"] = df["task_id"].astype("int64")
+        part = f"part-{uuid.uuid4().hex}.parquet"
+        for day, group in df.groupby(df["event_time"].str[:10]):
+            _write_parquet(group, os.path.join(partition_dir(SIGNUP_DATASET, day, root), part))
+    os.remove(claimed)
+    return len(events)
+
+
+# ---------- 每晚封存 ----------
+def archive_day(repo, date, root=ARCHIVE_DIR) -> bool:
+    """下架前呼叫：寫入當天快照並整理報名事件；回傳快照是否有寫入（該天已有快照時為 False）"""
+    written = write_snapshot(repo.read_all(), date, root)
+    compact_signups(root)
+    return written
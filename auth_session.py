@@ -0,0 +1,145 @@
+"""
+登入 session：登入（或在任一頁驗證身分）一次，各頁面共用，不必每一頁重新輸入電話、重新查資料。
+
+- 驗證成功時發一個簽章過的 token（HMAC-SHA256；內容為身分、id_number、電話、到期時間），
+  連同查到的使用者資料與 row_key 存在 st.session_state
+- 各頁面呼叫 current_user(role)：簽章正確、未過期、身分相符就直接使用快取的資料，
+  回傳格式與 repository 的單筆查詢相同 (row_key, record)
+- 使用者自己更新資料後用 update_record() 同步快取（例如志工更新個人資料、受災戶送出需求）
+- 協調者頁面（批次匯入、批次媒合、歷史資料分析）開頭呼叫 require_coordinator()，
+  密碼為 secrets 的 coordinator_password，同一個 IP 的嘗試次數受 COORDINATOR_LIMIT 限制
+
+簽章金鑰為 secrets 的 session_secret；沒設定時每個 process 隨機產生（重啟後需要重新登入）。
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+import streamlit as st
+
+from phone_otp import OtpError, client_ip, get_otp_store
+
+SESSION_KEY = "auth_session"
+SESSION_TTL = 12 * 3600   # 秒：登入有效時間
+COORDINATOR_LIMIT = (5, 15 * 60)   # 同一個 IP：15 分鐘內最多輸入 5 次協調者密碼
+
+
+@st.cache_resource
+def _signing_key() -> bytes:
+    configured = st.secrets.get("session_secret")
+    return configured.encode() if configured else secrets.token_bytes(32)
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+# ---------- token ----------
+def issue_token(role, id_number, phone, now=None) -> str:
+    payload = {
+        "role": role,
+        "id": int(id_number),
+        "phone": str(phone),
+        "exp": int((now or time.time()) + SESSION_TTL),
+    }
+    body = _b64(json.dumps(payload, separators=(",", ":")).encode())
+    sig = _b64(hmac.new(_signing_key(), body.encode(), hashlib.sha256).digest())
+    return f"{body}.{sig}"
+
+
+def verify_token(token, now=None):
+    """簽章正確且未過期時回傳內容（dict），否則回傳 None"""
+    try:
+        body, sig = token.split(".")
+        expected = _b64(hmac.new(_signing_key(), body.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(sig, expected):
+            return None
+        payload = json.loads(_unb64(body))
+    except (AttributeError, ValueError):
+        return None
+    if payload.get("exp", 0) < (now or time.time()):
+        return None
+    return payload
+
+
+# ---------- session ----------
+def login(role, row_key, record):
+    """記住已驗證的使用者（record 為 repository 查到的資料）"""
+    record = dict(record)
+    phone = record.get("phone_norm") or record.get("phone", "")
+    st.session_state[SESSION_KEY] = {
+        "token": issue_token(role, record.get("id_number", 0), phone),
+        "row_key": row_key,
+        "record": record,
+    }
+    # 舊的 session 欄位（user_phone 只記志工的電話：媒合頁用它判斷「已報名的任務」）
+    st.session_state["user_role"] = role
+    st.session_state["user_phone"] = phone if role == "volunteer" else None
+
+
+def current_user(role=None):
+    """目前登入的使用者 (row_key, record)；沒登入、過期或身分不符時回傳 (None, None)"""
+    session = st.session_state.get(SESSION_KEY)
+    if not session:
+        return None, None
+    payload = verify_token(session["token"])
+    if payload is None:
+        logout()
+        return None, None
+    if role is not None and payload["role"] != role:
+        return None, None
+    return session["row_key"], session["record"]
+
+
+def current_role():
+    session = st.session_state.get(SESSION_KEY)
+    payload = verify_token(session["token"]) if session else None
+    return payload["role"] if payload else None
+
+
+def update_record(fields: dict):
+    """使用者自己寫入資料之後，同步快取的 record"""
+    session = st.session_state.get(SESSION_KEY)
+    if session:
+        session["record"].update(fields)
+
+
+def require_coordinator(feature):
+    """
+    協調者頁面的密碼檢查；還沒通過時顯示密碼欄並 st.stop()，通過後整個 session 有效。
+    feature 用在沒設定密碼時的訊息（例如「使用批次媒合」）。
+    """
+    coordinator_password = st.secrets.get("coordinator_password")
+    if not coordinator_password:
+        st.error(f"尚未設定協調者密碼（secrets 的 coordinator_password），無法{feature}。")
+        st.stop()
+    if st.session_state.get("coordinator_ok"):
+        return
+
+    pw = st.text_input("協調者密碼", type="password")
+    if st.button("登入"):
+        try:
+            # 每次嘗試都記一次，避免被拿來猜密碼
+            get_otp_store().throttle(f"coordinator:{client_ip()}", COORDINATOR_LIMIT)
+        except OtpError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        if hmac.compare_digest(pw.encode(), str(coordinator_password).encode()):
+            st.session_state["coordinator_ok"] = True
+            st.rerun()
+        else:
+            st.error("❌ 密碼錯誤")
+    st.stop()
+
+
+def logout():
+    # 連同媒合頁驗證過的志工身分一起清掉，換人使用時不會沿用上一位的身分
+    for key in (SESSION_KEY, "user_role", "user_phone", "verified_volunteer", "contact_verified_volunteer"):
+        st.session_state.pop(key, None)
@@ -0,0 +1,141 @@
+"""
+批次註冊匯入（收容所的受災戶名單、志工團體的名冊），CSV 或 XLSX。
+
+- 欄位名稱中英文都可以（姓名 / name、電話 / phone、身分 / role、Line ID / line_id），
+  志工可另外帶 work_time / skills / transport（與受災需求表單相同的選項代碼，逗號分隔）
+- 所有列一次向量化檢查：電話用與註冊頁相同的正規化與 10 碼規則、
+  與現有資料及檔案內其他列比對重複（同一身分同一支電話只能註冊一次）
+- 通過檢查的列一次配號（next_id_numbers）、一次寫入（register_users → 一次 append_rows）
+- 每一列都有結果（成功的 id_number 或錯誤原因），可以下載回去修正後再匯入
+"""
+import io
+
+import pandas as pd
+
+from facet_index import FACET_OPTIONS, facet_token
+from sheet_store import normalize_phone_series, normalize_text_series
+from storage.base import PROFILE_COLUMNS, WriteQueued, new_user_record
+
+MAX_IMPORT_ROWS = 2000
+
+# 檔案中可接受的欄位名稱（比對時忽略大小寫與空白）
+COLUMN_ALIASES = {
+    "name": ["name", "姓名"],
+    "phone": ["phone", "電話", "手機", "phone number"],
+    "role": ["role", "身分"],
+    "line_id": ["line_id", "line id", "lineid"],
+    "work_time": ["work_time", "可服務時段", "時段"],
+    "skills": ["skills", "能力", "具備的能力"],
+    "transport": ["transport", "交通方式"],
+}
+ROLE_ALIASES = {
+    "volunteer": "volunteer", "志工": "volunteer",
+    "victim": "victim", "受災戶": "victim",
+}
+REPORT_COLUMNS = ["row", "name", "phone", "role", "status", "error", "id_number"]
+
+
+def read_roster(uploaded_file) -> pd.DataFrame:
+    """讀取上傳的 CSV / XLSX，欄位換成標準名稱（全部當文字讀，電話開頭的 0 不會消失）"""
+    name = uploaded_file.name.lower()
+    data = uploaded_file.getvalue()
+    try:
+        if name.endswith(".csv"):
+            df = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        elif name.endswith(".xlsx"):
+            df = pd.read_excel(io.BytesIO(data), dtype=str, keep_default_na=False)
+        else:
+            raise ValueError("只支援 .csv 或 .xlsx 檔案")
+    except (UnicodeDecodeError, pd.errors.ParserError) as e:
+        raise ValueError(f"無法讀取檔案：{e}") from e
+
+    lookup = {alias.replace(" ", ""): col for col, names in COLUMN_ALIASES.items() for alias in names}
+    df = df.rename(columns=lambda c: lookup.get(str(c).strip().lower().replace(" ", ""), c))
+    missing = [c for c in ("name", "phone") if c not in df.columns]
+    if missing:
+        raise ValueError(f"缺少必要欄位：{', '.join(missing)}（姓名 / 電話）")
+    if len(df) > MAX_IMPORT_ROWS:
+        raise ValueError(f"一次最多匯入 {MAX_IMPORT_ROWS} 筆")
+    return df.reindex(columns=list(COLUMN_ALIASES)).fillna("").reset_index(drop=True)
+
+
+def _profile_codes(series, column):
+    """一欄逗號分隔的代碼 → (正規化後的字串, 是否有不認得的代碼)"""
+    tokens = series.str.split(",").explode().dropna().map(facet_token)   # "other: xxx" → "other"
+    tokens = tokens[tokens != ""]
+    unknown = ~tokens.isin(FACET_OPTIONS[column])
+    joined = tokens[~unknown].groupby(level=0).agg(", ".join).reindex(series.index, fill_value="")
+    bad = unknown.groupby(level=0).any().reindex(series.index, fill_value=False)
+    return joined, bad
+
+
+def validate_roster(df: pd.DataFrame, existing: pd.DataFrame, default_role: str):
+    """
+    檢查每一列，回傳 (通過的列 DataFrame, 每一列的結果 report)。
+    existing：現有資料（至少有 role / phone_norm 欄），用來比對已註冊的電話。
+    """
+    name = normalize_text_series(df["name"])
+    phone = normalize_phone_series(df["phone"])
+    role_raw = normalize_text_series(df["role"]).str.lower()
+    role = role_raw.map(ROLE_ALIASES).where(role_raw != "", default_role)
+
+    errors = pd.Series("", index=df.index)
+
+    def flag(mask, message):
+        errors[mask & (errors == "")] = message
+
+    flag(name == "", "姓名為必填")
+    flag(phone == "", "電話為必填")
+    flag(phone.str.len() != 10, "電話格式應為 10 位數字")
+    flag(role.isna(), "身分只能是 volunteer / victim（志工 / 受災戶）")
+
+    profile = {}
+    for col in PROFILE_COLUMNS:
+        profile[col], bad = _profile_codes(normalize_text_series(df[col]), col)
+        flag(bad & (role == "volunteer"), f"{col} 有不認得的選項")
+
+    key = role.fillna("") + ":" + phone
+    existing_keys = set(existing["role"].astype(str) + ":" + existing["phone_norm"].astype(str))
+    flag(key.isin(existing_keys), "此電話已註冊")
+    flag(key.duplicated(keep="first"), "檔案中重複（同一身分同一支電話）")
+
+    ok = errors == ""
+    valid = pd.DataFrame({
+        "name": name, "phone": phone, "role": role, "line_id": normalize_text_series(df["line_id"]),
+        **profile,
+    })[ok]
+    report = pd.DataFrame({
+        "row": df.index + 2,            # 檔案中的列號（第 1 列是標題）
+        "name": name,
+        "phone": phone,
+        "role": role.fillna(role_raw),
+        "status": ok.map({True: "ok", False: "error"}),
+        "error": errors,
+        "id_number": pd.Series(pd.NA, index=df.index, dtype="Int64"),
+    })[REPORT_COLUMNS]
+    return valid, report
+
+
+def import_roster(repo, df: pd.DataFrame, default_role: str):
+    """
+    檢查並匯入，回傳 (每一列的結果, 是否只排入寫入佇列)；成功的列會填上 id_number。
+    一次配號、一次寫入；寫入失敗時 raise。
+    """
+    valid, report = validate_roster(df, repo.read_all(), default_role)
+    if valid.empty:
+        return report, False
+    ids = repo.next_id_numbers(len(valid))
+    records = [
+        new_user_record(
+            id_number, r.role, r.name, r.phone, r.line_id,
+            profile={c: getattr(r, c) for c in PROFILE_COLUMNS} if r.role == "volunteer" else None,
+        )
+        for id_number, r in zip(ids, valid.itertuples(index=False))
+    ]
+    try:
+        repo.register_users(records)
+        queued = False
+    except WriteQueued:
+        queued = True       # 已排入佇列，稍後寫入，號碼照樣有效
+    report.loc[valid.index, "id_number"] = ids
+    return report, queued
@@ -0,0 +1,90 @@
+"""
+任務篩選用的 facet 索引（work_time / skills / resources / transport）。
+
+每個欄位都是逗號分隔的代碼（例如 "cleaning, other: 挖土機"），選項固定，
+所以每個代碼給一個 bit，整欄預先轉成一個 uint64 bitmask：
+- 篩選：同一欄內 OR（mask & 選取的 bits != 0），不同欄之間 AND，全部是向量化運算
+- 代碼是整個 token 比對，"medical" 不會再誤中 "medical supplies"
+- "other: xxx" 一律視為 "other"
+- 每個選項的筆數（facet counts）直接由 bitmask 算出
+
+索引只在資料版本改變時重建一次（見 VolRepository.data_version）。
+"""
+import numpy as np
+import pandas as pd
+
+# 各欄位的選項代碼（與受災需求表單寫入的值一致；頁面上的中文標籤由各頁面自己對應）
+FACET_OPTIONS = {
+    "work_time": ["morning", "noon", "afternoon", "night"],
+    "skills": ["supplies distribution", "cleaning", "medical", "heavy lifting", "driver's license", "other"],
+    "resources": ["tool", "food", "water", "medical supplies", "hygiene supplies", "accommodation", "other"],
+    "transport": ["train", "bus", "walk", "car", "scooter", "bike", "other"],
+}
+FACET_COLUMNS = list(FACET_OPTIONS)
+
+
+def facet_token(raw) -> str:
+    """把欄位中的一個 token 轉成選項代碼："other: xxx" → "other"，其餘去空白轉小寫"""
+    return str(raw).split(":", 1)[0].strip().lower()
+
+
+def encode_column(series: pd.Series, positions: dict) -> np.ndarray:
+    """把一欄逗號分隔字串轉成 bitmask 陣列；positions = {代碼: bit 位置}，不認得的代碼忽略"""
+    tokens = (
+        series.reset_index(drop=True).fillna("").astype(str).str.split(",").explode()
+        .str.split(":", n=1).str[0].str.strip().str.lower()
+    )
+    pos = tokens.map(positions).dropna()
+    out = np.zeros(len(series), dtype=np.uint64)
+    # 依列把每個代碼的 bit OR 進去（同一列重複的代碼不影響結果）
+    np.bitwise_or.at(
+        out,
+        pos.index.to_numpy(dtype=np.int64),
+        np.left_shift(np.uint64(1), pos.to_numpy(dtype=np.uint64)),
+    )
+    return out
+
+
+class FacetIndex:
+    """
+    建立在一份任務 DataFrame 上的 bitmask 索引；
+    回傳的布林陣列與該 DataFrame 的列順序一一對應，可直接 df[mask]。
+    """
+
+    def __init__(self, df: pd.DataFrame, vocab: dict):
+        if any(len(keys) > 64 for keys in vocab.values()):
+            raise ValueError("每個 facet 最多 64 個選項")
+        self.size = len(df)
+        positions = {
+            col: {facet_token(k): i for i, k in enumerate(keys)} for col, keys in vocab.items()
+        }
+        self.bits = {
+            col: {k: np.uint64(1) << np.uint64(i) for k, i in pos.items()}
+            for col, pos in positions.items()
+        }
+        self.masks = {col: encode_column(df[col], pos) for col, pos in positions.items()}
+
+    def _wanted(self, col, keys):
+        wanted = np.uint64(0)
+        for k in keys:
+            wanted |= self.bits[col].get(facet_token(k), np.uint64(0))
+        return wanted
+
+    def match(self, col, keys) -> np.ndarray:
+        """此欄符合任一選項（OR）的列；沒有選任何選項時全部符合"""
+        if not keys:
+            return np.ones(self.size, dtype=bool)
+        return (self.masks[col] & self._wanted(col, keys)) != 0
+
+    def filter(self, selections: dict) -> np.ndarray:
+        """selections = {欄位: [選項代碼, ...]}，不同欄位之間 AND"""
+        mask = np.ones(self.size, dtype=bool)
+        for col, keys in selections.items():
+            if keys:
+                mask &= self.match(col, keys)
+        return mask
+
+    def counts(self, col, base=None) -> dict:
+        """此欄每個選項有幾筆任務；base 為布林陣列時只計算其中的列"""
+        masks = self.masks[col] if base is None else self.masks[col][base]
+        return {k: int(np.count_nonzero(masks & bit)) for k, bit in self.bits[col].items()}
@@ -0,0 +1,202 @@
+"""
+離線地址定位（geocoding）與距離查詢，不呼叫任何外部 API。
+
+- 地址先用 search_index.parse_region 解析出 縣市 / 鄉鎮市區 / 村里，
+  再到隨專案附帶的代表點座標表（data/tw_centroids.csv）查座標：
+  有村里座標用村里，否則用鄉鎮市區，再不行用縣市；precision 記錄用到哪一層
+- 結果存在本機 SQLite 快取（key 為正規化後的地址），同一個地址只解析一次；
+  座標表更新後（內容 hash 改變）舊的快取會自動重新計算
+- GridIndex：把任務座標放進經緯度網格，半徑查詢只檢查附近的格子
+
+座標表目前收錄災區（花蓮縣）各鄉鎮市的代表點，要支援其他地區或村里層級，
+在 CSV 加列即可（county,township,village,lat,lng）。
+"""
+import csv
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from search_index import normalize_search_text, parse_region
+
+CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tw_centroids.csv")
+GEOCODE_CACHE_PATH = "geocode_cache.sqlite3"
+EARTH_RADIUS_KM = 6371.0
+GRID_CELL_DEG = 0.05     # 網格大小（緯度約 5.5 公里）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode_cache (
+    address_norm TEXT PRIMARY KEY,
+    lat REAL,
+    lng REAL,
+    precision TEXT,
+    table_version TEXT,
+    updated_at REAL
+);
+"""
+
+_conns = {}
+_conns_lock = threading.Lock()
+
+
+# ---------- 代表點座標表 ----------
+class CentroidTable:
+    def __init__(self, rows, version):
+        self.version = version
+        # (township, village) -> [(county, lat, lng), ...]；同名鄉鎮（例如各縣市的中正區）靠縣市區分
+        self.places = {}
+        self.counties = {}
+        for r in rows:
+            county = normalize_search_text(r["county"])
+            township = normalize_search_text(r["township"])
+            village = normalize_search_text(r["village"])
+            point = (float(r["lat"]), float(r["lng"]))
+            if township:
+                self.places.setdefault((township, village), []).append((county, *point))
+            elif county:
+                self.counties[county] = point
+
+    def _place(self, county, township, village):
+        candidates = self.places.get((township, village), [])
+        if county:
+            candidates = [c for c in candidates if c[0] == county] or candidates
+        if len(candidates) == 1 or (candidates and county):
+            _, lat, lng = candidates[0]
+            return lat, lng
+        return None
+
+    def lookup(self, address):
+        """回傳 (lat, lng, precision)，查不到回傳 None；precision 為 village / township / county"""
+        county, township, village, _ = parse_region(address)
+        if township and village:
+            point = self._place(county, township, village)
+            if point:
+                return (*point, "village")
+        if township:
+            point = self._place(county, township, "")
+            if point:
+                return (*point, "township")
+        if county in self.counties:
+            return (*self.counties[county], "county")
+        return None
+
+
+@st.cache_resource
+def load_centroids(path=CENTROIDS_PATH) -> CentroidTable:
+    with open(path, "rb") as f:
+        content = f.read()
+    rows = list(csv.DictReader(content.decode("utf-8-sig").splitlines()))
+    return CentroidTable(rows, hashlib.blake2b(content, digest_size=8).hexdigest())
+
+
+# ---------- 定位 + 快取 ----------
+def _connect(path):
+    """整個 process 共用一條連線（跨執行緒），回傳 (conn, lock)；使用連線時要拿著 lock"""
+    with _conns_lock:
+        entry = _conns.get(path)
+        if entry is None:
+            conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            entry = _conns[path] = (conn, threading.Lock())
+        return entry
+
+
+def geocode(address, path=GEOCODE_CACHE_PATH):
+    """
+    地址 → (lat, lng, precision)，查不到回傳 None。
+    先查快取；快取沒有（或座標表已更新）才解析並寫回快取（查不到的結果也會快取）。
+    """
+    key = normalize_search_text(address)
+    if not key:
+        return None
+    table = load_centroids()
+    conn, lock = _connect(path)
+    with lock:
+        row = conn.execute(
+            "SELECT lat, lng, precision FROM geocode_cache WHERE address_norm = ? AND table_version = ?",
+            (key, table.version),
+        ).fetchone()
+    if row is not None:
+        return None if row[0] is None else (row[0], row[1], row[2])
+
+    result = table.lookup(key)
+    lat, lng, precision = result if result else (None, None, None)
+    with lock, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (key, lat, lng, precision, table.version, time.time()),
+        )
+    return result
+
+
+# ---------- 距離 ----------
+def haversine_km(lat1, lng1, lat2, lng2):
+    """兩點（或一點對陣列）的大圓距離（公里），可直接傳 numpy 陣列"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class GridIndex:
+    """
+    任務座標的網格索引；位置（0-based）與建立時的陣列順序一一對應，沒有座標（NaN）的列不放進網格。
+    """
+
+    def __init__(self, lats, lngs, cell_deg=GRID_CELL_DEG):
+        self.lats = np.asarray(lats, dtype=float)
+        self.lngs = np.asarray(lngs, dtype=float)
+        self.cell_deg = cell_deg
+        self.has_point = ~(np.isnan(self.lats) | np.isnan(self.lngs))
+        self.cells = {}
+        for pos in np.flatnonzero(self.has_point):
+            self.cells.setdefault(self._cell(self.lats[pos], self.lngs[pos]), []).append(pos)
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def distances(self, lat, lng) -> np.ndarray:
+        """每一列到 (lat, lng) 的距離（公里），沒有座標的列為 NaN"""
+        return haversine_km(lat, lng, self.lats, self.lngs)
+
+    def within(self, lat, lng, radius_km) -> np.ndarray:
+        """半徑 radius_km 公里內的列（布林陣列），只計算涵蓋範圍內格子裡的點"""
+        mask = np.zeros(len(self.lats), dtype=bool)
+        dlat = radius_km / 111.0
+        dlng = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        (r0, c0), (r1, c1) = self._cell(lat - dlat, lng - dlng), self._cell(lat + dlat, lng + dlng)
+        candidates = [
+            pos
+            for r in range(r0, r1 + 1)
+            for c in range(c0, c1 + 1)
+            for pos in self.cells.get((r, c), ())
+        ]
+        if candidates:
+            candidates = np.asarray(candidates)
+            dist = haversine_km(lat, lng, self.lats[candidates], self.lngs[candidates])
+            mask[candidates[dist <= radius_km]] = True
+        return mask
+
+
+def fill_coordinates(df):
+    """
+    補上沒有座標的列（舊資料、或寫入時定位失敗），回傳新的 DataFrame（lat / lng 為 float）。
+    地址定位有快取，同一個地址只解析一次。
+    """
+    df = df.assign(
+        lat=pd.to_numeric(df["lat"], errors="coerce"),
+        lng=pd.to_numeric(df["lng"], errors="coerce"),
+    )
+    missing = np.flatnonzero((df["lat"].isna() | df["lng"].isna()).to_numpy())
+    for pos in missing:
+        location = geocode(df["address"].iat[pos])
+        if location:
+            df.iat[pos, df.columns.get_loc("lat")] = location[0]
+            df.iat[pos, df.columns.get_loc("lng")] = location[1]
+    return df
@@ -0,0 +1,210 @@
+"""
+志工 ↔ 任務自動媒合。
+
+每一組 (志工, 任務) 的分數由五個部分加權而成（0 ~ 1）：
+- 時段：任務需要的時段中，志工可以的比例；雙方都有填卻完全沒有交集時不配對
+- 能力：任務需要的能力中，志工具備的比例
+- 交通：志工的交通方式是否符合任務建議的交通方式
+- 距離：exp(-距離 / DISTANCE_SCALE_KM)
+- 需求：任務剩餘名額 / 需求人數（還缺越多人的任務越優先）
+志工沒填某一項（例如還沒填可服務時段）時該項給中間分數，不會因為資料不全就完全配不到。
+
+批次指派（assign）：
+1. 每位志工只保留分數最高的 TOP_K 個任務當候選（分塊計算，記憶體與任務數成正比）
+2. 全部候選依分數由高到低貪婪指派，每位志工最多一個任務、每個任務不超過剩餘名額
+3. 修補：沒配到的志工，若能把某個已指派的人換到他的其他候選任務、讓總分變高，就交換
+數千位志工 × 數千個任務在數秒內完成。
+"""
+import numpy as np
+import pandas as pd
+
+from facet_index import FACET_OPTIONS, encode_column, facet_token
+from geocode import fill_coordinates, haversine_km
+
+WEIGHTS = {"time": 0.3, "skills": 0.25, "transport": 0.1, "distance": 0.2, "need": 0.15}
+NEUTRAL = 0.5              # 志工沒填該項時的分數
+DISTANCE_SCALE_KM = 10.0
+TOP_K = 10                 # 批次指派時每位志工保留幾個候選任務
+MIN_SCORE = 0.3            # 低於這個分數不推薦、不指派
+CHUNK_SIZE = 512           # 一次計算幾位志工的分數列
+
+
+# 每個 byte 有幾個 1（numpy 1.x 沒有 bitwise_count 時用查表）
+_BYTE_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.float32)
+
+
+def _popcount_table(a):
+    a = np.ascontiguousarray(a)
+    return _BYTE_POPCOUNT[a.view(np.uint8)].reshape(*a.shape, a.itemsize).sum(axis=-1)
+
+
+def _popcount(a):
+    if hasattr(np, "bitwise_count"):    # numpy >= 2.0
+        return np.bitwise_count(a).astype(np.float32)
+    return _popcount_table(a)
+
+
+def _encode(df, column):
+    positions = {facet_token(k): i for i, k in enumerate(FACET_OPTIONS[column])}
+    return encode_column(df[column], positions)
+
+
+class MatchingEngine:
+    """建立在一份任務 DataFrame 上；只考慮還有名額的任務，位置與 self.missions 的列順序對應"""
+
+    def __init__(self, missions: pd.DataFrame):
+        missions = fill_coordinates(missions)
+        remaining = (missions["demand_worker"] - missions["selected_worker"]).to_numpy()
+        self.size = len(missions)
+        self.source_pos = np.flatnonzero(remaining > 0)     # 在傳入的 DataFrame 中的位置
+        self.missions = missions.iloc[self.source_pos].reset_index(drop=True)
+        self.demand = self.missions["demand_worker"].to_numpy(dtype=np.float32)
+        self.remaining = (self.missions["demand_worker"] - self.missions["selected_worker"]).to_numpy()
+        self.time = _encode(self.missions, "work_time")
+        self.skills = _encode(self.missions, "skills")
+        self.transport = _encode(self.missions, "transport")
+        self.lats = self.missions["lat"].to_numpy(dtype=float)
+        self.lngs = self.missions["lng"].to_numpy(dtype=float)
+        self.need = (self.remaining / np.maximum(self.demand, 1)).astype(np.float32)
+
+    # ---------- 分數 ----------
+    def _coverage(self, vol_masks, mission_masks):
+        """任務需要的項目中，志工具備的比例；任務沒要求時為 1、志工沒填時為 NEUTRAL"""
+        need = _popcount(mission_masks)[None, :]
+        have = _popcount(vol_masks[:, None] & mission_masks[None, :])
+        score = np.where(need > 0, have / np.maximum(need, 1), 1.0)
+        return np.where((vol_masks == 0)[:, None], np.where(need > 0, NEUTRAL, 1.0), score)
+
+    def score(self, volunteers: pd.DataFrame) -> np.ndarray:
+        """(志工數, 任務數) 的分數矩陣（float32）；不可配對的組合為 -1"""
+        v_time = _encode(volunteers, "work_time")
+        v_skills = _encode(volunteers, "skills")
+        time_score = self._coverage(v_time, self.time)
+        skill_score = self._coverage(v_skills, self.skills)
+        v_transport = _encode(volunteers, "transport")
+        transport_score = np.where(
+            (v_transport[:, None] & self.transport[None, :]) != 0, 1.0,
+            np.where((v_transport == 0)[:, None] | (self.transport == 0)[None, :], NEUTRAL, 0.0),
+        )
+
+        v_lats = volunteers["lat"].to_numpy(dtype=float)[:, None]
+        v_lngs = volunteers["lng"].to_numpy(dtype=float)[:, None]
+        dist = haversine_km(v_lats, v_lngs, self.lats[None, :], self.lngs[None, :])
+        distance_score = np.where(np.isnan(dist), NEUTRAL, np.exp(-dist / DISTANCE_SCALE_KM))
+
+        total = (
+            WEIGHTS["time"] * time_score
+            + WEIGHTS["skills"] * skill_score
+            + WEIGHTS["transport"] * transport_score
+            + WEIGHTS["distance"] * distance_score
+            + WEIGHTS["need"] * self.need[None, :]
+        ).astype(np.float32)
+        # 雙方都有填時段卻完全沒交集：去不了，不配對
+        no_overlap = (v_time[:, None] != 0) & (self.time[None, :] != 0) & ((v_time[:, None] & self.time[None, :]) == 0)
+        total[no_overlap] = -1
+        return total
+
+    def _top_candidates(self, volunteers, k):
+        """每位志工分數最高的 k 個任務：回傳 (志工位置, 任務位置, 分數) 三個陣列"""
+        vol_pos, mission_pos, scores = [], [], []
+        k = min(k, len(self.missions))
+        for start in range(0, len(volunteers), CHUNK_SIZE):
+            block = self.score(volunteers.iloc[start:start + CHUNK_SIZE])
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            rows = np.repeat(np.arange(start, start + len(block)), k)
+            keep = top_scores.ravel() >= MIN_SCORE
+            vol_pos.append(rows[keep])
+            mission_pos.append(top.ravel()[keep])
+            scores.append(top_scores.ravel()[keep])
+        if not vol_pos:
+            return np.zeros(0, int), np.zeros(0, int), np.zeros(0, np.float32)
+        return np.concatenate(vol_pos), np.concatenate(mission_pos), np.concatenate(scores)
+
+    # ---------- 給志工的推薦 ----------
+    def _volunteer_scores(self, volunteer: dict) -> np.ndarray:
+        columns = ["work_time", "skills", "transport", "address", "lat", "lng"]
+        vol = fill_coordinates(pd.DataFrame([volunteer]).reindex(columns=columns))
+        return self.score(vol)[0]
+
+    def scores_for(self, volunteer: dict) -> np.ndarray:
+        """
+        某位志工對「建立引擎時傳入的每一個任務」的分數（與該 DataFrame 列順序對應），
+        已額滿或不可配對的任務為 -1
+        """
+        scores = np.full(self.size, -1.0, dtype=np.float32)
+        if len(self.missions):
+            scores[self.source_pos] = self._volunteer_scores(volunteer)
+        return scores
+
+    def shortlist(self, volunteer: dict, k=5) -> pd.DataFrame:
+        """某位志工的推薦任務（分數高到低），多一欄 match_score"""
+        if self.missions.empty:
+            return self.missions.assign(match_score=pd.Series(dtype=float))
+        scores = self._volunteer_scores(volunteer)
+        order = np.argsort(-scores, kind="stable")
+        order = order[scores[order] >= MIN_SCORE][:k]
+        return self.missions.iloc[order].assign(match_score=scores[order])
+
+    # ---------- 協調者的批次指派 ----------
+    def assign(self, volunteers: pd.DataFrame, k=TOP_K) -> pd.DataFrame:
+        """
+        一次算出所有志工的指派（每人最多一個任務），回傳
+        volunteer_pos / mission_pos / score 三欄，volunteer_pos 對應傳入的 volunteers 列順序。
+        """
+        empty = pd.DataFrame({"volunteer_pos": [], "mission_pos": [], "score": []})
+        if volunteers.empty or self.missions.empty:
+            return empty
+        volunteers = fill_coordinates(volunteers.reset_index(drop=True))
+        v_idx, m_idx, s = self._top_candidates(volunteers, k)
+
+        # 1. 貪婪：分數高的先配
+        order = np.argsort(-s, kind="stable")
+        capacity = self.remaining.astype(int).copy()
+        assigned = {}            # 志工位置 -> (任務位置, 分數)
+        members = {}             # 任務位置 -> {志工位置: 分數}
+        candidates = {}          # 志工位置 -> [(任務位置, 分數), ...]（分數高到低）
+        for i in order:
+            v, m, score = int(v_idx[i]), int(m_idx[i]), float(s[i])
+            candidates.setdefault(v, []).append((m, score))
+            if v in assigned or capacity[m] <= 0:
+                continue
+            assigned[v] = (m, score)
+            members.setdefault(m, {})[v] = score
+            capacity[m] -= 1
+
+        # 2. 修補：沒配到的志工 v 想要額滿的任務 m 時，
+        #    找 m 裡可以改去其他還有名額的候選任務 m2 的人 u，總分變高就交換
+        for v, options in candidates.items():
+            if v in assigned:
+                continue
+            for m, score in options:
+                best = None
+                for u, u_score in members.get(m, {}).items():
+                    for m2, score2 in candidates.get(u, ()):
+                        if m2 != m and capacity[m2] > 0:
+                            gain = score + score2 - u_score
+                            if gain > 0 and (best is None or gain > best[0]):
+                                best = (gain, u, m2, score2)
+                            break
+                if best:
+                    _, u, m2, score2 = best
+                    del members[m][u]
+                    members[m][v] = score
+                    members.setdefault(m2, {})[u] = score2
+                    capacity[m2] -= 1
+                    assigned[u] = (m2, score2)
+                    assigned[v] = (m, score)
+                    break
+
+        if not assigned:
+            return empty
+        rows = sorted((v, m, score) for v, (m, score) in assigned.items())
+        return pd.DataFrame(rows, columns=["volunteer_pos", "mission_pos", "score"])
+
+
+def unassigned_volunteers(volunteers: pd.DataFrame, missions: pd.DataFrame, assignments: pd.DataFrame) -> pd.DataFrame:
+    """還沒報名任何（仍有效）任務的志工；assignments 為報名關係（repository.list_assignments()），同一支電話只留一筆"""
+    active = assignments["volunteer_id"][assignments["mission_id"].isin(missions["id_number"])]
+    signed = volunteers["id_number"].isin(active)
+    return volunteers[~signed].drop_duplicates("phone_norm").reset_index(drop=True)
@@ -1,49 +1,55 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
-import re
-
-# ---------- Google Sheet 連線 ----------
-creds = Credentials.from_service_account_info(
-    st.secrets["google"],
-    scopes=[
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive",
-    ],
-)
-gc = gspread.authorize(creds)
-
-SHEET_ID = "1PbYajOLCW3p5vsxs958v-eCPgHC1_DnHf9G_mcFx9C0"
-ws = gc.open_by_key(SHEET_ID).worksheet("vol")
+from auth_session import current_role, current_user, login, logout, require_coordinator, update_record
+from bulk_import import MAX_IMPORT_ROWS, import_roster, read_roster
+from facet_index import FACET_OPTIONS, facet_token
+from phone_otp import OtpError, otp_prompt, throttle_lookup
+from sheet_store import normalize_phone
+from storage import PROFILE_COLUMNS, WriteQueued, get_repository
+from storage.base import new_user_record
+
+# ---------- 資料來源（Sheets / SQLite / 記憶體，由 secrets 決定） ----------
+repo = get_repository()
+
+# ---------- 志工個人資料選項（代碼與受災需求表單相同，媒合時直接比對） ----------
+PROFILE_LABELS = {
+    "work_time": ("可服務時段 available time", {
+        "morning": "早上 (08-11)", "noon": "中午 (11-13)",
+        "afternoon": "下午 (13-17)", "night": "晚上 (17-19)",
+    }),
+    "skills": ("具備的能力 skills", {
+        "supplies distribution": "物資", "cleaning": "清掃", "medical": "醫療",
+        "heavy lifting": "搬運", "driver's license": "駕照", "other": "其他",
+    }),
+    "transport": ("交通方式 transportation", {
+        "train": "火車", "bus": "巴士", "walk": "步行", "car": "開車",
+        "scooter": "機車", "bike": "單車", "other": "其他",
+    }),
+}
 
 
 # ---------- 工具函式 ----------
-def normalize_phone(s: str) -> str:
-    if s is None or s == "":
-        return ""
-    s = str(s).replace("'", "").strip()
-    s = re.sub(r"\D", "", s)
-    if len(s) == 9 and s.startswith("9"):
-        s = "0" + s
-    return s
-
-
-def get_next_id_number():
-    col = ws.col_values(1)[1:]
-    nums = [int(v) for v in col if str(v).strip().isdigit()]
-    return (max(nums) + 1) if nums else 1
-
-
 def is_duplicate(role: str, name: str, phone: str) -> bool:
-    data = ws.get_all_records()
-    if not data:
-        return False
-    df = pd.DataFrame(data)
-    df["role"] = df["role"].astype(str).str.strip().str.lower()
-    df["phone"] = df["phone"].astype(str).apply(normalize_phone)
-    return ((df["role"] == role.lower().strip()) &
-            (df["phone"] == normalize_phone(phone))).any()
+    row_key, _ = repo.find_user(role, phone)
+    return row_key is not None
+
+
+def profile_inputs(current=None, key_prefix="profile"):
+    """志工個人資料的多選欄位，回傳 {欄位: "代碼, 代碼"}"""
+    current = current or {}
+    profile = {}
+    for col in PROFILE_COLUMNS:
+        label, names = PROFILE_LABELS[col]
+        selected = [facet_token(t) for t in str(current.get(col, "") or "").split(",") if t.strip()]
+        chosen = st.multiselect(
+            label,
+            FACET_OPTIONS[col],
+            default=[c for c in FACET_OPTIONS[col] if c in selected],
+            format_func=lambda c, names=names: names.get(c, c),
+            key=f"{key_prefix}_{col}",
+        )
+        profile[col] = ", ".join(chosen)
+    return profile
 
 
 # =================================================================
@@ -51,7 +57,17 @@ def is_duplicate(role: str, name: str, phone: str) -> bool:
 # =================================================================
 st.title("註冊 / 登入 basic registration")
 
-mode = st.radio("請選擇操作模式", ["註冊", "登入"])
+# 已登入：其他頁面直接使用這個身分，不必再輸入電話
+_, me_logged_in = current_user()
+if me_logged_in is not None:
+    role_name = "志工" if current_role() == "volunteer" else "受災戶"
+    info_col, logout_col = st.columns([4, 1])
+    info_col.info(f"目前登入：{me_logged_in.get('name', '')}（{role_name}）")
+    if logout_col.button("登出 logout"):
+        logout()
+        st.rerun()
+
+mode = st.radio("請選擇操作模式", ["註冊", "登入", "批次匯入（收容所 / 志工團體）"])
 
 
 # =================================================================
@@ -67,38 +83,53 @@ if mode == "登入":
 
     if st.button("登入 Login"):
         phone_norm = normalize_phone(login_phone)
+        st.session_state.pop("pending_login", None)
+        try:
+            throttle_lookup()
+        except OtpError as e:
+            st.error(f"❌ {e}")
+            st.stop()
 
-        data = ws.get_all_records()
-        df = pd.DataFrame(data)
-        df["phone"] = df["phone"].astype(str).apply(normalize_phone)
-        df["role"] = df["role"].astype(str).str.strip()
-
+        # 查詢走 repository 的索引（phone_norm 已事先算好）
         # 找所有電話相同的紀錄
-        all_records = df[df["phone"] == phone_norm]
-
-        if all_records.empty:
+        if not repo.has_phone(phone_norm):
             st.error("❌ 查無此電話的註冊紀錄，請先完成註冊。")
             st.stop()
 
         # 在這些紀錄裡查詢該身分
-        user_records = all_records[all_records["role"] == role]
+        row_key, user = repo.find_user(role, phone_norm)
 
-        if user_records.empty:
+        if user is None:
             st.error(
                 f"❌ 此電話尚未以「{role}」身分註冊。\n"
                 f"你可以切換到『註冊模式』，用同一支電話增加新身分。"
             )
             st.stop()
 
-        # 登入成功
-        user = user_records.iloc[0]
+        # 找到了：還要收簡訊驗證碼，確認是本人
+        st.session_state["pending_login"] = {"role": role, "phone": phone_norm}
+
+    pending = st.session_state.get("pending_login")
+    if pending and pending["role"] == role:
+        if otp_prompt(pending["phone"], key="login_otp"):
+            # 登入成功：記住身分與資料，其他頁面（需求表單、報名、推薦）直接使用，不必再驗證
+            row_key, user = repo.find_user(role, pending["phone"])
+            st.session_state.pop("pending_login")
+            if user is not None:
+                login(role, row_key, user)
+                st.rerun()
+
+    # ---------------- 已登入：顯示自己的任務 ----------------
+    _, user = current_user(role)
+    if user is not None:
+        phone_norm = user["phone_norm"]
         st.success(f"登入成功！歡迎 {user['name']}")
 
         # ---------------- 受災戶：顯示自己發布的任務 ----------------
         if role == "victim":
             st.subheader("您發布的任務 Your posted missions")
 
-            my_tasks = df[df["phone"] == phone_norm]
+            my_tasks = repo.rows_for_phone(phone_norm)
 
             if my_tasks.empty:
                 st.info("目前沒有您發布的任務。")
@@ -107,7 +138,7 @@ if mode == "登入":
                     ["mission_name", "address", "work_time",
                      "demand_worker", "selected_worker",
                      "accepted_volunteers", "date", 
-                     "name", "phone", "line_id"]
+                     "name", "phone_norm", "line_id"]
                 ]
                 
                 display_df = display_df.rename(columns={
@@ -119,7 +150,7 @@ if mode == "登入":
                     "accepted_volunteers": "已媒合志工",
                     "date": "發布日期",
                     "name": "受災戶姓名",
-                    "phone": "受災戶電話",
+                    "phone_norm": "受災戶電話",
                     "line_id": "受災戶 LineID"
                 })
 
@@ -129,14 +160,11 @@ if mode == "登入":
         else:
             st.subheader("您參與的任務 Missions you joined")
 
-            my_name = user["name"]
-            last3 = phone_norm[-3:]
-
-            pattern = rf"{re.escape(my_name)}\({last3}\)"
-
-            df["accepted_volunteers"] = df["accepted_volunteers"].astype(str)
-
-            joined_tasks = df[df["accepted_volunteers"].str.contains(pattern, regex=True)]
+            # 報名關係直接查這位志工的任務 id，再逐一取任務（不掃全部任務）
+            joined_ids = sorted(repo.missions_for_volunteer(user["id_number"]))
+            joined_tasks = pd.DataFrame(
+                [task for _, task in (repo.find_by_id(i, role="victim") for i in joined_ids) if task is not None]
+            )
 
             if joined_tasks.empty:
                 st.info("目前您沒有參與的任務。")
@@ -146,7 +174,7 @@ if mode == "登入":
                     ["mission_name", "address", "work_time",
                      "demand_worker", "selected_worker",
                      "date", 
-                     "name", "phone", "line_id"] # 在這裡加入受災戶聯絡資訊
+                     "name", "phone_norm", "line_id"] # 在這裡加入受災戶聯絡資訊
                 ]
 
                 # 2. 修正點：現在 display_df 已經存在，可以進行 rename
@@ -158,17 +186,36 @@ if mode == "登入":
                     "selected_worker": "目前人數",
                     "date": "發布日期",
                     "name": "受災戶姓名",
-                    "phone": "受災戶電話",
+                    "phone_norm": "受災戶電話",
                     "line_id": "受災戶 LineID"
                 })
 
                 # 3. 最後顯示結果
                 st.dataframe(display_df)
 
+    # ---------------- 志工：更新個人資料（登入後一直顯示，不受上面按鈕的 rerun 影響） ----------------
+    row_key, me = current_user("volunteer")
+    if me is not None:
+        with st.expander("📝 更新我的志工資料（可服務時段、能力、交通方式）"):
+            with st.form("volunteer_profile_form"):
+                new_profile = profile_inputs(me, key_prefix="update")
+                if st.form_submit_button("儲存 save"):
+                    try:
+                        repo.update_fields(row_key, new_profile)
+                        # 登入 session 裡的資料一起更新，媒合頁會依新的資料推薦
+                        update_record(new_profile)
+                        st.success("✅ 已更新，媒合頁會依新的資料推薦任務。")
+                    except WriteQueued:
+                        update_record(new_profile)
+                        st.info("⏳ 已收到您的更新，系統忙碌中，資料將於稍後寫入。")
+                    except Exception as e:
+                        st.error("❌ 更新失敗")
+                        st.error(str(e))
+
 # =================================================================
 #  🟦🟦🟦             以下為原本的「註冊模式」             🟦🟦🟦
 # =================================================================
-else:
+elif mode == "註冊":
     role_display = st.selectbox("身分 role", ["志工 volunteer", "受災戶 victim"])
     role = "volunteer" if "志工" in role_display else "victim"
 
@@ -176,6 +223,12 @@ else:
     phone = st.text_input("電話 phone number")
     line_id = st.text_input("Line ID（選填）")
 
+    # 志工：可服務時段、能力、交通方式（選填，媒合頁會依此推薦適合的任務）
+    profile = None
+    if role == "volunteer":
+        st.markdown("##### 志工資料（選填，用來推薦適合您的任務）")
+        profile = profile_inputs(key_prefix="register")
+
     if phone:
         if len(normalize_phone(phone)) != 10:
             st.warning("電話格式請輸入 10 位數字（例如 0912345678）")
@@ -190,30 +243,67 @@ else:
         elif is_duplicate(role, name, phone_norm):
             st.warning("❌ 此電話已註冊，請改用登入模式")
         else:
-            id_number = get_next_id_number()
-
-            row = [
-                id_number,
-                role,
-                name.strip(),
-                "'" + phone_norm,
-                line_id.strip(),
-                "",
-                "",
-                "",
-                "",
-                0,
-                "",
-                "",
-                "",
-                "",
-                "",
-                "",
-            ]
+            id_number = repo.next_id_number()
+            record = new_user_record(id_number, role, name, phone_norm, line_id, profile=profile)
 
             try:
-                ws.append_row(row)
+                repo.register_user(record)
                 st.success("✅ 註冊成功！請使用登入模式登入。")
+            except WriteQueued:
+                st.info("⏳ 已收到您的註冊，系統忙碌中，資料將於稍後寫入，請稍候再登入。")
             except Exception as e:
                 st.error("❌ 填寫失敗")
                 st.error(str(e))
+
+# =================================================================
+#  🟨🟨🟨        批次匯入（協調者代收容所 / 團體註冊）        🟨🟨🟨
+# =================================================================
+else:
+    st.header("批次匯入 bulk import")
+
+    # 與批次媒合共用 coordinator_password
+    require_coordinator("使用批次匯入")
+
+    st.caption(
+        f"上傳 CSV 或 Excel（.xlsx），一次最多 {MAX_IMPORT_ROWS} 筆。必要欄位：姓名 name、電話 phone；"
+        "選填：身分 role（volunteer / victim，沒填用下面的預設值）、Line ID、"
+        "志工的 work_time / skills / transport（選項代碼，逗號分隔）。"
+    )
+    role_display = st.selectbox("預設身分 role", ["受災戶 victim", "志工 volunteer"])
+    default_role = "volunteer" if "志工" in role_display else "victim"
+    roster_file = st.file_uploader("名單檔案", type=["csv", "xlsx"])
+
+    if roster_file is not None and st.button("匯入 import"):
+        try:
+            roster = read_roster(roster_file)
+            with st.spinner("匯入中…"):
+                report, queued = import_roster(repo, roster, default_role)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        except Exception as e:
+            st.error("❌ 匯入失敗，所有資料都沒有寫入，請稍後再試。")
+            st.error(str(e))
+            st.stop()
+
+        imported = int((report["status"] == "ok").sum())
+        if queued:
+            st.info(f"⏳ 已收到 {imported} 筆註冊，系統忙碌中，資料將於稍後寫入。")
+        else:
+            st.success(f"✅ 已匯入 {imported} 筆")
+        if imported < len(report):
+            st.warning(f"有 {len(report) - imported} 筆沒有匯入，請依下表的錯誤原因修正後再上傳這些列。")
+        st.dataframe(
+            report.rename(columns={
+                "row": "列", "name": "姓名", "phone": "電話", "role": "身分",
+                "status": "結果", "error": "錯誤原因", "id_number": "編號",
+            }),
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.download_button(
+            "下載匯入結果 (CSV)",
+            report.to_csv(index=False).encode("utf-8-sig"),
+            file_name="import_report.csv",
+            mime="text/csv",
+        )
@@ -1,9 +1,17 @@
 import streamlit as st
 import pandas as pd
-import gspread
 from datetime import datetime, timedelta, timezone
-from google.oauth2.service_account import Credentials
-import re  # <- normalize_phone 使用到 re
+from sheet_store import normalize_phone
+import numpy as np
+from archive_store import record_signup
+from auth_session import current_user, login
+from phone_otp import OtpError, otp_prompt, throttle_lookup
+from facet_index import FACET_OPTIONS, FacetIndex
+from geocode import GridIndex, fill_coordinates, geocode
+from matching import MIN_SCORE, MatchingEngine
+from photo_pipeline import get_thumbnail_cache
+from search_index import TextIndex
+from storage import get_repository
 
 st.set_page_config(page_title="志工媒合平台（熱心民眾）", layout="wide")
 
@@ -79,30 +87,6 @@ div[data-testid="stMultiSelect"]:nth-of-type(4) [data-baseweb="tag"] {
 
 st.markdown(css, unsafe_allow_html=True)
 
-# 共用手機標準化函式
-def normalize_phone(p):
-    """
-    統一電話格式：
-    - 移除單引號 (Google Sheets 的文字前綴)
-    - 去掉空白、破折號等非數字字元
-    - 9 碼且 9 開頭則補 0
-    - 回傳標準 10 碼電話號碼（若無法取得則回傳原數字序列）
-    """
-    if p is None or p == "":
-        return ""
-    
-    # 移除單引號
-    p = str(p).strip().replace("'", "")
-    
-    # 只保留數字
-    p = re.sub(r"\D", "", p)
-    
-    # 若長度 9 且 9 開頭，補 0
-    if len(p) == 9 and p.startswith("9"):
-        return "0" + p
-    
-    return p
-
 # ==========================================
 # 1. 初始化設定與連線
 # ==========================================
@@ -114,6 +98,8 @@ if "my_new_tasks" not in st.session_state:
     st.session_state["my_new_tasks"] = []  # 剛報名但還沒寫入 Sheet 的任務 ID
 if "page" not in st.session_state:
     st.session_state["page"] = "task_list"  # 預設頁面
+if "list_page" not in st.session_state:
+    st.session_state["list_page"] = 1  # 任務列表目前在第幾頁
 # selected_task_id 會在點選報名按鈕時被設定
 
 # 安全 rerun wrapper（處理不同 Streamlit 版本沒有 experimental_rerun 屬性的情況）
@@ -127,81 +113,22 @@ def safe_rerun():
     st.session_state["_safe_rerun_trigger"] = not st.session_state.get("_safe_rerun_trigger", False)
     st.stop()
 
-# Google Sheet 連線 (使用快取資源，避免重複連線)
-@st.cache_resource
-def get_sheet_connection():
-    SCOPES = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    creds = Credentials.from_service_account_info(
-        st.secrets["google"],
-        scopes=SCOPES
-    )
-    gc = gspread.authorize(creds)
-    SHEET_ID = "1PbYajOLCW3p5vsxs958v-eCPgHC1_DnHf9G_mcFx9C0"
-    # Use named worksheet "vol" (consistent with other pages)
-    return gc.open_by_key(SHEET_ID).worksheet("vol")
-
+# 資料來源 (Sheets / SQLite / 記憶體，由 secrets 決定；以 cache_resource 共用，整個 process 只建立一次)
+# 讀取一律走 repository 的索引查詢，不需要每次 rerun 都去讀整張表
 try:
-    sheet = get_sheet_connection()
+    repo = get_repository()
 except Exception as e:
-    st.error(f"無法連線至 Google Sheets，請檢查 secrets 設定: {e}")
+    st.error(f"無法連線至資料來源，請檢查 secrets 設定: {e}")
     st.stop()
 
-# ==========================================
-# 2. 資料讀取與處理函式
-# ==========================================
-
-# 讀取資料 (設定 ttl=3 秒，3秒內重新整理不會真的去呼叫 Google API，保護額度)
-@st.cache_data(ttl=3)
-def load_data():
-    try:
-        data = sheet.get_all_records()
-        df = pd.DataFrame(data)
-        
-        # 清洗欄位名稱
-        df.columns = df.columns.str.strip()
-        
-        # 轉型數值欄位
-        for col in ["id_number", "selected_worker", "demand_worker"]:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype(int)
-        
-        # 轉型文字欄位
-        text_fields = ["phone", "line_id", "mission_name", "address", "work_time",
-                       "skills", "resources", "transport", "note", "photo", "role", "name", "other", "accepted_volunteers"]
-        for col in text_fields:
-            if col in df.columns:
-                df[col] = df[col].fillna("").astype(str).str.strip()
-        if "phone" in df.columns:
-            # ✅ 特別處理 phone 欄位：移除單引號並標準化
-            df["phone"] = df["phone"].apply(normalize_phone)
-
-        # ----- 新增容錯：確保後續程式會使用到的欄位都存在 -----
-        # 若缺少預期的數值欄位，補上預設 0
-        required_ints = ["id_number", "selected_worker", "demand_worker"]
-        for c in required_ints:
-            if c not in df.columns:
-                df[c] = 0
-            else:
-                df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype(int)
-        # 若缺少預期的文字欄位，補上空字串
-        required_texts = ["phone", "line_id", "mission_name", "address", "work_time",
-                          "skills", "resources", "transport", "note", "photo", "role", "name", "other", "accepted_volunteers"]
-        for c in required_texts:
-            if c not in df.columns:
-                df[c] = ""
-            else:
-                df[c] = df[c].fillna("").astype(str).str.strip()
-
-        # 最後再一次標準化 phone 欄位
-        df["phone"] = df["phone"].apply(normalize_phone)
+# 任務列表分頁：每頁張數可在 secrets 設定 mission_page_size，使用者也可在頁面上切換
+PAGE_SIZE_OPTIONS = [10, 20, 50]
+DEFAULT_PAGE_SIZE = int(st.secrets.get("mission_page_size", PAGE_SIZE_OPTIONS[0]))
+if DEFAULT_PAGE_SIZE not in PAGE_SIZE_OPTIONS:
+    PAGE_SIZE_OPTIONS = sorted(PAGE_SIZE_OPTIONS + [DEFAULT_PAGE_SIZE])
 
-        return df
-    except Exception as e:
-        st.error(f"讀取資料失敗: {e}")
-        return pd.DataFrame()
+# 依距離篩選的範圍（地址定位到鄉鎮層級，距離為概略值）
+RADIUS_OPTIONS = {"不限": None, "3 公里": 3, "5 公里": 5, "10 公里": 10, "20 公里": 20}
 
 # 輔助函式：翻譯與標籤顯示
 translate = {
@@ -263,81 +190,114 @@ transport_display = {
     "other": " 其他"
 }
 
-# ---------- accepted_volunteers 相關 helper ----------
-def format_vol_entry(name, phone):
-    """統一格式：Name(末3碼)。用於比對與顯示。"""
-    pn = normalize_phone(phone)
-    suffix = pn[-3:] if pn else ""
-    return f"{name}({suffix})"
-
-def parse_accepted_volunteers(text):
-    """把 accepted_volunteers 文字拆成清單（每行一筆），並去除空白。"""
-    if not text:
-        return []
-    return [l.strip() for l in str(text).splitlines() if l.strip()]
-
-def volunteer_signed_up_for_task(df, task_id, vol_name, vol_phone):
-    """檢查某志工（name + phone）是否已在指定任務的 accepted_volunteers 裡。"""
-    victim_rows = df[(df["role"] == "victim") & (df["id_number"] == int(task_id))]
-    if victim_rows.empty:
-        return False
-    acc_text = str(victim_rows.iloc[0].get("accepted_volunteers", "") or "")
-    entries = parse_accepted_volunteers(acc_text)
-    target = format_vol_entry(vol_name, vol_phone)
-    return target in entries
-
-def add_volunteer_to_task_on_sheet(df, task_id, vol_name, vol_phone):
+# ---------- 任務列表查詢（facet / 全文 / 距離索引） ----------
+@st.cache_resource(max_entries=4)
+def load_open_missions(_repo, version, today):
     """
-    將志工加入指定任務的 accepted_volunteers 並在 sheet 上更新 selected_worker 與 accepted_volunteers。
-    會回傳 True/False 表示是否成功；若失敗會 raise Exception 由呼叫端處理。
+    今天（含）之後的任務（已依固定順序排好、補上座標）+ 四個篩選欄位的 bitmask 索引
+    + 地址 / 名稱全文索引 + 座標網格索引。
+    以 (資料版本, 日期) 為 key，同一份資料只解析一次；回傳的物件是共用的，不可修改。
     """
-    # 取得工作表列號（DataFrame index -> Google Sheet row）
-    victim_idx = df.index[(df["role"] == "victim") & (df["id_number"] == int(task_id))]
-    if len(victim_idx) == 0:
-        raise ValueError("找不到指定任務在資料表中的列")
-    task_row_idx = victim_idx[0] + 2  # DataFrame index 0 -> sheet row 2
-
-    # 取得當前 selected_worker 與 accepted_volunteers
-    current_count_in_sheet = int(df.loc[df["id_number"] == int(task_id), "selected_worker"].iloc[0])
-    existing = str(df.loc[df["id_number"] == int(task_id), "accepted_volunteers"].iloc[0] or "")
-
-    new_entry = format_vol_entry(vol_name, vol_phone)
-    existing_list = parse_accepted_volunteers(existing)
-    if new_entry in existing_list:
-        # 已存在，不重複加入
-        return False
-
-    # 檢查是否已額滿
-    current_demand = int(df.loc[df["id_number"] == int(task_id), "demand_worker"].iloc[0])
-    if current_count_in_sheet >= current_demand:
-        raise ValueError("任務已額滿")
-
-    updated_val = (existing + "\n" + new_entry).strip()
-    # 找出 sheet 的欄位 index（使用 DataFrame 的欄位位置 +1）
-    selected_col = df.columns.get_loc("selected_worker") + 1
-    acc_col = df.columns.get_loc("accepted_volunteers") + 1
-
-    # 更新 sheet（gspread 的 update_cell 使用 1-index）
-    sheet.update_cell(task_row_idx, selected_col, current_count_in_sheet + 1)
-    sheet.update_cell(task_row_idx, acc_col, updated_val)
-    return True
+    missions = sort_missions(_repo.list_open_missions(today)).reset_index(drop=True)
+    missions = fill_coordinates(missions)
+    return (
+        missions,
+        FacetIndex(missions, FACET_OPTIONS),
+        TextIndex(missions),
+        GridIndex(missions["lat"], missions["lng"]),
+    )
 
-# ==========================================
-# 3. 程式主流程（以 page 控制，點「我要報名」會切換到 signup）
-# ==========================================
+@st.cache_resource(max_entries=4)
+def load_matching_engine(_repo, version, today):
+    """媒合引擎（任務端的時段 / 能力 bitmask、座標、剩餘名額），同樣只在資料版本改變時重建"""
+    missions, _, _, _ = load_open_missions(_repo, version, today)
+    return MatchingEngine(missions)
 
-# --- 步驟 A: 讀取最新資料 ---
-df = load_data()
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_match_scores(_repo, version, today, profile):
+    """
+    某位志工對每個任務的媒合分數（與 load_open_missions 的任務順序對應），
+    以 (資料版本, 日期, 志工資料) 為 key，同一份資料只算一次
+    """
+    return load_matching_engine(_repo, version, today).scores_for(profile)
 
-# 分離任務與志工
-if not df.empty:
-    missions = df[(df["role"] == "victim") & (df["demand_worker"] > 0)].copy()
-    volunteers = df[df["role"] == "volunteer"].copy()
-else:
-    missions = pd.DataFrame()
-    volunteers = pd.DataFrame()
+# ---------- 任務列表排序 / 分頁 ----------
+def sort_missions(df):
+    """
+    固定的排序：日期新的在前，同一天剩餘名額少的在前，最後依 id_number，
+    同樣的資料每次 rerun 順序都相同，換頁時才不會重複或漏掉任務
+    """
+    if df.empty:
+        return df
+    remaining = df["demand_worker"] - df["selected_worker"]
+    return (
+        df.assign(_remaining=remaining)
+        .sort_values(["date", "_remaining", "id_number"], ascending=[False, True, True], kind="mergesort")
+        .drop(columns="_remaining")
+    )
 
+def page_slice(df, page, page_size):
+    """回傳 (這一頁的資料, 修正後的頁碼, 總頁數)"""
+    total_pages = max(1, -(-len(df) // page_size))
+    page = min(max(1, int(page)), total_pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], page, total_pages
+
+# ---------- 身分驗證 helper ----------
+def parse_phone_input(raw):
+    """報名 / 查看聯絡資訊時輸入的手機號碼 → 標準化的 10 碼；格式不對回傳 None"""
+    phone = raw.strip()
+    if not phone.startswith("0") and len(phone) == 9:
+        phone = "0" + phone
+    phone = normalize_phone(phone)
+    if phone.isdigit() and len(phone) == 10 and phone.startswith("09"):
+        return phone
+    return None
+
+def volunteer_otp_step(key):
+    """
+    手機號碼 → 查志工註冊資料 → 簡訊驗證碼 → 登入。
+    驗證通過的那一次回傳 (row_key, record)，其他時候回傳 (None, None)。
+    """
+    pending_key = f"{key}_pending"
+    with st.form(f"{key}_form"):
+        verify_phone = st.text_input("請輸入您註冊時的手機號碼（09開頭）")
+        verify_submit = st.form_submit_button("驗證身份")
+
+    if verify_submit:
+        st.session_state.pop(pending_key, None)
+        phone = parse_phone_input(verify_phone) if verify_phone else None
+        if not verify_phone:
+            st.warning("❌ 請輸入手機號碼")
+        elif phone is None:
+            st.error("❌ 請輸入有效的台灣手機號碼（09開頭共10碼）")
+        elif not repo.is_ready():
+            st.error("❌ 無法讀取資料，請稍後再試")
+        else:
+            try:
+                throttle_lookup()
+            except OtpError as e:
+                st.error(f"❌ {e}")
+                return None, None
+            # 只要 role = "volunteer" 就算已註冊（走索引查詢，phone 已標準化）
+            if repo.find_user("volunteer", phone)[1] is None:
+                st.error("❌ 查無此手機號碼的註冊記錄，請先完成志工註冊！")
+            else:
+                st.session_state[pending_key] = phone
+
+    phone = st.session_state.get(pending_key)
+    if phone and otp_prompt(phone, key=f"{key}_otp"):
+        st.session_state.pop(pending_key)
+        vol_key, vol_info = repo.find_user("volunteer", phone)
+        if vol_info is not None:
+            # 順便登入，其他頁面（含查看聯絡資訊）不必再驗證
+            login("volunteer", vol_key, vol_info)
+            return vol_key, vol_info
+    return None, None
 
+# ==========================================
+# 3. 程式主流程（以 page 控制，點「我要報名」會切換到 signup）
+# ==========================================
 
 # ========== 聯絡資訊確認頁面 ==========
 if st.session_state.get("page") == "check_contact":
@@ -360,85 +320,55 @@ if st.session_state.get("page") == "check_contact":
         st.session_state["page"] = "task_list"
         safe_rerun()
     
-    if "contact_verified_volunteer" not in st.session_state:
-        with st.form("contact_verify_form"):
-            verify_phone = st.text_input("請輸入您報名時的手機號碼（09開頭）")
-            verify_submit = st.form_submit_button("驗證身份")
-        
-        if verify_submit:
-            if not verify_phone:
-                st.warning("❌ 請輸入手機號碼")
-            else:
-                # 標準化輸入
-                verify_phone = verify_phone.strip()
-                if not verify_phone.startswith("0") and len(verify_phone) == 9:
-                    verify_phone = "0" + verify_phone
-                verify_phone = normalize_phone(verify_phone)
-
-                if not (verify_phone.isdigit() and len(verify_phone) == 10 and verify_phone.startswith("09")):
-                    st.error("❌ 請輸入有效的台灣手機號碼（09開頭共10碼）")
-                else:
-                    # 重新讀取最新資料
-                    load_data.clear()
-                    df_fresh = load_data()
-                    if df_fresh.empty:
-                        st.error("❌ 無法讀取資料，請稍後再試")
-                        st.stop()
+    # 只有通過簡訊驗證（已登入）的志工能看；還沒登入就先驗證
+    _, me = current_user("volunteer")
+    if me is None:
+        if volunteer_otp_step("contact_verify")[1] is not None:
+            st.success("✅ 驗證成功！")
+            safe_rerun()
+        st.stop()
 
-                    # 檢查該手機是否存在於指定任務的 accepted_volunteers
-                    # 透過比對末三碼（與系統加入格式一致）
-                    victim_rows = df_fresh[(df_fresh["role"] == "victim") & (df_fresh["id_number"] == int(task_id))]
-                    if victim_rows.empty:
-                        st.error("❌ 找不到該任務")
-                        st.stop()
-                    acc_text = str(victim_rows.iloc[0].get("accepted_volunteers", "") or "")
-                    entries = parse_accepted_volunteers(acc_text)
-                    suffix = verify_phone[-3:] if verify_phone else ""
-                    matched = any(suffix and suffix in e for e in entries)
-                    
-                    if not matched:
-                        st.error("❌ 您尚未報名此任務，無法查看聯絡資訊！")
-                        if st.button("返回任務列表", key="cc_verify_fail_return"):
-                            st.session_state["page"] = "task_list"
-                            safe_rerun()
-                        st.stop()
-                    else:
-                        st.session_state["contact_verified_volunteer"] = verify_phone
-                        st.success("✅ 驗證成功！")
-                        safe_rerun()
+    # 檢查登入的志工是否報名了這個任務（報名關係以 id_number 比對，不會與同名、同末三碼的人混淆）
+    if st.session_state.get("contact_verified_volunteer") != task_id:
+        if not repo.is_ready():
+            st.error("❌ 無法讀取資料，請稍後再試")
+            st.stop()
+        if not repo.is_assigned(task_id, me["id_number"]):
+            st.error("❌ 您尚未報名此任務，無法查看聯絡資訊！")
+            if st.button("返回任務列表", key="cc_verify_fail_return"):
+                st.session_state["page"] = "task_list"
+                safe_rerun()
+            st.stop()
+        # 記住已確認的是哪一個任務，重新整理頁面時不必再比對
+        st.session_state["contact_verified_volunteer"] = task_id
+
+    # 已驗證，顯示受災戶聯絡資訊
+    st.success("✅ 驗證通過")
     
-    else:
-        # 已驗證，顯示受災戶聯絡資訊
-        st.success("✅ 驗證通過")
-        
-        load_data.clear()
-        df_fresh = load_data()
-        
-        victim_rows = df_fresh[(df_fresh["role"] == "victim") & (df_fresh["id_number"] == int(task_id))]
-        
-        if not victim_rows.empty:
-            vr = victim_rows.iloc[0]
-            victim_name = str(vr.get("name", "")).strip()
-            victim_phone = normalize_phone(str(vr.get("phone", "")).strip())
-            victim_line = str(vr.get("line_id", "")).strip()
-            victim_note = str(vr.get("note", "")).strip()
-            
-            st.markdown("### 📞 受災戶聯絡資訊")
-            st.write(f"**姓名：** {victim_name}")
-            st.write(f"**電話：** {victim_phone}")
-            st.write(f"**Line ID：** {victim_line}")
-            if victim_note:
-                st.write(f"**備註：** {victim_note}")
-        else:
-            st.warning("⚠ 無法找到受災戶聯絡資訊")
+    _, vr = repo.find_by_id(task_id, role="victim")
+    
+    if vr is not None:
+        victim_name = str(vr.get("name", "")).strip()
+        victim_phone = vr.get("phone_norm", "")
+        victim_line = str(vr.get("line_id", "")).strip()
+        victim_note = str(vr.get("note", "")).strip()
         
-        # 新增：已驗證狀態也提供返回按鈕（原本已存在，保留）
-        if st.button("🔙 返回任務列表", use_container_width=True, key="cc_back_verified"):
-            if "contact_verified_volunteer" in st.session_state:
-                del st.session_state["contact_verified_volunteer"]
-            st.session_state["page"] = "task_list"
-            safe_rerun()
+        st.markdown("### 📞 受災戶聯絡資訊")
+        st.write(f"**姓名：** {victim_name}")
+        st.write(f"**電話：** {victim_phone}")
+        st.write(f"**Line ID：** {victim_line}")
+        if victim_note:
+            st.write(f"**備註：** {victim_note}")
+    else:
+        st.warning("⚠ 無法找到受災戶聯絡資訊")
     
+    # 新增：已驗證狀態也提供返回按鈕（原本已存在，保留）
+    if st.button("🔙 返回任務列表", use_container_width=True, key="cc_back_verified"):
+        if "contact_verified_volunteer" in st.session_state:
+            del st.session_state["contact_verified_volunteer"]
+        st.session_state["page"] = "task_list"
+        safe_rerun()
+
     st.stop()
 
 # 分支：signup 頁面（驗證身份 + 報名流程）
@@ -455,78 +385,32 @@ if st.session_state.get("page") == "signup":
     st.title("報名任務")
     st.info("請先驗證您的志工身份（需先在系統中註冊）")
 
-    # 階段 1: 驗證身份（檢查是否已註冊）
+    # 已登入的志工直接使用登入身分，不必再驗證
+    _, me = current_user("volunteer")
+    if me is not None and "verified_volunteer" not in st.session_state:
+        st.session_state["verified_volunteer"] = {
+            "id_number": int(me["id_number"]),
+            "name": str(me.get("name", "")),
+            "phone": me.get("phone_norm", ""),
+            "line_id": str(me.get("line_id", "")),
+        }
+
+    # 階段 1: 驗證身份（已註冊 + 簡訊驗證碼）
     if "verified_volunteer" not in st.session_state:
-        with st.form("verify_form"):
-            verify_phone = st.text_input("請輸入您註冊時的手機號碼（09開頭）")
-            verify_submit = st.form_submit_button("驗證身份")
-        
-        if verify_submit:
-            # 基礎格式驗證
-            if not verify_phone:
-                st.warning("❌ 請輸入手機號碼")
-            else:
-                # 標準化輸入的手機號碼
-                verify_phone = verify_phone.strip()
-                if not verify_phone.startswith("0") and len(verify_phone) == 9:
-                    verify_phone = "0" + verify_phone
-                verify_phone = normalize_phone(verify_phone)
-
-                if not (verify_phone.isdigit() and len(verify_phone) == 10 and verify_phone.startswith("09")):
-                    st.error("❌ 請輸入有效的台灣手機號碼（09開頭共10碼）")
-                else:
-                    # 重新讀取最新資料以避免 race condition
-                    load_data.clear()
-                    df_fresh = load_data()
-
-                    if df_fresh.empty:
-                        st.error("❌ 無法讀取資料，請稍後再試")
-                        st.stop()
-
-                    # 標準化所有電話號碼
-                    df_fresh["phone"] = df_fresh["phone"].apply(normalize_phone)
-
-                    # 只要 role = "volunteer" 就算已註冊
-                    registered_vols = df_fresh[df_fresh["role"] == "volunteer"].copy()
-
-                    # 嘗試直接比對
-                    matching_vol = registered_vols[registered_vols["phone"] == verify_phone]
-
-                    # 如果找不到，嘗試移除空格與 dash 比對
-                    if matching_vol.empty:
-                        verify_phone_clean = verify_phone.replace(" ", "").replace("-", "")
-                        matching_vol = registered_vols[
-                            registered_vols["phone"].str.replace(" ", "").str.replace("-", "") == verify_phone_clean
-                        ]
-
-                    if matching_vol.empty:
-                        st.error("❌ 查無此手機號碼的註冊記錄，請先完成志工註冊！")
-                        st.info(f" 提示：您輸入的號碼是 {verify_phone}")
-                        if len(registered_vols) > 0:
-                            masked_phones = [f"{p[:4]}****{p[-2:]}" for p in registered_vols["phone"].tolist()[:5]]
-                            st.info(f"資料庫中已註冊電話範例：{', '.join(masked_phones)}")
-                        if st.button("返回任務列表", key="signup_verify_fail_return"):
-                            st.session_state["page"] = "task_list"
-                            safe_rerun()
-                        st.stop()
-                    else:
-                        # 驗證成功，取一筆代表資料
-                        if len(matching_vol) > 1:
-                            registration_record = matching_vol[matching_vol["id_number"] == 0]
-                            if not registration_record.empty:
-                                vol_info = registration_record.iloc[0]
-                            else:
-                                vol_info = matching_vol.iloc[0]
-                        else:
-                            vol_info = matching_vol.iloc[0]
-
-                        st.session_state["verified_volunteer"] = {
-                            "name": str(vol_info.get("name", "")),
-                            "phone": verify_phone,
-                            "line_id": str(vol_info.get("line_id", ""))
-                        }
-                        st.success(f"✅ 驗證成功！歡迎 {vol_info.get('name', '志工')}！")
-                        safe_rerun()
+        # 驗證成功（索引以 Sheet 中最上面的那筆註冊資料為代表）
+        _, vol_info = volunteer_otp_step("signup_verify")
+        if vol_info is not None:
+            st.session_state["verified_volunteer"] = {
+                "id_number": int(vol_info["id_number"]),
+                "name": str(vol_info.get("name", "")),
+                "phone": vol_info["phone_norm"],
+                "line_id": str(vol_info.get("line_id", ""))
+            }
+            st.success(f"✅ 驗證成功！歡迎 {vol_info.get('name', '志工')}！")
+            safe_rerun()
+        if st.button("返回任務列表", key="signup_verify_fail_return"):
+            st.session_state["page"] = "task_list"
+            safe_rerun()
 
     # 階段 2: 已驗證身份，進行報名
     else:
@@ -550,10 +434,7 @@ if st.session_state.get("page") == "signup":
             st.stop()
 
         # 重新檢查是否已報名此任務
-        load_data.clear()
-        df_fresh = load_data()
-
-        if df_fresh.empty:
+        if not repo.is_ready():
             st.error("無法讀取任務資料，請稍後再試。")
             if st.button("返回任務列表", key="signup_df_empty_return"):
                 st.session_state["page"] = "task_list"
@@ -561,10 +442,8 @@ if st.session_state.get("page") == "signup":
                 safe_rerun()
             st.stop()
 
-        df_fresh["phone"] = df_fresh["phone"].apply(normalize_phone)
-
-        # 檢查此志工是否已報名此任務（改用 victim.accepted_volunteers）
-        already_signed = volunteer_signed_up_for_task(df_fresh, task_id, vol_info["name"], vol_info["phone"])
+        # 檢查此志工是否已報名此任務（報名關係的索引查詢）
+        already_signed = repo.is_assigned(task_id, vol_info["id_number"])
         
         if already_signed:
             st.error("❌ 您已經報名過此任務，請勿重複報名！")
@@ -582,9 +461,8 @@ if st.session_state.get("page") == "signup":
             st.stop()
 
         # 顯示任務資訊
-        task_info = df_fresh[(df_fresh["role"] == "victim") & (df_fresh["id_number"] == int(task_id))]
-        if not task_info.empty:
-            task = task_info.iloc[0]
+        _, task = repo.find_by_id(task_id, role="victim")
+        if task is not None:
             st.markdown("### 報名任務資訊")
             st.write(f"**任務名稱：** {task.get('mission_name', '未命名任務')}")
             st.write(f"**地址：** {task.get('address', '')}")
@@ -597,25 +475,22 @@ if st.session_state.get("page") == "signup":
             if st.button("✅ 確認報名", type="primary", use_container_width=True, key=f"signup_confirm_{task_id}"):
 
                 try:
-                    # 嘗試把志工加入任務（包含名額檢查）
-                    added = add_volunteer_to_task_on_sheet(df_fresh, task_id, vol_info["name"], vol_info["phone"])
+                    # 嘗試把志工加入任務（包含名額檢查；同一任務的報名會排隊、不會超收）
+                    added = repo.add_volunteer(task_id, vol_info["id_number"], vol_info["name"], vol_info["phone"])
                     if not added:
                         st.error("❌ 您已經報名過此任務，請勿重複報名！")
                         st.stop()
+                    record_signup(task_id, vol_info["name"], vol_info["phone"], source="self")
 
-                    # 清除 cache 並更新 session state
-                    load_data.clear()
-                    st.session_state["user_phone"] = vol_info["phone"]
+                    # 更新 session state（共用快照已在寫入後作廢）
                     st.session_state["my_new_tasks"].append(int(task_id))
 
                     # 取得受災戶聯絡資訊（以最新資料為準）
-                    load_data.clear()
-                    df_after = load_data()
-                    victim_rows = df_after[(df_after["role"] == "victim") & (df_after["id_number"] == int(task_id))]
-                    victim_name = victim_rows.iloc[0].get("name", "") if not victim_rows.empty else ""
-                    victim_phone = normalize_phone(victim_rows.iloc[0].get("phone", "")) if not victim_rows.empty else ""
-                    victim_line = victim_rows.iloc[0].get("line_id", "") if not victim_rows.empty else ""
-                    victim_note = victim_rows.iloc[0].get("note", "") if not victim_rows.empty else ""
+                    _, vr = repo.find_by_id(task_id, role="victim")
+                    victim_name = vr.get("name", "") if vr is not None else ""
+                    victim_phone = vr.get("phone_norm", "") if vr is not None else ""
+                    victim_line = vr.get("line_id", "") if vr is not None else ""
+                    victim_note = vr.get("note", "") if vr is not None else ""
 
                     # 建立聯絡資訊
                     if victim_name or victim_phone or victim_line or victim_note:
@@ -666,125 +541,203 @@ LineID：{victim_line}
 st.title("災後人力媒合平台（熱心民眾端）")
 st.caption("以下為受災戶上傳的最新需求")
 
+# 今天（含）之後的任務 + facet 索引：只在資料版本或日期改變時重建，不是每次 rerun
+taiwan_tz = timezone(timedelta(hours=8))
+today_tw = datetime.now(taiwan_tz).strftime("%Y-%m-%d")
+data_version = repo.data_version()
+open_missions, facets, text_index, geo_index = load_open_missions(repo, data_version, today_tw)
+
+# 已登入的志工：個人資料（可服務時段、能力、交通方式）直接用登入 session 裡的資料
+_, me = current_user("volunteer")
+volunteer_profile = (
+    {c: me.get(c, "") for c in ["name", "work_time", "skills", "transport", "address", "lat", "lng"]}
+    if me is not None else None
+)
+
+# 0. 為我推薦：依時段、能力、距離與缺人程度幫志工挑出最適合的任務
+with st.expander("🎯 為我推薦任務", expanded=volunteer_profile is not None):
+    if volunteer_profile is not None:
+        rec_vol = volunteer_profile
+        st.caption(f"依 {volunteer_profile['name']} 的志工資料推薦（可在登入頁更新）")
+    else:
+        # 推薦會用到志工的住址與能力，要先簡訊驗證登入，不能只憑電話查別人的資料
+        rec_vol = None
+        st.caption("請先驗證志工身份，系統會依您的志工資料推薦任務。")
+        if volunteer_otp_step("recommend")[1] is not None:
+            safe_rerun()
+    if rec_vol is not None:
+        engine = load_matching_engine(repo, data_version, today_tw)
+        picks = engine.shortlist(rec_vol, k=5)
+        if picks.empty:
+            st.info("目前沒有適合您的任務，可以直接瀏覽下方的任務列表。")
+        for _, pick in picks.iterrows():
+            pick_id = int(pick["id_number"])
+            info_col, btn_col = st.columns([4, 1])
+            with info_col:
+                title = str(pick.get("mission_name", "")).strip() or str(pick.get("address", "")).strip()
+                st.markdown(
+                    f"**{title}**　{pick.get('address', '')}　"
+                    f"（人數 {pick['selected_worker']} / {pick['demand_worker']}，媒合分數 {pick['match_score']:.0%}）"
+                )
+            with btn_col:
+                if st.button("我要報名", key=f"recommend_{pick_id}"):
+                    st.session_state["page"] = "signup"
+                    st.session_state["selected_task_id"] = pick_id
+                    safe_rerun()
+
 # 1. 搜尋過濾
+# 反向映射字典（從顯示文字找回原始 key）
+time_reverse = {v: k for k, v in time_display.items()}
+skills_reverse = {v: k for k, v in skills_display.items()}
+resources_reverse = {v: k for k, v in resources_display.items()}
+transport_reverse = {v: k for k, v in transport_display.items()}
+
+def facet_multiselect(label, column, display, reverse, placeholder):
+    """選項旁邊顯示目前有幾筆任務（由 bitmask 直接算出）"""
+    counts = facets.counts(column)
+    return st.multiselect(
+        label,
+        list(display.values()),
+        format_func=lambda o: f"{o} ({counts.get(reverse[o], 0)})",
+        placeholder=placeholder,
+    )
+
 st.subheader(" 篩選條件")
 
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    time_options = list(time_display.values())
-    selected_times = st.multiselect("工作時間", time_options, placeholder="選擇時段")
+    selected_times = facet_multiselect("工作時間", "work_time", time_display, time_reverse, "選擇時段")
 
 with col2:
-    skill_options = list(skills_display.values())
-    selected_skills = st.multiselect("能力需求", skill_options, placeholder="選擇技能")
+    selected_skills = facet_multiselect("能力需求", "skills", skills_display, skills_reverse, "選擇技能")
 
 with col3:
-    resource_options = list(resources_display.values())
-    selected_resources = st.multiselect("提供資源", resource_options, placeholder="選擇資源")
+    selected_resources = facet_multiselect("提供資源", "resources", resources_display, resources_reverse, "選擇資源")
 
 with col4:
-    transport_options = list(transport_display.values())
-    selected_transports = st.multiselect("建議交通", transport_options, placeholder="選擇交通方式")
+    selected_transports = facet_multiselect("建議交通", "transport", transport_display, transport_reverse, "選擇交通方式")
+
+# 鄉鎮市區（由地址解析）+ 地址 / 任務名稱關鍵字搜尋
+township_counts = text_index.township_counts()
+town_col, keyword_col = st.columns([1, 3])
+with town_col:
+    selected_townships = st.multiselect(
+        "鄉鎮市區",
+        list(township_counts),
+        format_func=lambda t: f"{t} ({township_counts[t]})",
+        placeholder="選擇鄉鎮市區",
+    )
+with keyword_col:
+    keyword = st.text_input(
+        " 地址關鍵字搜尋", placeholder="輸入地址或任務關鍵字，多個關鍵字以空白分隔（例如：光復鄉 大進村）"
+    )
 
-# 地址關鍵字搜尋
-keyword = st.text_input(" 地址關鍵字搜尋", placeholder="輸入地址關鍵字")
+# 我的位置：用同一份座標表定位，可依距離排序或只看附近的任務
+loc_col, radius_col, order_col = st.columns([2, 1, 1])
+with loc_col:
+    my_location = st.text_input("📍 我的位置（可選填）", placeholder="輸入地址或鄉鎮市，例如：花蓮縣光復鄉")
+with radius_col:
+    radius_label = st.selectbox("距離範圍", list(RADIUS_OPTIONS), disabled=not my_location.strip())
+with order_col:
+    sort_by_distance = st.checkbox("依距離排序（近到遠）", disabled=not my_location.strip())
+
+my_point = geocode(my_location) if my_location.strip() else None
+if my_location.strip() and my_point is None:
+    st.warning("找不到這個位置，請輸入包含鄉鎮市名稱的地址，例如：花蓮縣光復鄉")
+radius_km = RADIUS_OPTIONS[radius_label] if my_point else None
+
+# 已登入且有志工資料：預設只顯示適合的任務，並依媒合分數排序（分數每份資料只算一次）
+fit_mode = volunteer_profile is not None and st.checkbox(
+    "🎯 只顯示適合我的任務（依適合程度排序）", value=True, key="fit_mode"
+)
+match_scores = load_match_scores(repo, data_version, today_tw, volunteer_profile) if fit_mode else None
 
 # 搜尋按鈕
 search_button = st.button("🔍 開始搜尋", type="primary", use_container_width=False, key="search_btn")
 
-# 反向映射字典（從顯示文字找回原始 key）
-time_reverse = {v: k for k, v in time_display.items()}
-skills_reverse = {v: k for k, v in skills_display.items()}
-resources_reverse = {v: k for k, v in resources_display.items()}
-transport_reverse = {v: k for k, v in transport_display.items()}
-
-# 初始化過濾結果
-filtered_missions = missions.copy()
-
-# 只有按下搜尋按鈕或有任何選項時才進行過濾
-if search_button or selected_times or selected_skills or selected_resources or selected_transports or keyword:
-    # 過濾工作時間（OR 邏輯：符合任一選項即可）
-    if selected_times:
-        time_keys = [time_reverse[t] for t in selected_times]
-        time_filter = filtered_missions["work_time"].apply(
-            lambda x: any(key in str(x) for key in time_keys)
-        )
-        filtered_missions = filtered_missions[time_filter]
-
-    # 過濾技能（OR 邏輯：符合任一選項即可）
-    if selected_skills:
-        skill_keys = [skills_reverse[s] for s in selected_skills]
-        skill_filter = filtered_missions["skills"].apply(
-            lambda x: any(key in str(x) for key in skill_keys)
-        )
-        filtered_missions = filtered_missions[skill_filter]
-
-    # 過濾資源（OR 邏輯：符合任一選項即可）
-    if selected_resources:
-        resource_keys = [resources_reverse[r] for r in selected_resources]
-        resource_filter = filtered_missions["resources"].apply(
-            lambda x: any(key in str(x) for key in resource_keys)
-        )
-        filtered_missions = filtered_missions[resource_filter]
-
-    # 過濾交通方式（OR 邏輯：符合任一選項即可）
-    if selected_transports:
-        transport_keys = [transport_reverse[t] for t in selected_transports]
-        transport_filter = filtered_missions["transport"].apply(
-            lambda x: any(key in str(x) for key in transport_keys)
-        )
-        filtered_missions = filtered_missions[transport_filter]
-
-    # 過濾地址關鍵字
-    if keyword:
-        k = keyword.strip()
-        filtered_missions = filtered_missions[
-            filtered_missions["address"].str.contains(k, case=False, na=False)
-        ]
-
-st.write(f"共 {len(filtered_missions)} 筆需求")
+# 過濾（只取今天（含）之後的任務）：全部是索引上的向量化運算，沒有選任何條件時等於不過濾
+# 四個 facet：同一欄內 OR（符合任一選項即可）、不同欄之間 AND，整個代碼比對（不是子字串）
+keep = facets.filter({
+    "work_time": [time_reverse[t] for t in selected_times],
+    "skills": [skills_reverse[s] for s in selected_skills],
+    "resources": [resources_reverse[r] for r in selected_resources],
+    "transport": [transport_reverse[t] for t in selected_transports],
+})
+keep &= text_index.township_mask(selected_townships)
+if radius_km:
+    keep &= geo_index.within(my_point[0], my_point[1], radius_km)
+if fit_mode:
+    keep &= match_scores >= MIN_SCORE
+
+# 地址 / 任務名稱關鍵字：走 bigram 索引，結果依符合程度排序（同分維持原本的順序）
+ranked = text_index.search(keyword)
+positions = np.flatnonzero(keep) if ranked is None else np.array([p for p in ranked if keep[p]], dtype=int)
+if fit_mode and ranked is None:
+    positions = positions[np.argsort(-match_scores[positions], kind="stable")]
+
+if my_point:
+    distances = geo_index.distances(my_point[0], my_point[1])
+    if sort_by_distance:
+        # 穩定排序：同距離維持原本順序，沒有座標的任務排在最後
+        positions = positions[np.argsort(distances[positions], kind="stable")]
+    filtered_missions = open_missions.iloc[positions].assign(distance_km=distances[positions])
+else:
+    filtered_missions = open_missions.iloc[positions]
+if fit_mode:
+    filtered_missions = filtered_missions.assign(match_score=match_scores[positions])
+
+# 分頁：只渲染目前這一頁的卡片，任務再多每次 rerun 的元素數量也固定
+# （open_missions 已依固定順序排好，篩選不會打亂順序；
+#   有關鍵字時依符合程度、只顯示適合我的任務時依媒合分數、選距離排序時依距離）
+total_missions = len(filtered_missions)
+
+# 篩選條件改變時回到第一頁
+filter_key = (
+    tuple(selected_times), tuple(selected_skills), tuple(selected_resources),
+    tuple(selected_transports), tuple(selected_townships), keyword.strip(),
+    my_location.strip(), radius_label, sort_by_distance, fit_mode, today_tw,
+)
+if st.session_state.get("list_filter_key") != filter_key:
+    st.session_state["list_filter_key"] = filter_key
+    st.session_state["list_page"] = 1
+
+info_col, size_col = st.columns([3, 1])
+with size_col:
+    page_size = st.selectbox(
+        "每頁顯示",
+        PAGE_SIZE_OPTIONS,
+        index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE),
+        key="list_page_size",
+    )
+page_missions, current_page, total_pages = page_slice(
+    filtered_missions, st.session_state["list_page"], page_size
+)
+st.session_state["list_page"] = current_page
+
+with info_col:
+    if total_missions:
+        first = (current_page - 1) * page_size + 1
+        last = first + len(page_missions) - 1
+        st.write(f"共 {total_missions} 筆需求（第 {first}-{last} 筆，第 {current_page} / {total_pages} 頁）")
+    else:
+        st.write("共 0 筆需求")
 st.markdown("---")
 
-# 2. 預先計算所有任務的「目前人數」 (避免在迴圈內算)
-# mission_counts 會使用 volunteers 的 id_number 欄位（load_data 已確保該欄位存在）
-mission_counts = volunteers["id_number"].value_counts().to_dict() if not volunteers.empty else {}
-
-# 3. 判斷「當前使用者」的狀態
-current_user_phone = st.session_state.get("user_phone")
+# 2. 判斷「當前使用者」的狀態（me 在上面載入志工資料時已取得）
 
-# 找出使用者在 Sheet 裡報名過的任務 ID（透過 accepted_volunteers）
-joined_in_sheet = []
-if current_user_phone and not missions.empty:
-    # 找出 victim rows where accepted_volunteers contains user's suffix
-    suffix = normalize_phone(current_user_phone)[-3:] if current_user_phone else ""
-    if suffix:
-        for iid, vr in missions.set_index("id_number").iterrows():
-            acc = str(vr.get("accepted_volunteers", "") or "")
-            if acc and any(suffix in e for e in parse_accepted_volunteers(acc)):
-                joined_in_sheet.append(iid)
+# 使用者已報名的任務 ID（報名關係的索引查詢，不掃所有任務）
+joined_in_sheet = sorted(repo.missions_for_volunteer(me["id_number"])) if me is not None else []
 
 # 合併「Sheet 裡的舊紀錄」和「剛按下報名的新紀錄」
 all_my_joined_tasks = set(joined_in_sheet + st.session_state["my_new_tasks"])
 has_joined_any = len(all_my_joined_tasks) > 0 # 是否已經報名過任一項
-# ------- 新增：隱藏「已過期」的任務 -------
-taiwan_tz = timezone(timedelta(hours=8))
-today_tw = datetime.now(taiwan_tz).strftime("%Y-%m-%d")
-
-def is_future_or_today(date_str):
-    if not str(date_str).strip():
-        return False
-    try:
-        d = datetime.strptime(str(date_str).strip(), "%Y-%m-%d")
-        t = datetime.strptime(today_tw, "%Y-%m-%d")
-        return d >= t
-    except Exception:
-        return False
+# 這一頁的照片縮圖（經過 LRU 快取，沒快取到的同時下載）；卡片只放縮圖，原圖另開連結
+page_photos = [p for p in page_missions["photo"].astype(str).str.strip() if p.startswith("http")]
+thumbnails = get_thumbnail_cache().get_many(page_photos)
 
-filtered_missions = filtered_missions[filtered_missions["date"].apply(is_future_or_today)]
-
-# 4. 顯示卡片迴圈
-for idx, row in filtered_missions.iterrows():
+# 3. 顯示卡片迴圈（「已過期」的任務在查詢時已排除；只顯示目前這一頁）
+for idx, row in page_missions.iterrows():
     tid = int(row["id_number"])
     
     # 取得該任務目前人數 (加上使用者剛報名但還沒同步到 sheet 的部分)
@@ -811,6 +764,12 @@ for idx, row in filtered_missions.iterrows():
         task_date = str(row.get("date", "")).strip()
         if task_date:
             st.markdown(f"🕒 日期： {task_date}")
+        match_score = row.get("match_score")
+        if match_score is not None and not pd.isna(match_score):
+            st.markdown(f"🎯 適合度 {match_score:.0%}")
+        distance = row.get("distance_km")
+        if distance is not None and not pd.isna(distance):
+            st.markdown(f"📍 距離約 {distance:.1f} 公里")
     
         time_html = f'<span style="font-weight:600;margin-right:20px"> 工作時間：</span>{render_labels(row["work_time"], time_display, "#FFF8EC")}'
         st.markdown(time_html, unsafe_allow_html=True)
@@ -860,8 +819,27 @@ for idx, row in filtered_missions.iterrows():
     with right:
         photo = str(row.get("photo", "")).strip()
         if photo.startswith("http"):
-            st.image(photo, use_column_width=True)
+            thumb = thumbnails.get(photo)
+            if thumb:
+                st.image(thumb, use_column_width=True)
+            else:
+                st.caption("照片暫時無法載入")
+            st.markdown(f"[🔍 查看原圖]({photo})")
         else:
             st.info("尚無照片")
             
     st.markdown("<div class='card-spacer'></div>", unsafe_allow_html=True)
+
+# 4. 換頁
+if total_pages > 1:
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("⬅ 上一頁", disabled=current_page <= 1, key="list_prev"):
+            st.session_state["list_page"] = current_page - 1
+            safe_rerun()
+    with page_col:
+        st.markdown(f"<div style='text-align:center'>第 {current_page} / {total_pages} 頁</div>", unsafe_allow_html=True)
+    with next_col:
+        if st.button("下一頁 ➡", disabled=current_page >= total_pages, key="list_next"):
+            st.session_state["list_page"] = current_page + 1
+            safe_rerun()
@@ -0,0 +1,117 @@
+import streamlit as st
+import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from archive_store import record_signup
+from auth_session import require_coordinator
+from matching import MatchingEngine, unassigned_volunteers
+from storage import get_repository
+
+st.set_page_config(page_title="協調者批次媒合", layout="wide")
+
+# ---------- 資料來源（Sheets / SQLite / 記憶體，由 secrets 決定） ----------
+repo = get_repository()
+
+# ---------- 協調者驗證（密碼設定在 secrets 的 coordinator_password） ----------
+st.title("協調者批次媒合")
+require_coordinator("使用批次媒合")
+
+st.caption("依時段、能力、距離與缺人程度，一次替所有尚未報名的志工找出最適合的任務（每人一項）。")
+
+
+@st.cache_resource
+def get_assign_executor():
+    """批次指派在背景執行緒跑：按下去之後就算重新整理或斷線，也會做完"""
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-assign")
+
+
+def run_batch_assign(plan):
+    """整批交給 repo.add_volunteers（Sheets 只用固定幾次 API 呼叫），回傳 (成功, 已在任務中, 失敗訊息)"""
+    signups = list(
+        plan[["mission_id", "volunteer_id", "volunteer_name", "volunteer_phone"]].itertuples(index=False, name=None)
+    )
+    results = repo.add_volunteers(signups)
+    failed = []
+    for (mission_id, _, name, phone), result in zip(signups, results):
+        if result is True:
+            record_signup(mission_id, name, phone, source="coordinator")
+        elif result is not False:
+            failed.append(f"任務 {mission_id} / {name}：{result}")
+    return sum(r is True for r in results), sum(r is False for r in results), failed
+
+
+# ---------- 上一次批次指派的結果 ----------
+job = st.session_state.get("assign_job")
+if job is not None:
+    if not job.done():
+        st.info("⏳ 批次指派進行中…（在背景執行，重新整理頁面也不會中斷）")
+        time.sleep(1)
+        st.rerun()
+    del st.session_state["assign_job"]
+    try:
+        done, skipped, failed = job.result()
+    except Exception as e:
+        st.error(f"❌ 批次指派失敗：{e}")
+    else:
+        st.success(f"🎉 已指派 {done} 筆（已在任務中 {skipped} 筆、失敗 {len(failed)} 筆）")
+        for msg in failed:
+            st.warning(msg)
+
+taiwan_tz = timezone(timedelta(hours=8))
+today_tw = datetime.now(taiwan_tz).strftime("%Y-%m-%d")
+
+# ---------- 1. 計算媒合建議 ----------
+if st.button("🔄 計算媒合建議", type="primary"):
+    missions = repo.list_open_missions(today_tw)
+    volunteers = unassigned_volunteers(repo.list_by_role("volunteer"), missions, repo.list_assignments())
+    engine = MatchingEngine(missions)
+    with st.spinner("計算中…"):
+        result = engine.assign(volunteers)
+
+    plan = pd.DataFrame({
+        "mission_id": engine.missions["id_number"].to_numpy()[result["mission_pos"].astype(int)],
+        "mission_name": engine.missions["mission_name"].to_numpy()[result["mission_pos"].astype(int)],
+        "address": engine.missions["address"].to_numpy()[result["mission_pos"].astype(int)],
+        "volunteer_id": volunteers["id_number"].to_numpy()[result["volunteer_pos"].astype(int)],
+        "volunteer_name": volunteers["name"].to_numpy()[result["volunteer_pos"].astype(int)],
+        "volunteer_phone": volunteers["phone_norm"].to_numpy()[result["volunteer_pos"].astype(int)],
+        "score": result["score"].round(2).to_numpy(),
+    })
+    st.session_state["match_plan"] = plan.sort_values(["mission_id", "score"], ascending=[True, False])
+    st.session_state["match_stats"] = {
+        "volunteers": len(volunteers),
+        "missions": len(engine.missions),
+        "slots": int(engine.remaining.sum()),
+    }
+
+plan = st.session_state.get("match_plan")
+if plan is None:
+    st.stop()
+
+stats = st.session_state["match_stats"]
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("尚未報名的志工", stats["volunteers"])
+c2.metric("還缺人的任務", stats["missions"])
+c3.metric("剩餘名額", stats["slots"])
+c4.metric("建議指派", len(plan))
+
+st.dataframe(
+    plan.drop(columns="volunteer_id").rename(columns={
+        "mission_id": "任務編號", "mission_name": "任務", "address": "地址",
+        "volunteer_name": "志工", "volunteer_phone": "志工電話", "score": "媒合分數",
+    }),
+    use_container_width=True,
+    hide_index=True,
+)
+
+# ---------- 2. 一鍵批次指派 ----------
+if plan.empty:
+    st.info("目前沒有可指派的組合。")
+    st.stop()
+
+if st.button(f"✅ 一鍵批次指派（{len(plan)} 筆）"):
+    # add_volunteers 內含名額檢查，批次期間有人自行報名也不會超收
+    st.session_state["assign_job"] = get_assign_executor().submit(run_batch_assign, plan)
+    del st.session_state["match_plan"]
+    st.rerun()
@@ -0,0 +1,105 @@
+import streamlit as st
+from datetime import datetime, timedelta, timezone
+from analytics import fill_rate_by_skill, missions_per_township_per_day, signups_per_day
+from auth_session import require_coordinator
+import json
+import pandas as pd
+from sheet_writer import get_writer
+from sheets_client import get_metrics
+
+st.set_page_config(page_title="歷史資料分析", layout="wide")
+
+# ---------- 協調者驗證（與批次媒合共用 coordinator_password） ----------
+st.title("歷史資料分析")
+require_coordinator("查看歷史資料")
+
+st.caption("資料來自每晚 20:00 下架前封存的每日快照與報名紀錄（當天的資料要到下架後才會出現）。")
+
+# ---------- 查詢（封存檔每天只更新一次，結果快取 10 分鐘） ----------
+SKILL_LABELS = {
+    "supplies distribution": "物資",
+    "cleaning": "清掃",
+    "medical": "醫療",
+    "heavy lifting": "搬運",
+    "driver's license": "駕照",
+    "other": "其他",
+}
+SOURCE_LABELS = {"self": "志工自行報名", "coordinator": "協調者指派"}
+
+
+@st.cache_data(ttl=600)
+def query_township(start, end):
+    return missions_per_township_per_day(start, end)
+
+
+@st.cache_data(ttl=600)
+def query_skills(start, end):
+    return fill_rate_by_skill(start, end)
+
+
+@st.cache_data(ttl=600)
+def query_signups(start, end):
+    return signups_per_day(start, end)
+
+
+taiwan_tz = timezone(timedelta(hours=8))
+today_tw = datetime.now(taiwan_tz).date()
+picked = st.date_input("日期區間", value=(today_tw - timedelta(days=13), today_tw), max_value=today_tw)
+if len(picked) != 2:
+    st.info("請選擇結束日期。")
+    st.stop()
+start, end = (d.strftime("%Y-%m-%d") for d in picked)
+
+# ---------- 1. 各鄉鎮每日任務數 ----------
+st.subheader("各鄉鎮市區每日任務數")
+township = query_township(start, end)
+if township.empty:
+    st.info("這段期間沒有封存的任務資料。")
+else:
+    st.bar_chart(township)
+    st.dataframe(township, use_container_width=True)
+
+# ---------- 2. 各能力的媒合率 ----------
+st.subheader("各能力需求的媒合率")
+skills = query_skills(start, end)
+if skills.empty:
+    st.info("這段期間沒有填寫能力需求的任務。")
+else:
+    st.dataframe(
+        skills.assign(skill=skills["skill"].map(lambda s: SKILL_LABELS.get(s, s))).rename(columns={
+            "skill": "能力", "missions": "任務數", "demand": "需求人數",
+            "selected": "已報名人數", "fill_rate": "媒合率",
+        }),
+        use_container_width=True,
+        hide_index=True,
+        column_config={"媒合率": st.column_config.ProgressColumn(min_value=0, max_value=1, format="%.2f")},
+    )
+
+# ---------- 3. 每日報名數 ----------
+st.subheader("每日報名數")
+signups = query_signups(start, end)
+if signups.empty:
+    st.info("這段期間沒有報名紀錄。")
+else:
+    st.bar_chart(signups.rename(columns=SOURCE_LABELS))
+
+# ---------- 4. Google Sheets API 用量（只有 Sheets 後端才有） ----------
+if st.secrets.get("storage_backend", "sheets") == "sheets":
+    st.subheader("Google Sheets API 用量")
+    st.caption("這個 process 啟動以來的呼叫次數、延遲（秒）、重試與配額排隊；重新整理頁面即更新。")
+    st.json(get_metrics())
+
+    # 背景寫入重試後仍失敗的資料不會自動重送，需要人工補登到 Sheet
+    st.subheader("寫入失敗的資料")
+    failed = get_writer().failed()
+    if not failed:
+        st.info("目前沒有寫入失敗的資料。")
+    else:
+        st.warning(f"有 {len(failed)} 筆寫入沒有成功，請對照下表手動補登到 Google Sheet。")
+        st.dataframe(
+            pd.DataFrame(failed).assign(values=lambda df: df["values"].map(lambda v: json.dumps(v, ensure_ascii=False)))
+            .rename(columns={"at": "時間（UTC）", "worksheet": "工作表", "kind": "類型", "range": "範圍",
+                             "values": "內容", "error": "錯誤"}),
+            use_container_width=True,
+            hide_index=True,
+        )
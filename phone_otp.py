@@ -0,0 +1,276 @@
+"""
+手機簡訊一次性驗證碼（OTP）：登入、受災戶驗證、志工報名、查看受災戶聯絡資訊之前，
+都要先收簡訊輸入驗證碼，只知道電話號碼不能冒用別人的身分。
+
+- 驗證碼 6 位數字，CODE_TTL 內有效，最多輸入錯 MAX_VERIFY_ATTEMPTS 次；
+  只存加鹽的 hash（本機 SQLite），驗證通過或過期就作廢
+- 寄送次數限制：同一支電話 PHONE_LIMIT、同一個 IP IP_LIMIT，兩次寄送至少間隔 RESEND_COOLDOWN；
+  查詢電話是否註冊也限制同一個 IP 的次數（LOOKUP_LIMIT），避免被拿來逐一試電話
+- 簡訊經由 SmsGateway 送出，由 secrets 的 sms_gateway 決定：
+  "console"（預設，寫 log 並附加到 OTP_OUTBOX_PATH，本機測試用）或 "http"（secrets 的 [sms] url / api_key）
+
+驗證通過後由呼叫端 auth_session.login() 發 token，之後各頁面的檢查只看 session，不再查資料或寄簡訊。
+"""
+import hashlib
+import hmac
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import requests
+import streamlit as st
+
+OTP_DB_PATH = "otp.sqlite3"
+OTP_OUTBOX_PATH = "otp_outbox.log"
+CODE_LENGTH = 6
+CODE_TTL = 5 * 60             # 秒：驗證碼有效時間
+MAX_VERIFY_ATTEMPTS = 5       # 同一組驗證碼最多輸入錯幾次
+RESEND_COOLDOWN = 60          # 秒：同一支電話兩次寄送的間隔
+PHONE_LIMIT = (5, 3600)       # 同一支電話：每小時最多寄 5 次
+# IP 的上限是整個對外 IP 共用的：行動網路的 CGNAT、收容所 / 避難所的共用 Wi-Fi 後面
+# 可能有上百個正常使用者，所以比單一電話寬很多；這裡只擋從同一處大量寄送或逐一試電話
+IP_LIMIT = (60, 3600)         # 同一個 IP：每小時最多寄 60 次
+LOOKUP_LIMIT = (120, 3600)    # 同一個 IP：每小時最多查 120 次電話
+SMS_TIMEOUT = 10              # 秒
+
+logger = logging.getLogger(__name__)
+
+
+class OtpError(Exception):
+    """寄送或驗證被拒絕（次數過多、過期等）；訊息可直接顯示給使用者"""
+
+
+# ---------- 簡訊閘道 ----------
+class SmsGateway(ABC):
+    @abstractmethod
+    def send(self, phone: str, message: str) -> None:
+        """送出一則簡訊；失敗時 raise"""
+
+
+class ConsoleSmsGateway(SmsGateway):
+    """不真的寄送：寫 log 並附加到本機檔案（開發、測試用）"""
+
+    def __init__(self, path=OTP_OUTBOX_PATH):
+        self.path = path
+
+    def send(self, phone, message):
+        logger.warning("SMS to %s: %s", phone, message)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{phone}\t{message}\n")
+
+
+class HttpSmsGateway(SmsGateway):
+    """POST JSON {"to", "message"} 到簡訊服務商的 API（Bearer api_key）"""
+
+    def __init__(self, url, api_key, sender=""):
+        self.url = url
+        self.api_key = api_key
+        self.sender = sender
+
+    def send(self, phone, message):
+        resp = requests.post(
+            self.url,
+            json={"to": phone, "message": message, "from": self.sender},
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            timeout=SMS_TIMEOUT,
+        )
+        resp.raise_for_status()
+
+
+@st.cache_resource
+def get_sms_gateway() -> SmsGateway:
+    kind = st.secrets.get("sms_gateway", "console")
+    if kind == "console":
+        return ConsoleSmsGateway()
+    if kind == "http":
+        conf = st.secrets["sms"]
+        return HttpSmsGateway(conf["url"], conf["api_key"], conf.get("sender", ""))
+    raise ValueError(f"未知的 sms_gateway：{kind}（可用：console、http）")
+
+
+# ---------- 驗證碼 / 次數紀錄 ----------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS otp_codes (
+    phone TEXT PRIMARY KEY,
+    salt TEXT,
+    code_hash TEXT,
+    expires_at REAL,
+    attempts INTEGER,
+    sent_at REAL
+);
+CREATE TABLE IF NOT EXISTS otp_events (
+    bucket TEXT,
+    at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_otp_events ON otp_events(bucket, at);
+"""
+
+
+def _hash_code(salt, code):
+    return hashlib.sha256(f"{salt}:{code}".encode()).hexdigest()
+
+
+class OtpStore:
+    """驗證碼（只存 hash）與寄送 / 查詢次數（本機 SQLite，整個 process 共用一個連線）"""
+
+    def __init__(self, path=OTP_DB_PATH):
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def _hit(self, bucket, limit, now):
+        """記一次；window 內超過 count 次時 raise OtpError（不記）"""
+        count, window = limit
+        (used,) = self.conn.execute(
+            "SELECT COUNT(*) FROM otp_events WHERE bucket = ? AND at > ?", (bucket, now - window)
+        ).fetchone()
+        if used >= count:
+            raise OtpError("嘗試次數過多，請稍後再試。")
+        self.conn.execute("INSERT INTO otp_events VALUES (?, ?)", (bucket, now))
+
+    def throttle(self, bucket, limit, now=None):
+        now = now or time.time()
+        with self.lock, self.conn:
+            self._hit(bucket, limit, now)
+
+    def issue(self, phone, ip, now=None) -> str:
+        """產生新的驗證碼（取代舊的）並回傳；超過寄送次數限制時 raise OtpError"""
+        now = now or time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT sent_at FROM otp_codes WHERE phone = ?", (phone,)).fetchone()
+            if row and now - row[0] < RESEND_COOLDOWN:
+                raise OtpError(f"驗證碼已寄出，請 {int(RESEND_COOLDOWN - (now - row[0])) + 1} 秒後再重新寄送。")
+            self._hit(f"phone:{phone}", PHONE_LIMIT, now)
+            self._hit(f"ip:{ip}", IP_LIMIT, now)
+            code = f"{secrets.randbelow(10 ** CODE_LENGTH):0{CODE_LENGTH}d}"
+            salt = secrets.token_hex(8)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO otp_codes VALUES (?, ?, ?, ?, 0, ?)",
+                (phone, salt, _hash_code(salt, code), now + CODE_TTL, now),
+            )
+        return code
+
+    def discard(self, phone):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+
+    def verify(self, phone, code, now=None) -> bool:
+        """驗證碼正確回傳 True（並作廢）；錯誤回傳 False；過期或錯太多次 raise OtpError"""
+        now = now or time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT salt, code_hash, expires_at, attempts FROM otp_codes WHERE phone = ?", (phone,)
+            ).fetchone()
+            if row is None:
+                raise OtpError("請先寄送驗證碼。")
+            salt, code_hash, expires_at, attempts = row
+            if expires_at < now:
+                self.conn.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+                raise OtpError("驗證碼已過期，請重新寄送。")
+            if attempts >= MAX_VERIFY_ATTEMPTS:
+                raise OtpError("輸入錯誤次數過多，請重新寄送驗證碼。")
+            if hmac.compare_digest(_hash_code(salt, str(code).strip()), code_hash):
+                self.conn.execute("DELETE FROM otp_codes WHERE phone = ?", (phone,))
+                return True
+            self.conn.execute("UPDATE otp_codes SET attempts = attempts + 1 WHERE phone = ?", (phone,))
+            return False
+
+    def purge(self, now=None):
+        """清掉過期的驗證碼與超過統計區間的次數紀錄"""
+        now = now or time.time()
+        window = max(PHONE_LIMIT[1], IP_LIMIT[1], LOOKUP_LIMIT[1])
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM otp_codes WHERE expires_at < ?", (now,))
+            self.conn.execute("DELETE FROM otp_events WHERE at < ?", (now - window,))
+
+
+@st.cache_resource
+def get_otp_store() -> OtpStore:
+    store = OtpStore()
+    store.purge()
+    return store
+
+
+# ---------- 對外 ----------
+def client_ip() -> str:
+    """
+    目前連線的 IP，用來限制次數。
+    預設（secrets 的 trusted_proxy_hops = 0）直接用連線本身的位址，不看 X-Forwarded-For：
+    這個標頭前面的項目是用戶端自己填的，可以隨意偽造來繞過限制。
+    部署在 N 層會附加 X-Forwarded-For 的反向代理後面時設成 N：每一層代理把它收到的來源附加在最後，
+    從右邊數第 N 個就是最外層代理看到的用戶端位址；項目不足 N 個（沒經過全部代理）時退回連線位址。
+    """
+    trusted_hops = int(st.secrets.get("trusted_proxy_hops", 0))
+    if trusted_hops > 0:
+        forwarded = st.context.headers.get("X-Forwarded-For", "")
+        hops = [h.strip() for h in forwarded.split(",") if h.strip()]
+        if len(hops) >= trusted_hops:
+            return hops[-trusted_hops]
+    return st.context.ip_address or "unknown"
+
+
+def mask_phone(phone):
+    return f"{phone[:4]}***{phone[-3:]}" if len(phone) >= 7 else phone
+
+
+def throttle_lookup():
+    """查詢電話（是否已註冊、是否已報名）之前呼叫；同一個 IP 查太多次時 raise OtpError"""
+    get_otp_store().throttle(f"lookup:{client_ip()}", LOOKUP_LIMIT)
+
+
+def send_code(phone):
+    """產生驗證碼並寄到 phone；被限制或寄送失敗時 raise OtpError"""
+    store = get_otp_store()
+    code = store.issue(phone, client_ip())
+    try:
+        get_sms_gateway().send(phone, f"【志工媒合平台】您的驗證碼為 {code}，{CODE_TTL // 60} 分鐘內有效。請勿提供給他人。")
+    except Exception as e:
+        logger.exception("簡訊寄送失敗（%s）", mask_phone(phone))
+        store.discard(phone)
+        raise OtpError("簡訊寄送失敗，請稍後再試。") from e
+
+
+def verify_code(phone, code) -> bool:
+    return get_otp_store().verify(phone, code)
+
+
+def otp_prompt(phone, key="otp") -> bool:
+    """
+    頁面上的「寄送驗證碼 → 輸入驗證碼」步驟。
+    驗證通過的那一次執行回傳 True（呼叫端接著 login() 並 rerun），其他時候回傳 False。
+    """
+    sent_key = f"{key}_sent_to"
+    if st.session_state.get(sent_key) != phone:
+        st.info(f"📱 需要簡訊驗證：將寄送驗證碼到 {mask_phone(phone)}")
+        if st.button("📩 寄送驗證碼 send code", key=f"{key}_send"):
+            try:
+                send_code(phone)
+            except OtpError as e:
+                st.error(f"❌ {e}")
+                return False
+            st.session_state[sent_key] = phone
+            st.rerun()
+        return False
+
+    st.info(f"📱 驗證碼已寄到 {mask_phone(phone)}，{CODE_TTL // 60} 分鐘內有效。")
+    code = st.text_input(f"簡訊驗證碼（{CODE_LENGTH} 位數字）", key=f"{key}_code", max_chars=CODE_LENGTH)
+    verify_col, resend_col = st.columns(2)
+    if verify_col.button("確認驗證碼 verify", key=f"{key}_verify"):
+        try:
+            if verify_code(phone, code):
+                st.session_state.pop(sent_key, None)
+                return True
+            st.error("❌ 驗證碼錯誤")
+        except OtpError as e:
+            st.error(f"❌ {e}")
+    if resend_col.button("重新寄送 resend", key=f"{key}_resend"):
+        try:
+            send_code(phone)
+            st.success("已重新寄送驗證碼。")
+        except OtpError as e:
+            st.error(f"❌ {e}")
+    return False
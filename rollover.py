@@ -0,0 +1,102 @@
+"""
+每晚 20:00（台灣時間）自動下架：把受災戶當天的需求封存後清空。
+
+- 背景執行緒睡到下一個 20:00，呼叫 repository.rollover_demands() 一次完成封存 + 清空
+- 清空前先把整份資料與當天的報名事件寫成 Parquet（archive_store），供歷史分析
+- 即時資料表只留下「今天」的需求，不會越讀越大
+- 多個 process 同時執行時只有一個會真的下架（Sheets 以 rollover_runs 工作表當租約，SQLite 靠 transaction）；
+  中途失敗後重試不會重複封存
+- 啟動時檢查上一次 20:00 的下架有沒有做（process 當時沒在跑，例如 Streamlit Cloud 閒置休眠），
+  錯過的話立刻以那一天的日期補跑；連續錯過好幾天時只補最近的那一次
+- secrets 設定 rollover_enabled = false 可關閉（例如本機開發）
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import streamlit as st
+
+from archive_store import archive_day
+
+TAIWAN_TZ = timezone(timedelta(hours=8))
+ROLLOVER_HOUR = 20
+RETRY_DELAY = 300      # 秒：下架失敗時多久後重試
+
+logger = logging.getLogger(__name__)
+
+
+class RolloverBusy(Exception):
+    """其他 process 正在執行同一天的下架；稍後重試時會看到它已完成"""
+
+
+def next_rollover(now: datetime) -> datetime:
+    """now 之後（不含）的下一個 20:00（台灣時間）"""
+    now = now.astimezone(TAIWAN_TZ)
+    target = now.replace(hour=ROLLOVER_HOUR, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return target
+
+
+def missed_rollover(repo, now: datetime):
+    """
+    上一次 20:00（now 之前最近的那一次）的下架沒有完成時回傳那個時間，否則回傳 None。
+    從來沒有下架紀錄時無從判斷（例如剛部署），也回傳 None。
+    """
+    previous = next_rollover(now) - timedelta(days=1)
+    last_date = repo.last_rollover_date()
+    if last_date is None or last_date >= previous.strftime("%Y-%m-%d"):
+        return None
+    return previous
+
+
+def run_rollover(repo, now=None) -> int:
+    """立即執行一次下架，封存紀錄的 archive_date 為台灣時間當天日期"""
+    now = (now or datetime.now(TAIWAN_TZ)).astimezone(TAIWAN_TZ)
+    date = now.strftime("%Y-%m-%d")
+    # 先寫歷史快照（需求清空前）；失敗不影響下架
+    try:
+        archive_day(repo, date)
+    except Exception:
+        logger.exception("歷史快照寫入失敗")
+    count = repo.rollover_demands(date)
+    logger.info("每晚下架完成：封存並清空 %d 筆需求", count)
+    return count
+
+
+def _run_until_done(repo, target):
+    while True:
+        try:
+            run_rollover(repo, target)
+            return
+        except RolloverBusy as e:
+            logger.info("%s，稍後確認", e)
+        except Exception:
+            logger.exception("每晚下架失敗，稍後重試")
+        time.sleep(RETRY_DELAY)
+
+
+def _rollover_loop(repo):
+    try:
+        missed = missed_rollover(repo, datetime.now(TAIWAN_TZ))
+    except Exception:
+        logger.exception("無法確認上一次下架是否完成")
+        missed = None
+    if missed is not None:
+        logger.warning("上一次下架（%s）沒有執行，現在補跑", missed.strftime("%Y-%m-%d"))
+        _run_until_done(repo, missed)
+    while True:
+        target = next_rollover(datetime.now(TAIWAN_TZ))
+        time.sleep(max(0.0, (target - datetime.now(TAIWAN_TZ)).total_seconds()))
+        _run_until_done(repo, target)
+
+
+@st.cache_resource
+def start_rollover(_repo):
+    """啟動排程（整個 process 一次）；rollover_enabled 為 false 時不啟動"""
+    if not st.secrets.get("rollover_enabled", True):
+        return None
+    thread = threading.Thread(target=_rollover_loop, args=(_repo,), name="nightly-rollover", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,161 @@
+"""
+任務的全文搜尋索引（mission_name + address），取代每次 rerun 的 str.contains 全表掃描。
+
+- 文字先正規化：全形轉半形、轉小寫、去掉空白、「臺」統一成「台」
+- 以字元 bigram（單字查詢用 unigram）建倒排索引，查詢時先取 postings 交集得到候選，
+  再確認整個詞確實出現，候選通常只有幾筆，數千筆任務也在毫秒以內
+- 多個關鍵字以空白分隔，必須全部符合（AND），依符合程度排序：
+  鄉鎮市區 / 村里完全相同 > 地址開頭就是這個詞 > 任務名稱 > 地址其他位置
+- 從地址解析出 縣市 / 鄉鎮市區 / 村里，提供鄉鎮市區的 facet；
+  「花蓮市」與「花蓮縣花蓮市」會被視為同一個地方
+
+索引跟 FacetIndex 一樣，在資料版本改變時才重建。
+"""
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+# 直轄市與省轄市：地址開頭是這些「市」時是縣市層級，其餘「XX市」（例如花蓮市）是鄉鎮市層級
+CITY_LEVEL = {
+    "台北市", "新北市", "桃園市", "台中市", "台南市", "高雄市",
+    "基隆市", "新竹市", "嘉義市",
+}
+
+_REGION_RE = re.compile(
+    r"^(?P<county>.{2}[縣市])?(?P<township>.{1,3}?[鄉鎮市區])?(?P<village>.{1,3}?[村里])?"
+)
+
+
+def normalize_search_text(text) -> str:
+    """搜尋用的正規化：全形 → 半形、小寫、去空白、臺 → 台"""
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return ""
+    text = unicodedata.normalize("NFKC", str(text)).lower().replace("臺", "台")
+    return "".join(text.split())
+
+
+def parse_region(address) -> tuple:
+    """
+    地址 → (縣市, 鄉鎮市區, 村里, 解析到第幾個字)，解析不到的部分為空字串。
+    開頭是「XX市」但不是直轄市 / 省轄市時，當作鄉鎮市（花蓮市 = 花蓮縣花蓮市）。
+    """
+    text = normalize_search_text(address)
+    m = _REGION_RE.match(text)
+    county, township, village = m.group("county") or "", m.group("township") or "", m.group("village") or ""
+    if county.endswith("市") and county not in CITY_LEVEL and not township:
+        county, township = "", county
+    return county, township, village, m.end()
+
+
+def grams(text: str) -> set:
+    """單字回傳 unigram，其餘回傳所有 bigram"""
+    if len(text) <= 1:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class TextIndex:
+    """建立在一份任務 DataFrame 上；位置（0-based）與該 DataFrame 的列順序一一對應"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.size = len(df)
+        self.names = [normalize_search_text(v) for v in df["mission_name"]]
+        self.addresses = [normalize_search_text(v) for v in df["address"]]
+
+        self.postings = {}
+        for pos, (name, addr) in enumerate(zip(self.names, self.addresses)):
+            for text in (name, addr):
+                for g in set(text) | grams(text):
+                    self.postings.setdefault(g, set()).add(pos)
+
+        self.townships = []
+        self.villages = []
+        self.by_township = {}
+        self.by_village = {}
+        for pos, addr in enumerate(self.addresses):
+            _, township, village, _ = parse_region(addr)
+            self.townships.append(township)
+            self.villages.append(village)
+            if township:
+                self.by_township.setdefault(township, set()).add(pos)
+            if village:
+                self.by_village.setdefault(village, set()).add(pos)
+
+    # ---------- 搜尋 ----------
+    def _candidates(self, term):
+        sets = [self.postings.get(g) for g in grams(term)]
+        if not sets or any(s is None for s in sets):
+            return set()
+        sets.sort(key=len)
+        result = set(sets[0])
+        for s in sets[1:]:
+            result &= s
+            if not result:
+                break
+        return result
+
+    def _region_matches(self, term):
+        """查詢詞本身就是一個地名（例如「花蓮縣花蓮市」「大進村」）時，依解析出的鄉鎮 / 村里比對"""
+        _, township, village, end = parse_region(term)
+        if end != len(term) or not (township or village):
+            return set()
+        result = None
+        if township:
+            result = set(self.by_township.get(township, ()))
+        if village:
+            in_village = self.by_village.get(village, set())
+            result = in_village.copy() if result is None else result & in_village
+        return result
+
+    def _score_term(self, term):
+        """回傳 {位置: 分數}，沒有出現這個詞的列不在結果裡"""
+        scores = {}
+        for pos in self._candidates(term):
+            name, addr = self.names[pos], self.addresses[pos]
+            score = 0
+            if term in name:
+                score += 2
+            if term in addr:
+                score += 3 if addr.startswith(term) else 1
+            if score:
+                scores[pos] = score
+        for pos in self._region_matches(term):
+            scores[pos] = scores.get(pos, 0) + 5
+        return scores
+
+    def search(self, query) -> list:
+        """
+        回傳符合所有關鍵字的位置，依分數高到低（同分時維持原本順序）。
+        查詢為空時回傳 None，代表不過濾。
+        """
+        terms = [normalize_search_text(t) for t in str(query or "").split()]
+        terms = [t for t in terms if t]
+        if not terms:
+            return None
+        total = None
+        for term in terms:
+            scores = self._score_term(term)
+            if total is None:
+                total = scores
+            else:
+                total = {pos: total[pos] + s for pos, s in scores.items() if pos in total}
+            if not total:
+                return []
+        return sorted(total, key=lambda pos: (-total[pos], pos))
+
+    # ---------- 鄉鎮市區 facet ----------
+    def township_counts(self, base=None) -> dict:
+        """每個鄉鎮市區有幾筆任務（筆數多的在前）；base 為布林陣列時只計算其中的列"""
+        towns = self.townships if base is None else [t for t, keep in zip(self.townships, base) if keep]
+        return dict(Counter(t for t in towns if t).most_common())
+
+    def township_mask(self, townships) -> np.ndarray:
+        if not townships:
+            return np.ones(self.size, dtype=bool)
+        mask = np.zeros(self.size, dtype=bool)
+        for t in townships:
+            mask[list(self.by_township.get(t, ()))] = True
+        return mask
@@ -0,0 +1,769 @@
+"""
+共用資料存取層：所有頁面都從這裡取得 Google Sheet 連線與 `vol` 工作表資料。
+
+- 整個 process 只授權一次 gspread client（st.cache_resource）
+- `vol` 工作表讀成一份已轉型、已標準化的 DataFrame 快照，所有 session 共用
+  （phone_norm / name_norm 在載入時以向量化方式算好一次）
+- 快照不靠短 TTL 過期，而是在我們自己寫入後呼叫 invalidate_snapshot() 明確作廢
+- 作廢後採增量同步：只抓新增的列與被改過的列（batch_get 一次呼叫），再修補記憶體中的 DataFrame
+- 報名關係存在另一張 `assignments` 工作表（一列 = 一位志工報名一個任務），跟著快照一起載入
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+
+import gspread
+import pandas as pd
+import streamlit as st
+from google.oauth2.service_account import Credentials
+
+from sheets_client import QuotaAwareWorksheet, get_quota
+
+SHEET_ID = "1PbYajOLCW3p5vsxs958v-eCPgHC1_DnHf9G_mcFx9C0"
+WORKSHEET_NAME = "vol"
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive",
+]
+
+# vol 工作表 A:S 欄位順序（與 Sheet 第一列標題一致）
+VOL_COLUMNS = [
+    "id_number",            # A
+    "role",                 # B
+    "name",                 # C
+    "phone",                # D
+    "line_id",              # E
+    "mission_name",         # F
+    "address",              # G
+    "work_time",            # H
+    "demand_worker",        # I
+    "selected_worker",      # J
+    "accepted_volunteers",  # K
+    "resources",            # L
+    "skills",               # M
+    "photo",                # N
+    "transport",            # O
+    "note",                 # P
+    "date",                 # Q
+    "lat",                  # R：地址定位的緯度（geocode 寫入）
+    "lng",                  # S：經度
+]
+INT_COLUMNS = ["id_number", "selected_worker", "demand_worker"]
+
+# assignments 工作表：報名關係，(mission_id, volunteer_id) 為 key（都是 vol 的 id_number）
+ASSIGNMENTS_WORKSHEET = "assignments"
+ASSIGNMENT_COLUMNS = ["mission_id", "volunteer_id", "volunteer_name", "created_at"]
+FLOAT_COLUMNS = ["lat", "lng"]
+TEXT_COLUMNS = ["phone", "line_id", "mission_name", "address", "work_time",
+                "skills", "resources", "transport", "note", "photo", "role", "name",
+                "other", "accepted_volunteers", "date"]
+
+# 保險用：就算沒有人透過本系統寫入（例如有人直接在 Google Sheet 上手動修改），
+# 快照最多也只會沿用這麼久（秒）。平常靠 invalidate_snapshot() 作廢。
+SNAPSHOT_MAX_AGE = 300
+
+# 增量同步：作廢時只重新抓新增列與指定列；設為 False 則每次作廢都整張重讀
+INCREMENTAL_SYNC = True
+
+
+# ---------- 工具函式 ----------
+def normalize_phone(p) -> str:
+    """
+    統一電話格式：
+    - 移除單引號 (Google Sheets 的文字前綴)
+    - 只保留數字
+    - 9 碼且 9 開頭則補 0
+    """
+    if p is None or p == "" or (isinstance(p, float) and pd.isna(p)):
+        return ""
+    s = str(p).replace("'", "").strip()
+    s = re.sub(r"\D", "", s)
+    if len(s) == 9 and s.startswith("9"):
+        s = "0" + s
+    return s
+
+
+def normalize_text(text) -> str:
+    if text is None or (isinstance(text, float) and pd.isna(text)):
+        return ""
+    return str(text).replace("　", " ").strip()
+
+
+def normalize_phone_series(s: pd.Series) -> pd.Series:
+    """normalize_phone 的向量化版本（整欄一次處理，不逐列呼叫 Python 函式）"""
+    digits = (
+        s.fillna("").astype(str)
+        .str.replace("'", "", regex=False)
+        .str.replace(r"\D", "", regex=True)
+    )
+    # 9 碼且 9 開頭則補 0
+    nine = (digits.str.len() == 9) & digits.str.startswith("9")
+    return digits.mask(nine, "0" + digits)
+
+
+def normalize_text_series(s: pd.Series) -> pd.Series:
+    """normalize_text 的向量化版本"""
+    return s.fillna("").astype(str).str.replace("　", " ", regex=False).str.strip()
+
+
+def col_letter(col_name: str) -> str:
+    """欄位名稱 -> Sheet 欄位字母（例如 selected_worker -> J）"""
+    return chr(ord("A") + VOL_COLUMNS.index(col_name))
+
+
+def column_letter(n: int) -> str:
+    """第 n 欄（1-index）-> 欄位字母，支援超過 Z（例如 27 -> AA）"""
+    letters = ""
+    while n > 0:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def rows_in_range(a1_range: str):
+    """從 A1 範圍取出列號，例如 "F12:Q12" -> [12]、"J3:K5" -> [3, 4, 5]"""
+    nums = [int(n) for n in re.findall(r"[A-Za-z]+(\d+)", a1_range)]
+    if not nums:
+        return []
+    return list(range(min(nums), max(nums) + 1))
+
+
+# ---------- Google Sheet 連線（整個 process 共用） ----------
+@st.cache_resource
+def get_client():
+    creds = Credentials.from_service_account_info(st.secrets["google"], scopes=SCOPES)
+    return gspread.authorize(creds)
+
+
+@st.cache_resource
+def get_spreadsheet():
+    return get_client().open_by_key(SHEET_ID)
+
+
+@st.cache_resource
+def get_worksheet(name: str = WORKSHEET_NAME):
+    """回傳包了配額控管（token bucket + 重試 + 統計）的工作表，頁面不直接碰 gspread"""
+    return QuotaAwareWorksheet(get_spreadsheet().worksheet(name), get_quota())
+
+
+@st.cache_resource
+def get_or_create_worksheet(name: str, header: tuple):
+    """同 get_worksheet，但工作表不存在時先建立並寫入標題列（例如封存用的工作表）"""
+    spreadsheet = get_spreadsheet()
+    try:
+        ws = spreadsheet.worksheet(name)
+    except gspread.exceptions.WorksheetNotFound:
+        ws = spreadsheet.add_worksheet(title=name, rows=1, cols=len(header))
+        ws.append_row(list(header))
+    return QuotaAwareWorksheet(ws, get_quota())
+
+
+ID_BLOCKS_WORKSHEET = "id_blocks"
+ID_BLOCKS_WAIT = 10       # 秒：其他 process 剛建立工作表時，等它寫好第一列的上限
+
+
+@st.cache_resource
+def get_id_blocks_worksheet(block_size: int):
+    """
+    id_number 配號用的工作表，回傳 (工作表, offset, block_size)。
+    第一列記錄 offset（建立當時 vol 的最大 id_number）與區段大小，之後每預約一段號碼就 append 一列。
+    已存在時以第一列記錄的區段大小為準；多個 process 同時建立時只有一個會成功，其他的等第一列寫好。
+    """
+    spreadsheet = get_spreadsheet()
+    try:
+        ws = spreadsheet.worksheet(ID_BLOCKS_WORKSHEET)
+    except gspread.exceptions.WorksheetNotFound:
+        try:
+            ws = spreadsheet.add_worksheet(title=ID_BLOCKS_WORKSHEET, rows=1, cols=4)
+        except gspread.exceptions.APIError:
+            ws = spreadsheet.worksheet(ID_BLOCKS_WORKSHEET)
+        else:
+            ids = [int(v) for v in get_worksheet().col_values(1)[1:] if str(v).strip().isdigit()]
+            ws.update(range_name="A1:D1", values=[["offset", max(ids, default=0), "block_size", block_size]])
+    ws = QuotaAwareWorksheet(ws, get_quota())
+
+    deadline = time.monotonic() + ID_BLOCKS_WAIT
+    header = ws.row_values(1)
+    while len(header) < 4 and time.monotonic() < deadline:
+        time.sleep(1)
+        header = ws.row_values(1)
+    if len(header) < 4:
+        raise RuntimeError("id_blocks 工作表尚未初始化")
+    return ws, int(header[1]), int(header[3])
+
+
+# ---------- 資料整理 ----------
+def prepare_dataframe(records, positions=None) -> pd.DataFrame:
+    """
+    把 Sheet 讀到的每一列（dict）轉成型別一致的 DataFrame（每次載入只做一次）。
+    positions：這些列在整份快照中的位置（增量同步修補部分列時使用），預設從 0 開始。
+    """
+    df = pd.DataFrame(records)
+    if positions is not None:
+        df.index = pd.Index(positions)
+    if not df.empty:
+        df.columns = df.columns.str.strip()
+
+    # 數值欄位：轉 int，缺少就補 0
+    for c in INT_COLUMNS:
+        if c not in df.columns:
+            df[c] = 0
+        else:
+            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype(int)
+
+    # 座標欄位：轉 float，空白或缺少為 NaN
+    for c in FLOAT_COLUMNS:
+        if c not in df.columns:
+            df[c] = float("nan")
+        else:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    # 文字欄位：轉字串並去空白，缺少就補空字串
+    for c in TEXT_COLUMNS:
+        if c not in df.columns:
+            df[c] = ""
+        else:
+            df[c] = df[c].fillna("").astype(str).str.strip()
+
+    # 標準化欄位：每份快照只算一次，各頁面直接用 phone_norm / name_norm 比對
+    df["phone_norm"] = normalize_phone_series(df["phone"])
+    df["name_norm"] = normalize_text_series(df["name"])
+
+    # DataFrame index 0 -> Google Sheet 第 2 列
+    df["row_number"] = df.index + 2
+    return df
+
+
+# ---------- 使用者索引 ----------
+class UserIndex:
+    """
+    每份快照建一次的查詢索引，讓身分驗證都是 O(1) dict 查詢，而不是每次掃整張表：
+    - by_role_phone：(role, phone_norm) -> (row_number, record)
+    - by_role_name_phone：(role, name_norm, phone_norm) -> (row_number, record)
+    - by_id：id_number -> (row_number, record)
+    - positions_by_phone：phone_norm -> 這支電話所有列在 DataFrame 中的位置
+    同一個 key 有多列時，以 Sheet 中最上面那一列為準（與原本 iloc[0] 的行為一致）。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.by_role_phone = {}
+        self.by_role_name_phone = {}
+        self.by_id = {}
+        self.positions_by_phone = {}
+
+        if df.empty:
+            return
+
+        roles = df["role"].str.lower()
+        keys = zip(df["row_number"], roles, df["name_norm"], df["phone_norm"])
+        for pos, ((row_number, role, name_norm, phone_norm), record) in enumerate(
+            zip(keys, df.to_dict("records"))
+        ):
+            entry = (int(row_number), record)
+
+            self.by_role_phone.setdefault((role, phone_norm), entry)
+            self.by_role_name_phone.setdefault((role, name_norm, phone_norm), entry)
+            if record["id_number"]:
+                self.by_id.setdefault(int(record["id_number"]), entry)
+            self.positions_by_phone.setdefault(phone_norm, []).append(pos)
+
+    def has_phone(self, phone) -> bool:
+        return normalize_phone(phone) in self.positions_by_phone
+
+    def find_user(self, role, phone, name=None):
+        """依身分 + 電話（可再加姓名）找使用者，回傳 (row_number, record) 或 (None, None)"""
+        role = str(role).strip().lower()
+        phone_norm = normalize_phone(phone)
+        if name is None:
+            return self.by_role_phone.get((role, phone_norm), (None, None))
+        return self.by_role_name_phone.get((role, normalize_text(name), phone_norm), (None, None))
+
+    def find_by_id(self, id_number, role=None):
+        """依 id_number 找列，可指定 role（例如任務只找 victim），回傳 (row_number, record) 或 (None, None)"""
+        try:
+            entry = self.by_id.get(int(id_number))
+        except (TypeError, ValueError):
+            entry = None
+        if entry is None:
+            return None, None
+        if role is not None and entry[1]["role"].strip().lower() != role:
+            return None, None
+        return entry
+
+
+# ---------- 共用快照 ----------
+class _Snapshot:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.df = None
+        self.index = None
+        self.loaded_at = 0.0
+        # 增量同步用
+        self.header = []
+        self.hashes = []          # 每一列內容的 hash，位置與 df 一致
+        self.stale = False        # 需要檢查新增列
+        self.dirty_rows = set()   # 需要重新抓取的 Sheet 列號
+        self.version = 0          # 快照內容每變動一次 +1（給本機鏡像判斷要不要同步）
+        self.assignments = []     # assignments 工作表的所有列（dict，ASSIGNMENT_COLUMNS）
+        self.assignments_stale = False
+        self.written = threading.Event()  # 有人寫入 Sheet 時觸發
+
+
+@st.cache_resource
+def _get_snapshot_holder():
+    return _Snapshot()
+
+
+def _row_hash(values) -> bytes:
+    return hashlib.blake2b("\x1f".join(values).encode("utf-8"), digest_size=8).digest()
+
+
+def _pad(row, width):
+    row = [str(v) for v in row[:width]]
+    return row + [""] * (width - len(row))
+
+
+def get_assignments_worksheet():
+    return get_or_create_worksheet(ASSIGNMENTS_WORKSHEET, tuple(ASSIGNMENT_COLUMNS))
+
+
+def read_assignments(ws=None) -> list:
+    """
+    讀 assignments 工作表（一次 API 呼叫），回傳 dict 清單（ASSIGNMENT_COLUMNS + 所在的 row_number）；
+    id 不是數字的列略過
+    """
+    values = (ws or get_assignments_worksheet()).get_all_values()
+    records = []
+    for row_number, row in enumerate(values[1:], start=2):
+        record = dict(zip(ASSIGNMENT_COLUMNS, _pad(row, len(ASSIGNMENT_COLUMNS))))
+        if not (record["mission_id"].strip().isdigit() and record["volunteer_id"].strip().isdigit()):
+            continue
+        records.append({
+            **record,
+            "mission_id": int(record["mission_id"]),
+            "volunteer_id": int(record["volunteer_id"]),
+            "row_number": row_number,
+        })
+    return records
+
+
+def _load_assignments(holder):
+    holder.assignments = read_assignments()
+    holder.assignments_stale = False
+    holder.version += 1
+
+
+def migrate_header(ws, header) -> list:
+    """
+    補齊 vol 工作表的標題列：後來才加的欄位（例如 R:S 的 lat / lng）在舊 Sheet 上沒有標題，
+    不補的話讀取時會依標題把這幾欄丟掉。只寫缺的那一段，已經齊全時不做任何事（可重複執行）。
+    回傳補齊後的標題（至少 VOL_COLUMNS 那麼寬）。
+    """
+    header = list(header)
+    missing = [i for i, c in enumerate(VOL_COLUMNS) if i >= len(header) or not header[i]]
+    if not missing:
+        return header
+    header += [""] * (len(VOL_COLUMNS) - len(header))
+    for i in missing:
+        header[i] = VOL_COLUMNS[i]
+    if ws.col_count < len(VOL_COLUMNS):
+        ws.add_cols(len(VOL_COLUMNS) - ws.col_count)
+    first, last = missing[0] + 1, missing[-1] + 1
+    ws.update(
+        range_name=f"{column_letter(first)}1:{column_letter(last)}1",
+        values=[header[first - 1:last]],
+    )
+    return header
+
+
+def _full_load(holder):
+    _load_assignments(holder)
+    ws = get_worksheet()
+    values = ws.get_all_values()
+    header = migrate_header(ws, [h.strip() for h in values[0]]) if values else []
+    rows = [_pad(r, len(header)) for r in values[1:]]
+    holder.header = header
+    holder.hashes = [_row_hash(r) for r in rows]
+    holder.df = prepare_dataframe([dict(zip(header, r)) for r in rows])
+    holder.index = UserIndex(holder.df)
+    holder.loaded_at = time.monotonic()
+    holder.version += 1
+
+
+def _sync_delta(holder):
+    """
+    只抓「最後一列之後的新列」與「被標記修改的列」，一次 batch_get 完成，
+    比對每列 hash，有變動的才修補進 DataFrame（複製後再換上，讀取中的 session 不受影響）。
+    """
+    width = len(holder.header)
+    if not width:
+        _full_load(holder)
+        return
+
+    n = len(holder.hashes)
+    last_col = column_letter(width)
+    dirty = sorted(r for r in holder.dirty_rows if 2 <= r < n + 2)
+    ranges = [f"A{n + 2}:{last_col}"] + [f"A{r}:{last_col}{r}" for r in dirty]
+    results = get_worksheet().batch_get(ranges)
+
+    changed = {}
+    for r, vr in zip(dirty, results[1:]):
+        row = _pad(vr[0] if vr else [], width)
+        pos = r - 2
+        h = _row_hash(row)
+        if h != holder.hashes[pos]:
+            holder.hashes[pos] = h
+            changed[pos] = row
+    new_rows = [_pad(r, width) for r in (results[0] if results else [])]
+
+    holder.stale = False
+    holder.dirty_rows.clear()
+    if not changed and not new_rows:
+        return
+
+    df = holder.df.copy()
+    if changed:
+        patch = prepare_dataframe(
+            [dict(zip(holder.header, r)) for r in changed.values()],
+            positions=list(changed.keys()),
+        )
+        cols = [c for c in patch.columns if c in df.columns]
+        df.loc[patch.index, cols] = patch[cols]
+    if new_rows:
+        extra = prepare_dataframe(
+            [dict(zip(holder.header, r)) for r in new_rows],
+            positions=range(n, n + len(new_rows)),
+        )
+        df = pd.concat([df, extra])
+        holder.hashes.extend(_row_hash(r) for r in new_rows)
+
+    holder.df = df
+    holder.index = UserIndex(df)
+    holder.version += 1
+
+
+def _ensure_loaded(holder):
+    """呼叫端需持有 holder.lock"""
+    expired = time.monotonic() - holder.loaded_at > SNAPSHOT_MAX_AGE
+    if holder.df is None or expired:
+        # 第一次載入，或太久沒整張重讀（可能有人直接在 Sheet 上手動改過）
+        _full_load(holder)
+        holder.stale = False
+        holder.dirty_rows.clear()
+    else:
+        if holder.stale:
+            _sync_delta(holder)
+        if holder.assignments_stale:
+            _load_assignments(holder)
+
+
+def load_snapshot() -> pd.DataFrame:
+    """
+    取得 vol 工作表的共用快照。
+    - 同一時間很多 session 一起 cache miss 時，只有一個會真的去讀 Sheet，其他人等它讀完共用
+    - 回傳的 DataFrame 是所有 session 共用的，請勿原地修改（需要修改請先 .copy()）
+    """
+    holder = _get_snapshot_holder()
+    with holder.lock:
+        _ensure_loaded(holder)
+        return holder.df
+
+
+def load_snapshot_with_version():
+    """回傳 (DataFrame, version)；version 不變代表內容與上次相同"""
+    holder = _get_snapshot_holder()
+    with holder.lock:
+        _ensure_loaded(holder)
+        return holder.df, holder.version
+
+
+def load_assignments() -> list:
+    """與目前快照同步的報名關係（dict 清單，共用的物件請勿修改）"""
+    holder = _get_snapshot_holder()
+    with holder.lock:
+        _ensure_loaded(holder)
+        return holder.assignments
+
+
+def _record_assignments(records):
+    """報名成功後把新的列加進快照（不必整張 assignments 重讀）"""
+    holder = _get_snapshot_holder()
+    with holder.lock:
+        if holder.df is not None and not holder.assignments_stale:
+            # 換成新的 list：load_assignments() 之前回傳的物件是共用的，不能原地修改
+            holder.assignments = holder.assignments + list(records)
+            holder.version += 1
+    holder.written.set()
+
+
+def wait_for_write(timeout) -> bool:
+    """等到有人寫入 Sheet（或逾時），回傳是否有寫入；給背景同步工作使用"""
+    holder = _get_snapshot_holder()
+    written = holder.written.wait(timeout)
+    holder.written.clear()
+    return written
+
+
+def load_index() -> UserIndex:
+    """取得與目前快照同步的 UserIndex（快照重新載入時一起重建）"""
+    holder = _get_snapshot_holder()
+    with holder.lock:
+        _ensure_loaded(holder)
+        return holder.index
+
+
+def invalidate_snapshot(rows=None, full=False, assignments=False):
+    """
+    寫入 Sheet 後呼叫，下一次 load_snapshot() 會同步最新資料。
+    - rows：這次寫入改到的 Sheet 列號（新增列不用列出，同步時一定會檢查表尾）
+    - full=True：整張重讀（例如列的位置變了）
+    - assignments=True：assignments 工作表也改過，重新讀取
+    """
+    holder = _get_snapshot_holder()
+    with holder.lock:
+        holder.assignments_stale = holder.assignments_stale or assignments
+        if full or not INCREMENTAL_SYNC:
+            holder.df = None
+            holder.index = None
+        else:
+            holder.stale = True
+            holder.dirty_rows.update(int(r) for r in (rows or []))
+    holder.written.set()
+
+
+# ---------- accepted_volunteers 相關 helper ----------
+def format_vol_entry(name, phone):
+    """統一格式：Name(末3碼)。用於比對與顯示。"""
+    pn = normalize_phone(phone)
+    suffix = pn[-3:] if pn else ""
+    return f"{name}({suffix})"
+
+
+def parse_accepted_volunteers(text):
+    """把 accepted_volunteers 文字拆成清單（每行一筆），並去除空白。"""
+    if not text:
+        return []
+    return [l.strip() for l in str(text).splitlines() if l.strip()]
+
+
+# ---------- 報名：每個任務一把鎖 + 單次 batch 讀寫 ----------
+SIGNUP_MAX_ATTEMPTS = 3
+
+
+class _MissionLocks:
+    def __init__(self):
+        self.guard = threading.Lock()
+        self.locks = {}
+
+    def get(self, task_id):
+        with self.guard:
+            return self.locks.setdefault(int(task_id), threading.Lock())
+
+
+@st.cache_resource
+def _get_mission_locks():
+    return _MissionLocks()
+
+
+def _to_int(value, default=0):
+    try:
+        return int(str(value).strip() or default)
+    except ValueError:
+        return default
+
+
+def signup_values(task: dict, vol_name, vol_phone):
+    """
+    報名時共用的計算（是否已報名由呼叫端查 assignments）：回傳 (selected_worker, accepted_volunteers) 的新值；
+    accepted_volunteers 只是給人看的名單，額滿則 raise ValueError。
+    """
+    current_count = _to_int(task.get("selected_worker"))
+    if current_count >= _to_int(task.get("demand_worker")):
+        raise ValueError("任務已額滿")
+    existing_list = parse_accepted_volunteers(task.get("accepted_volunteers", ""))
+    return current_count + 1, "\n".join(existing_list + [format_vol_entry(vol_name, vol_phone)])
+
+
+def add_volunteer_to_mission(task_id, volunteer_id, vol_name, vol_phone, now=None):
+    """
+    將志工加入指定任務：assignments 工作表新增一列，受災戶那一列的 selected_worker + 1、
+    accepted_volunteers 加上名字。
+    - 同一個 process 內以「每個任務一把鎖」串行化，同一任務的報名不會互相覆蓋
+    - 是否已報名：先查快照裡的 assignments（不打 API）；其他 process 剛寫入的報名快照裡還沒有，
+      所以讀到的 K 欄已經有自己的名字時，才整張讀一次 assignments 確認
+    - 每次嘗試：讀一次 A:K（確認 id、名額）→ 一次 batch_update 寫 J:K
+    - 寫完讀回 K 欄確認自己的名字有多一筆；若被其他 process 同時寫入蓋掉就重試；
+      成功後才 append assignments，並直接加進快照
+    回傳 True 表示報名成功、False 表示已經報過；額滿或找不到任務會 raise ValueError。
+    """
+    ws = get_worksheet()
+    assignments_ws = get_assignments_worksheet()
+    new_entry = format_vol_entry(vol_name, vol_phone)
+    id_col = col_letter("id_number")
+    selected_col = col_letter("selected_worker")
+    acc_col = col_letter("accepted_volunteers")
+    key = (int(task_id), int(volunteer_id))
+
+    def assigned(records):
+        return any((a["mission_id"], a["volunteer_id"]) == key for a in records)
+
+    with _get_mission_locks().get(task_id):
+        if assigned(load_assignments()):
+            return False
+
+        confirmed = False   # 已經整張讀過 assignments，確定沒報名過
+        for _ in range(SIGNUP_MAX_ATTEMPTS):
+            row_number, _ = load_index().find_by_id(task_id, role="victim")
+            if row_number is None:
+                raise ValueError("找不到指定任務在資料表中的列")
+
+            # 1 次讀取：直接讀 Sheet 上這一列的最新值，不相信快取
+            values = ws.get(f"{id_col}{row_number}:{acc_col}{row_number}")
+            cells = dict(zip(VOL_COLUMNS, (values[0] if values else []) + [""] * len(VOL_COLUMNS)))
+            if _to_int(cells["id_number"]) != int(task_id):
+                # 列的位置變了（例如有人刪除列），整張重新載入後再試
+                invalidate_snapshot(full=True)
+                continue
+
+            # K 欄已有同樣的「姓名(末3碼)」：可能是其他 process 剛幫同一位志工報名，查 assignments 確認
+            entries = parse_accepted_volunteers(cells["accepted_volunteers"]).count(new_entry)
+            if entries and not confirmed:
+                if assigned(read_assignments(assignments_ws)):
+                    invalidate_snapshot(assignments=True)
+                    return False
+                confirmed = True
+
+            updated = signup_values(cells, vol_name, vol_phone)
+
+            # 1 次寫入：selected_worker 與 accepted_volunteers 一起更新
+            ws.batch_update([{
+                "range": f"{selected_col}{row_number}:{acc_col}{row_number}",
+                "values": [list(updated)],
+            }])
+            invalidate_snapshot(rows=[row_number])
+
+            # 讀回確認：別的 process 可能在同一瞬間寫了同一格
+            written = ws.acell(f"{acc_col}{row_number}").value
+            if parse_accepted_volunteers(written).count(new_entry) > entries:
+                created_at = (now or datetime.now()).isoformat(timespec="seconds")
+                assignments_ws.append_row([*key, vol_name, created_at], value_input_option="RAW")
+                _record_assignments([dict(zip(ASSIGNMENT_COLUMNS, [*key, vol_name, created_at]))])
+                return True
+
+        raise ValueError("報名人數眾多，請稍後再試")
+
+
+def add_volunteers_to_missions(signups, now=None) -> list:
+    """
+    協調者批次指派：signups 為 (task_id, volunteer_id, vol_name, vol_phone) 的清單，
+    回傳對應的結果：True 成功、False 已經報過、字串為失敗原因（額滿、找不到任務…）。
+    檢查與 add_volunteer_to_mission 相同，但不論幾筆都只用固定幾次 API 呼叫：
+    - 依任務 id 排序拿齊所有相關任務的鎖（固定順序，不會互相等待）
+    - 一次 batch_get 讀所有任務列的 A:K → 一次 batch_update 寫 J:K → 一次 batch_get 讀回 K 確認；
+      被其他 process 同時寫入蓋掉的任務下一輪重試
+    - 最後一次 append_rows 寫 assignments
+    """
+    ws = get_worksheet()
+    assignments_ws = get_assignments_worksheet()
+    id_col = col_letter("id_number")
+    selected_col = col_letter("selected_worker")
+    acc_col = col_letter("accepted_volunteers")
+    keys = [(int(s[0]), int(s[1])) for s in signups]
+    entries = [format_vol_entry(s[2], s[3]) for s in signups]
+    results = [None] * len(signups)
+
+    missions = sorted({k[0] for k in keys})
+    with ExitStack() as stack:
+        for task_id in missions:
+            stack.enter_context(_get_mission_locks().get(task_id))
+
+        known = {(a["mission_id"], a["volunteer_id"]) for a in load_assignments()}
+        pending = {}
+        for i, key in enumerate(keys):
+            if key in known:
+                results[i] = False
+            else:
+                known.add(key)      # 同一批裡重複的組合只報一次
+                pending.setdefault(key[0], []).append(i)
+
+        confirmed = None    # 整張讀過的 assignments（K 欄出現同名的人時才讀）
+        added = []
+        for _ in range(SIGNUP_MAX_ATTEMPTS):
+            if not pending:
+                break
+            index = load_index()
+            rows = {}
+            for task_id in list(pending):
+                row_number, _ = index.find_by_id(task_id, role="victim")
+                if row_number is None:
+                    for i in pending.pop(task_id):
+                        results[i] = "找不到指定任務在資料表中的列"
+                else:
+                    rows[task_id] = row_number
+            if not rows:
+                break
+
+            # 1 次讀取：所有任務列的最新值
+            current = ws.batch_get([f"{id_col}{r}:{acc_col}{r}" for r in rows.values()])
+            updates, expected = [], {}
+            for (task_id, row_number), values in zip(rows.items(), current):
+                cells = dict(zip(VOL_COLUMNS, (values[0] if values else []) + [""] * len(VOL_COLUMNS)))
+                if _to_int(cells["id_number"]) != task_id:
+                    # 列的位置變了（例如有人刪除列），整張重新載入後下一輪再試
+                    invalidate_snapshot(full=True)
+                    continue
+                existing = parse_accepted_volunteers(cells["accepted_volunteers"])
+                if confirmed is None and any(entries[i] in existing for i in pending[task_id]):
+                    confirmed = {(a["mission_id"], a["volunteer_id"]) for a in read_assignments(assignments_ws)}
+
+                accepted = []
+                for i in pending[task_id]:
+                    if confirmed is not None and keys[i] in confirmed:
+                        results[i] = False
+                        continue
+                    try:
+                        cells["selected_worker"], cells["accepted_volunteers"] = signup_values(
+                            cells, signups[i][2], signups[i][3]
+                        )
+                    except ValueError as e:
+                        results[i] = str(e)
+                        continue
+                    accepted.append(i)
+                pending[task_id] = accepted
+                if accepted:
+                    updates.append({
+                        "range": f"{selected_col}{row_number}:{acc_col}{row_number}",
+                        "values": [[cells["selected_worker"], cells["accepted_volunteers"]]],
+                    })
+                    expected[task_id] = (row_number, Counter(existing) + Counter(entries[i] for i in accepted))
+            pending = {t: idx for t, idx in pending.items() if idx}
+            if not updates:
+                continue
+
+            # 1 次寫入 + 1 次讀回確認：K 欄要包含這次寫入的所有名字
+            ws.batch_update(updates)
+            invalidate_snapshot(rows=[row for row, _ in expected.values()])
+            written = ws.batch_get([f"{acc_col}{row}" for row, _ in expected.values()])
+            for (task_id, (_, counts)), values in zip(expected.items(), written):
+                got = Counter(parse_accepted_volunteers(values[0][0] if values and values[0] else ""))
+                if all(got[e] >= n for e, n in counts.items()):
+                    for i in pending.pop(task_id):
+                        results[i] = True
+                        added.append(i)
+
+        for idx in pending.values():
+            for i in idx:
+                results[i] = "報名人數眾多，請稍後再試"
+
+        if added:
+            created_at = (now or datetime.now()).isoformat(timespec="seconds")
+            records = [dict(zip(ASSIGNMENT_COLUMNS, [*keys[i], signups[i][2], created_at])) for i in added]
+            assignments_ws.append_rows(
+                [[r[c] for c in ASSIGNMENT_COLUMNS] for r in records], value_input_option="RAW"
+            )
+            _record_assignments(records)
+    return results
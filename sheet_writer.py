@@ -0,0 +1,135 @@
+"""
+Google Sheets 背景寫入佇列（write-behind）。
+
+頁面不直接呼叫 append_row / update，而是把「要寫什麼」丟進佇列，拿回一個 Future：
+- 背景執行緒每 FLUSH_INTERVAL 秒把累積的寫入合併成一次 append_rows + 一次 batch_update
+- 配額排隊與 429 的指數退避 + 隨機抖動重試由 sheets_client 的工作表包裝負責
+- 寫入成功後作廢 sheet_store 的共用快照，下一次讀取就會看到新資料
+- 重試後仍失敗的一批會寫進 log，並留在 failed()（dead-letter），協調者頁面可以看到、手動補登
+
+注意：志工報名需要「讀 → 檢查名額 → 寫」在同一把鎖內完成，
+仍走 sheet_store.add_volunteer_to_mission 同步寫入，不經過這個佇列。
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime, timezone
+
+import streamlit as st
+
+from sheet_store import WORKSHEET_NAME, get_worksheet, invalidate_snapshot, rows_in_range
+
+FLUSH_INTERVAL = 0.3      # 秒：收集多少時間內的寫入合併成一批
+MAX_BATCH = 500           # 一批最多幾筆寫入意圖
+WRITE_ACK_TIMEOUT = 15    # 秒：頁面等待寫入確認的上限
+DEAD_LETTER_LIMIT = 200   # 最多保留幾筆寫入失敗的意圖
+
+logger = logging.getLogger(__name__)
+
+
+class _Intent:
+    def __init__(self, kind, worksheet, values, a1_range=None):
+        self.kind = kind              # "append" 或 "update"
+        self.worksheet = worksheet
+        self.values = values          # append：要新增的列（list of rows）；update：範圍的值
+        self.a1_range = a1_range
+        self.future = Future()
+
+
+class SheetWriter:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._failed = deque(maxlen=DEAD_LETTER_LIMIT)
+        self._failed_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sheet-writer", daemon=True)
+        self._thread.start()
+
+    # ---------- 給頁面使用的 API ----------
+    def append_row(self, values, worksheet=WORKSHEET_NAME) -> Future:
+        """排入一筆新增列，回傳 Future（完成時 result() 為 None，失敗時 raise 原本的例外）"""
+        return self.append_rows([values], worksheet=worksheet)
+
+    def append_rows(self, rows, worksheet=WORKSHEET_NAME) -> Future:
+        """排入多筆新增列（例如批次匯入），與同一批的其他新增合併成一次 append_rows"""
+        return self._submit(_Intent("append", worksheet, [list(r) for r in rows]))
+
+    def update_range(self, a1_range, values, worksheet=WORKSHEET_NAME) -> Future:
+        """排入一筆範圍更新（例如 F12:Q12），同一批中同一範圍只保留最後一次"""
+        return self._submit(_Intent("update", worksheet, values, a1_range=a1_range))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def failed(self) -> list:
+        """寫入失敗的意圖（新的在後）：at、worksheet、kind、range、values、error"""
+        with self._failed_lock:
+            return list(self._failed)
+
+    # ---------- 背景執行緒 ----------
+    def _submit(self, intent):
+        self._queue.put(intent)
+        return intent.future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # 等一小段時間，讓同時湧入的寫入合併成同一批
+            time.sleep(self.flush_interval)
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        groups = {}
+        for intent in batch:
+            groups.setdefault((intent.worksheet, intent.kind), []).append(intent)
+
+        for (worksheet, kind), intents in groups.items():
+            try:
+                ws = get_worksheet(worksheet)
+                if kind == "append":
+                    ws.append_rows([row for i in intents for row in i.values])
+                else:
+                    # 同一個範圍只寫最後一次
+                    latest = {}
+                    for i in intents:
+                        latest[i.a1_range] = i.values
+                    data = [{"range": r, "values": v} for r, v in latest.items()]
+                    ws.batch_update(data)
+            except Exception as e:
+                self._dead_letter(worksheet, kind, intents, e)
+                for i in intents:
+                    i.future.set_exception(e)
+                continue
+
+            if worksheet == WORKSHEET_NAME:
+                # 新增列會在同步時從表尾抓到；更新只需重新抓被改到的列
+                invalidate_snapshot(rows=[r for i in intents if i.a1_range for r in rows_in_range(i.a1_range)])
+            for i in intents:
+                i.future.set_result(None)
+
+    def _dead_letter(self, worksheet, kind, intents, error):
+        rows = sum(len(i.values) for i in intents)
+        ranges = [i.a1_range for i in intents if i.a1_range]
+        logger.exception("背景寫入失敗：%s %s %d 筆意圖、%d 列，範圍 %s",
+                         worksheet, kind, len(intents), rows, ", ".join(ranges) or "（新增列）")
+        at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self._failed_lock:
+            self._failed.extend({
+                "at": at, "worksheet": worksheet, "kind": kind,
+                "range": i.a1_range or "", "values": i.values, "error": repr(error),
+            } for i in intents)
+
+
+@st.cache_resource
+def get_writer() -> SheetWriter:
+    """整個 process 共用一個背景寫入器"""
+    return SheetWriter()
@@ -0,0 +1,204 @@
+"""
+有配額意識的 Google Sheets client。
+
+所有對 Sheets API 的呼叫（get_all_records、col_values、append_row、update、update_cell …）
+都經過 QuotaAwareWorksheet：
+- 讀、寫各一個 token bucket，速率對應專案的每分鐘配額；桶子空了就排隊等，不直接失敗
+- 429 / 5xx / 連線錯誤以指數退避 + 隨機抖動重試；append、delete_rows 不是冪等的
+  （請求逾時或 5xx 時可能其實已經執行，重試會多一列或多刪幾列），只在 429（確定沒執行）時重試
+- 記錄每個方法的呼叫次數、延遲、重試與節流次數，方便依數據規劃容量
+
+配額可在 secrets 設定（未設定時用 Google 預設的每位使用者每分鐘 60 次）：
+
+    [sheets_quota]
+    read_per_minute = 60
+    write_per_minute = 60
+"""
+import random
+import threading
+import time
+
+import gspread
+import requests
+import streamlit as st
+
+DEFAULT_READ_PER_MINUTE = 60
+DEFAULT_WRITE_PER_MINUTE = 60
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0        # 秒：第 n 次重試等待 BACKOFF_BASE * 2**n + 抖動
+BACKOFF_MAX = 32.0
+
+READ_METHODS = {
+    "get_all_records", "get_all_values", "col_values", "row_values",
+    "get", "batch_get", "acell", "cell",
+}
+WRITE_METHODS = {
+    "append_row", "append_rows", "update", "update_cell",
+    "batch_update", "batch_clear", "clear", "delete_rows", "add_cols",
+}
+# 重送會重複寫入（或多刪列）的方法：只在 429 時重試
+NON_IDEMPOTENT_METHODS = {"append_row", "append_rows", "delete_rows", "add_cols"}
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+
+# ---------- 錯誤分類與退避 ----------
+def status_code(e: Exception):
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_rate_limited(e: Exception) -> bool:
+    """是否為 Sheets API 的 429 quota exceeded"""
+    return isinstance(e, gspread.exceptions.APIError) and status_code(e) == 429
+
+
+def is_transient(e: Exception) -> bool:
+    """值得重試的錯誤：配額、伺服器暫時錯誤、網路中斷"""
+    if isinstance(e, gspread.exceptions.APIError):
+        return status_code(e) in TRANSIENT_STATUS
+    return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def backoff_delay(attempt: int) -> float:
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) + random.uniform(0, BACKOFF_BASE)
+
+
+# ---------- Token bucket ----------
+class TokenBucket:
+    """每分鐘 rate_per_minute 個 token，最多累積 capacity 個；acquire() 沒 token 時會等待"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """取得一個 token，回傳等待的秒數（0 表示沒有被節流）"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+# ---------- 統計 ----------
+class SheetsMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods = {}
+        self.throttled = 0          # 因 token bucket 空了而排隊的次數
+        self.throttle_wait = 0.0    # 排隊等待的總秒數
+        self.rate_limited = 0       # 收到 429 的次數
+
+    def _entry(self, method):
+        return self.methods.setdefault(method, {
+            "calls": 0, "errors": 0, "retries": 0, "total_latency": 0.0, "max_latency": 0.0,
+        })
+
+    def record_call(self, method, latency, ok):
+        with self.lock:
+            m = self._entry(method)
+            m["calls"] += 1
+            m["total_latency"] += latency
+            m["max_latency"] = max(m["max_latency"], latency)
+            if not ok:
+                m["errors"] += 1
+
+    def record_retry(self, method, e):
+        with self.lock:
+            self._entry(method)["retries"] += 1
+            if is_rate_limited(e):
+                self.rate_limited += 1
+
+    def record_throttle(self, waited):
+        with self.lock:
+            self.throttled += 1
+            self.throttle_wait += waited
+
+    def snapshot(self) -> dict:
+        """目前的統計數字（可直接丟給 st.json 或寫進 log）"""
+        with self.lock:
+            methods = {}
+            for name, m in self.methods.items():
+                avg = m["total_latency"] / m["calls"] if m["calls"] else 0.0
+                methods[name] = dict(m, avg_latency=avg)
+            return {
+                "methods": methods,
+                "throttled": self.throttled,
+                "throttle_wait": self.throttle_wait,
+                "rate_limited": self.rate_limited,
+            }
+
+
+class _Quota:
+    def __init__(self, read_per_minute, write_per_minute):
+        self.read = TokenBucket(read_per_minute)
+        self.write = TokenBucket(write_per_minute)
+        self.metrics = SheetsMetrics()
+
+
+@st.cache_resource
+def get_quota() -> _Quota:
+    """整個 process 共用一組 token bucket 與統計"""
+    conf = st.secrets.get("sheets_quota", {})
+    return _Quota(
+        int(conf.get("read_per_minute", DEFAULT_READ_PER_MINUTE)),
+        int(conf.get("write_per_minute", DEFAULT_WRITE_PER_MINUTE)),
+    )
+
+
+def get_metrics() -> dict:
+    return get_quota().metrics.snapshot()
+
+
+# ---------- Worksheet 包裝 ----------
+class QuotaAwareWorksheet:
+    """包住 gspread.Worksheet；讀寫方法會先排隊拿 token，失敗時自動重試"""
+
+    def __init__(self, worksheet, quota: _Quota):
+        self._ws = worksheet
+        self._quota = quota
+
+    def __getattr__(self, name):
+        attr = getattr(self._ws, name)
+        if name in READ_METHODS:
+            return self._wrap(name, attr, self._quota.read)
+        if name in WRITE_METHODS:
+            return self._wrap(name, attr, self._quota.write)
+        return attr
+
+    def _wrap(self, name, fn, bucket):
+        metrics = self._quota.metrics
+        retryable = is_rate_limited if name in NON_IDEMPOTENT_METHODS else is_transient
+
+        def call(*args, **kwargs):
+            for attempt in range(MAX_RETRIES):
+                waited = bucket.acquire()
+                if waited:
+                    metrics.record_throttle(waited)
+                start = time.monotonic()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    metrics.record_call(name, time.monotonic() - start, ok=False)
+                    if not retryable(e) or attempt == MAX_RETRIES - 1:
+                        raise
+                    metrics.record_retry(name, e)
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                metrics.record_call(name, time.monotonic() - start, ok=True)
+                return result
+
+        return call
@@ -0,0 +1,322 @@
+"""
+`vol` 工作表的本機 SQLite 鏡像（WAL 模式），作為頁面讀取的主要來源。
+
+- 欄位與 Sheet 相同（id_number … date），另存 phone_norm / name_norm / row_number
+- role、phone_norm、date 等查詢欄位都有索引，登入、查重、找任務都是本機索引查詢
+- 報名關係（assignments）另存一張表，主鍵 (mission_id, volunteer_id)，另有 volunteer_id 索引：
+  「誰報名了這個任務」與「我報名了哪些任務」都是索引查詢
+- 背景執行緒跟著 sheet_store 的快照同步：有人寫入就立刻同步，平常定期檢查
+- Google Sheets 變慢或掛掉時，頁面照樣從鏡像讀到最後一次同步的資料
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from sheet_store import (
+    ASSIGNMENT_COLUMNS,
+    FLOAT_COLUMNS,
+    INT_COLUMNS,
+    VOL_COLUMNS,
+    load_assignments,
+    load_snapshot_with_version,
+    normalize_phone,
+    normalize_text,
+    wait_for_write,
+)
+
+MIRROR_PATH = "vol_mirror.sqlite3"
+MIRROR_SYNC_INTERVAL = 30   # 秒：沒有寫入時多久檢查一次 Sheet（實際讀取仍受快照規則控制）
+
+MIRROR_COLUMNS = VOL_COLUMNS + ["phone_norm", "name_norm", "row_number"]
+
+def column_type(c):
+    if c in INT_COLUMNS:
+        return "INTEGER"
+    return "REAL" if c in FLOAT_COLUMNS else "TEXT"
+
+
+_COLUMN_DEFS = ",\n    ".join(f"{c} {column_type(c)}" for c in VOL_COLUMNS + ["phone_norm", "name_norm"])
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS vol (
+    {_COLUMN_DEFS},
+    row_number INTEGER PRIMARY KEY
+);
+CREATE INDEX IF NOT EXISTS idx_vol_role ON vol(role);
+CREATE INDEX IF NOT EXISTS idx_vol_phone_norm ON vol(phone_norm);
+CREATE INDEX IF NOT EXISTS idx_vol_date ON vol(date);
+CREATE INDEX IF NOT EXISTS idx_vol_role_phone ON vol(role, phone_norm);
+CREATE INDEX IF NOT EXISTS idx_vol_id_number ON vol(id_number);
+CREATE TABLE IF NOT EXISTS assignments (
+    mission_id INTEGER,
+    volunteer_id INTEGER,
+    volunteer_name TEXT,
+    created_at TEXT,
+    PRIMARY KEY (mission_id, volunteer_id)
+);
+CREATE INDEX IF NOT EXISTS idx_assignments_volunteer ON assignments(volunteer_id);
+CREATE TABLE IF NOT EXISTS sync_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+logger = logging.getLogger(__name__)
+
+
+# ---------- 連線 ----------
+class ConnectionPool:
+    """
+    同一個資料庫檔案的連線池（整個 process 共用）。
+    Streamlit 每次 rerun 都跑在新的執行緒上，不能每個執行緒開一條連線：
+    連線用完放回池子，同一時間一條連線只借給一個執行緒；建表 / 補欄位整個 process 只做一次。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with self._init_lock:
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                _add_missing_columns(conn)
+                self._initialized = True
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        try:
+            yield conn
+        finally:
+            # 借用的人沒有結束的 transaction 不能留給下一個人
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connection(path=MIRROR_PATH):
+    """借一條連線：with connection(path) as conn: ..."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+    return pool.connection()
+
+
+def _fetchone(sql, params=(), path=MIRROR_PATH):
+    with connection(path) as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(sql, params=(), path=MIRROR_PATH):
+    with connection(path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def _add_missing_columns(conn):
+    """舊版建立的資料庫少了後來新增的欄位（例如 lat / lng）時補上"""
+    existing = {r["name"] for r in conn.execute("PRAGMA table_info(vol)")}
+    for c in VOL_COLUMNS + ["phone_norm", "name_norm"]:
+        if c not in existing:
+            conn.execute(f"ALTER TABLE vol ADD COLUMN {c} {column_type(c)}")
+    conn.commit()
+
+
+def sql_value(column, value):
+    """寫入 SQLite 前的轉換：座標欄位的空白 / NaN 存成 NULL，數值欄位的空白存成 0（與快照一致）"""
+    blank = value is None or value == "" or (isinstance(value, float) and pd.isna(value))
+    if column in FLOAT_COLUMNS and blank:
+        return None
+    if column in INT_COLUMNS and blank:
+        return 0
+    return value
+
+
+# ---------- 寫入（只有同步工作會呼叫） ----------
+def write_snapshot(df: pd.DataFrame, version, path=MIRROR_PATH, assignments=None):
+    """把整份快照（與報名關係）寫進鏡像（單一 transaction，讀取端在 WAL 下不會被擋住）"""
+    data = df.reindex(columns=MIRROR_COLUMNS)
+    data = data.fillna({c: "" for c in MIRROR_COLUMNS if c not in FLOAT_COLUMNS}).astype(object)
+    data = data.where(data.notna(), None)
+    placeholders = ", ".join("?" for _ in MIRROR_COLUMNS)
+    with connection(path) as conn, conn:
+        conn.execute("DELETE FROM vol")
+        conn.executemany(
+            f"INSERT INTO vol ({', '.join(MIRROR_COLUMNS)}) VALUES ({placeholders})",
+            data.itertuples(index=False, name=None),
+        )
+        if assignments is not None:
+            conn.execute("DELETE FROM assignments")
+            conn.executemany(
+                f"INSERT OR IGNORE INTO assignments ({', '.join(ASSIGNMENT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in ASSIGNMENT_COLUMNS)})",
+                ([a[c] for c in ASSIGNMENT_COLUMNS] for a in assignments),
+            )
+        conn.executemany(
+            "INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)",
+            [("version", str(version)), ("synced_at", str(time.time()))],
+        )
+
+
+def synced_version(path=MIRROR_PATH):
+    row = _fetchone("SELECT value FROM sync_meta WHERE key = 'version'", path=path)
+    return int(row["value"]) if row else None
+
+
+def bump_version(conn):
+    """資料直接寫在 SQLite 時（SQLite 後端），在同一個 transaction 內把 version + 1"""
+    conn.execute(
+        "INSERT INTO sync_meta (key, value) VALUES ('version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+def is_ready(path=MIRROR_PATH) -> bool:
+    """鏡像是否至少同步過一次（還沒同步過就沒有資料可讀）"""
+    return synced_version(path) is not None
+
+
+def sync_once(path=MIRROR_PATH, last_version=None):
+    """從 sheet_store 取得快照（必要時才讀 Sheet），有變動才寫入鏡像，回傳目前 version"""
+    df, version = load_snapshot_with_version()
+    if version != last_version:
+        write_snapshot(df, version, path, assignments=load_assignments())
+    return version
+
+
+def _sync_loop(path):
+    last_version = None
+    while True:
+        try:
+            last_version = sync_once(path, last_version)
+        except Exception:
+            # Sheet 暫時讀不到：鏡像維持上一次的資料繼續提供讀取
+            logger.exception("同步 SQLite 鏡像失敗，稍後重試")
+        wait_for_write(MIRROR_SYNC_INTERVAL)
+
+
+@st.cache_resource
+def start_mirror(path=MIRROR_PATH):
+    """
+    啟動背景同步（整個 process 一次）。
+    鏡像從未同步過時先同步一次再回傳，確保頁面第一次讀取就有資料。
+    """
+    if synced_version(path) is None:
+        sync_once(path)
+    thread = threading.Thread(target=_sync_loop, args=(path,), name="sqlite-mirror", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------- 查詢 ----------
+def _entry(row):
+    if row is None:
+        return None, None
+    record = dict(row)
+    return int(record["row_number"]), record
+
+
+def find_user(role, phone, name=None, path=MIRROR_PATH):
+    """依身分 + 電話（可再加姓名）找使用者，回傳 (row_number, record) 或 (None, None)"""
+    role = str(role).strip().lower()
+    phone_norm = normalize_phone(phone)
+    if name is None:
+        row = _fetchone(
+            "SELECT * FROM vol WHERE role = ? AND phone_norm = ? ORDER BY row_number LIMIT 1",
+            (role, phone_norm), path,
+        )
+    else:
+        row = _fetchone(
+            "SELECT * FROM vol WHERE role = ? AND name_norm = ? AND phone_norm = ? "
+            "ORDER BY row_number LIMIT 1",
+            (role, normalize_text(name), phone_norm), path,
+        )
+    return _entry(row)
+
+
+def find_by_id(id_number, role=None, path=MIRROR_PATH):
+    """依 id_number 找列，可指定 role，回傳 (row_number, record) 或 (None, None)"""
+    try:
+        id_number = int(id_number)
+    except (TypeError, ValueError):
+        return None, None
+    row = _fetchone("SELECT * FROM vol WHERE id_number = ? ORDER BY row_number LIMIT 1", (id_number,), path)
+    if row is None or (role is not None and str(row["role"]).strip().lower() != role):
+        return None, None
+    return _entry(row)
+
+
+def has_phone(phone, path=MIRROR_PATH) -> bool:
+    row = _fetchone("SELECT 1 FROM vol WHERE phone_norm = ? LIMIT 1", (normalize_phone(phone),), path)
+    return row is not None
+
+
+def _query_df(sql, params=(), path=MIRROR_PATH) -> pd.DataFrame:
+    rows = _fetchall(sql, params, path)
+    return pd.DataFrame([dict(r) for r in rows], columns=MIRROR_COLUMNS)
+
+
+def rows_for_phone(phone, path=MIRROR_PATH) -> pd.DataFrame:
+    return _query_df(
+        "SELECT * FROM vol WHERE phone_norm = ? ORDER BY row_number", (normalize_phone(phone),), path
+    )
+
+
+def list_missions(since=None, path=MIRROR_PATH) -> pd.DataFrame:
+    """
+    受災戶的任務（demand_worker > 0）。
+    since="YYYY-MM-DD" 時只回傳該日（含）之後、且 date 為合法日期的任務（用 date 索引）。
+    """
+    sql = "SELECT * FROM vol WHERE role = 'victim' AND demand_worker > 0"
+    params = ()
+    if since is not None:
+        sql += " AND date >= ? AND date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+        params = (since,)
+    return _query_df(sql + " ORDER BY row_number", params, path)
+
+
+def list_by_role(role, path=MIRROR_PATH) -> pd.DataFrame:
+    return _query_df("SELECT * FROM vol WHERE role = ? ORDER BY row_number", (role,), path)
+
+
+def read_all(path=MIRROR_PATH) -> pd.DataFrame:
+    return _query_df("SELECT * FROM vol ORDER BY row_number", (), path)
+
+
+# ---------- 報名關係 ----------
+def volunteers_for_mission(mission_id, path=MIRROR_PATH) -> list:
+    """報名了這個任務的志工（依報名先後），dict 清單（ASSIGNMENT_COLUMNS）"""
+    rows = _fetchall(
+        "SELECT * FROM assignments WHERE mission_id = ? ORDER BY created_at", (int(mission_id),), path
+    )
+    return [dict(r) for r in rows]
+
+
+def missions_for_volunteer(volunteer_id, path=MIRROR_PATH) -> set:
+    rows = _fetchall("SELECT mission_id FROM assignments WHERE volunteer_id = ?", (int(volunteer_id),), path)
+    return {r["mission_id"] for r in rows}
+
+
+def list_assignments(path=MIRROR_PATH) -> pd.DataFrame:
+    rows = _fetchall("SELECT * FROM assignments ORDER BY mission_id, created_at", (), path)
+    return pd.DataFrame([dict(r) for r in rows], columns=ASSIGNMENT_COLUMNS)
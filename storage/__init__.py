@@ -0,0 +1,39 @@
+"""
+資料儲存後端。頁面只依賴 VolRepository 介面，不直接碰 gspread / SQLite：
+
+    from storage import get_repository
+    repo = get_repository()
+    row_key, user = repo.find_user("volunteer", phone)
+
+後端由 secrets 的 storage_backend 決定："sheets"（預設）、"sqlite"、"memory"。
+"""
+import streamlit as st
+
+from rollover import start_rollover
+from storage.base import DEMAND_COLUMNS, DEMAND_INPUT_COLUMNS, PROFILE_COLUMNS, VolRepository, WriteQueued
+
+BACKENDS = ("sheets", "sqlite", "memory")
+
+
+def _create(backend) -> VolRepository:
+    if backend == "sheets":
+        from storage.sheets import SheetsRepository
+        return SheetsRepository()
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteRepository
+        return SQLiteRepository(st.secrets.get("sqlite_path", "vol.sqlite3"))
+    if backend == "memory":
+        from storage.memory import InMemoryRepository
+        return InMemoryRepository()
+    raise ValueError(f"未知的 storage_backend：{backend}（可用：{', '.join(BACKENDS)}）")
+
+
+@st.cache_resource
+def get_repository(backend=None) -> VolRepository:
+    """整個 process 共用一個 repository；同時啟動每晚 20:00 的下架排程"""
+    repo = _create(backend or st.secrets.get("storage_backend", "sheets"))
+    start_rollover(repo)
+    return repo
+
+
+__all__ = ["DEMAND_COLUMNS", "DEMAND_INPUT_COLUMNS", "PROFILE_COLUMNS", "VolRepository", "WriteQueued", "get_repository"]
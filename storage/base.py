@@ -0,0 +1,225 @@
+"""
+VolRepository：`vol` 資料（使用者 + 受災戶任務）的儲存介面。
+
+所有後端回傳的格式都相同：
+- 單筆查詢回傳 (row_key, record)，找不到回傳 (None, None)；
+  row_key 是該筆資料在後端的位置（Sheets 為列號、SQLite / 記憶體為主鍵）
+- 多筆查詢回傳 DataFrame，欄位為 sheet_store.VOL_COLUMNS + phone_norm / name_norm / row_number
+
+報名關係（assignments）與 vol 分開存放：(mission_id, volunteer_id) 為 key（都是 id_number），
+兩個方向都有索引。accepted_volunteers 欄位仍會一起更新，但只是給人看的名單，程式不再解析它。
+"""
+import threading
+from abc import ABC, abstractmethod
+from functools import cached_property
+from itertools import islice
+
+from sheet_store import VOL_COLUMNS
+
+# 受災戶需求欄位（Sheet 的 F:S）
+DEMAND_COLUMNS = VOL_COLUMNS[VOL_COLUMNS.index("mission_name"):]
+
+# 媒合欄位（Sheet 的 J:K）：只由報名（add_volunteer）與下架更新。
+# 受災戶更新需求時不寫這兩欄，否則會用表單載入當時的舊值蓋掉中間新增的報名
+MATCHING_COLUMNS = ["selected_worker", "accepted_volunteers"]
+
+# 照片欄位（Sheet 的 N）：只由背景上傳（photo_pipeline）寫入網址。
+# 表單不寫，否則上傳完成前後再送出一次，會用 session 裡的舊網址蓋掉新照片
+PHOTO_COLUMN = "photo"
+
+# 受災戶需求表單寫入的欄位（Sheet 的 F:I、L:M 與 O:S）
+DEMAND_INPUT_COLUMNS = [c for c in DEMAND_COLUMNS if c not in MATCHING_COLUMNS and c != PHOTO_COLUMN]
+
+# 每晚下架時封存的欄位：封存日期 + 受災戶識別資料 + 當天的需求
+ARCHIVE_COLUMNS = ["archive_date", "id_number", "name", "phone"] + DEMAND_COLUMNS
+
+# 下架後需求欄位的值：全部清空，selected_worker 歸零
+CLEARED_DEMAND = {c: "" for c in DEMAND_COLUMNS}
+CLEARED_DEMAND["selected_worker"] = 0
+
+# 志工個人資料欄位（與受災需求表單同一套選項代碼，逗號分隔）
+PROFILE_COLUMNS = ["work_time", "skills", "transport"]
+
+
+class WriteQueued(Exception):
+    """寫入已排入佇列但尚未確認完成（例如 Sheets 忙碌中），資料稍後會寫入"""
+
+
+class IdAllocator:
+    """
+    id_number 配號：向後端預約一段號碼（reserve(count) 回傳至少 count 個號碼的 range，
+    預約本身是原子操作，不同 process 拿到的區段不會重疊），在 process 內依序發放，用完再預約。
+    每次配號 O(1)、不掃描整欄；process 重啟時沒用完的號碼會跳過（留下空號）。
+    """
+
+    def __init__(self, reserve):
+        self.reserve = reserve
+        self._lock = threading.Lock()
+        self._ids = iter(())
+
+    def take(self, count=1) -> list:
+        """連續取 count 個號碼（手上的不夠時一次預約不足的部分）"""
+        with self._lock:
+            ids = list(islice(self._ids, count))
+            if len(ids) < count:
+                self._ids = iter(self.reserve(count - len(ids)))
+                ids += islice(self._ids, count - len(ids))
+            return ids
+
+
+def new_user_record(id_number, role, name, phone_norm, line_id="", profile=None) -> dict:
+    """
+    註冊時的一整列：基本資料以外的欄位都是空白，selected_worker 為 0；
+    志工可另外帶入 profile（PROFILE_COLUMNS 的值）
+    """
+    record = {c: "" for c in VOL_COLUMNS}
+    record.update({c: v for c, v in (profile or {}).items() if c in PROFILE_COLUMNS})
+    record.update({
+        "id_number": int(id_number),
+        "role": role,
+        "name": name.strip(),
+        "phone": phone_norm,
+        "line_id": line_id.strip(),
+        "selected_worker": 0,
+    })
+    return record
+
+
+def rollover_mask(df):
+    """需要下架的列：受災戶且當天有填需求（有需求人數、任務名稱或日期）"""
+    return (df["role"] == "victim") & (
+        (df["demand_worker"] > 0) | (df["mission_name"] != "") | (df["date"] != "")
+    )
+
+
+def archive_records(df, archive_date) -> list:
+    """把要下架的列轉成封存紀錄（ARCHIVE_COLUMNS），座標沒有值時為空字串"""
+    rows = df.assign(archive_date=archive_date, phone=df["phone_norm"]).reindex(columns=ARCHIVE_COLUMNS)
+    rows = rows.astype(object).where(rows.notna(), "")
+    return rows.to_dict("records")
+
+
+class VolRepository(ABC):
+    # ---------- 讀取 ----------
+    @abstractmethod
+    def is_ready(self) -> bool:
+        """是否已有資料可讀"""
+
+    @abstractmethod
+    def find_user(self, role, phone, name=None):
+        """依身分 + 電話（可再加姓名）找使用者"""
+
+    @abstractmethod
+    def find_by_id(self, id_number, role=None):
+        """依 id_number 找列，可指定 role（任務只找 victim）"""
+
+    @abstractmethod
+    def has_phone(self, phone) -> bool:
+        """是否有任何身分用這支電話註冊"""
+
+    @abstractmethod
+    def rows_for_phone(self, phone):
+        """這支電話的所有列"""
+
+    @abstractmethod
+    def list_by_role(self, role):
+        """某身分的所有列"""
+
+    @abstractmethod
+    def read_all(self):
+        """整份資料（所有身分），依 row_number 排序"""
+
+    @abstractmethod
+    def list_missions(self, since=None):
+        """受災戶任務（demand_worker > 0）；since="YYYY-MM-DD" 時只取該日（含）之後"""
+
+    @abstractmethod
+    def data_version(self):
+        """資料版本：任何寫入（含其他 process）之後都會改變，可當作衍生索引的快取 key"""
+
+    @abstractmethod
+    def volunteers_for_mission(self, mission_id) -> list:
+        """報名了這個任務的志工（依報名先後），dict 清單（ASSIGNMENT_COLUMNS）"""
+
+    @abstractmethod
+    def missions_for_volunteer(self, volunteer_id) -> set:
+        """這位志工報名的任務 id_number"""
+
+    @abstractmethod
+    def list_assignments(self):
+        """所有報名關係（DataFrame，ASSIGNMENT_COLUMNS）"""
+
+    def is_assigned(self, mission_id, volunteer_id) -> bool:
+        return int(mission_id) in self.missions_for_volunteer(volunteer_id)
+
+    def list_open_missions(self, today):
+        """今天（含）之後仍有效的任務"""
+        return self.list_missions(since=today)
+
+    # ---------- 寫入 ----------
+    @abstractmethod
+    def reserve_ids(self, count=1) -> range:
+        """原子地預約至少 count 個沒有人用過的 id_number（同時呼叫也不會重疊）"""
+
+    @cached_property
+    def _id_allocator(self):
+        return IdAllocator(self.reserve_ids)
+
+    def next_id_number(self) -> int:
+        """下一個可用的 id_number：唯一（同時註冊也不會拿到同一個號碼），同一 process 內遞增"""
+        return self._id_allocator.take(1)[0]
+
+    def next_id_numbers(self, count) -> list:
+        """一次配 count 個 id_number（批次匯入用）"""
+        return self._id_allocator.take(count)
+
+    def register_user(self, record: dict):
+        """新增一位使用者（record 由 new_user_record 產生）"""
+        self.register_users([record])
+
+    @abstractmethod
+    def register_users(self, records: list):
+        """一次新增多位使用者（一次寫入）"""
+
+    @abstractmethod
+    def upsert_demand(self, row_key, demand: dict):
+        """寫入 / 更新受災戶當天的需求（只寫 DEMAND_INPUT_COLUMNS；demand 裡的媒合欄位會被忽略）"""
+
+    @abstractmethod
+    def update_fields(self, row_key, fields: dict):
+        """只更新指定欄位（例如志工的 PROFILE_COLUMNS），其他欄位不動"""
+
+    @abstractmethod
+    def rollover_demands(self, archive_date) -> int:
+        """
+        每晚下架：把所有受災戶當天的需求一次封存（append-only），再一次清空需求欄位、
+        selected_worker 歸零、刪除這些任務的報名關係，回傳封存筆數。
+        中途失敗後重試不會重複封存，也不會留下報名關係；
+        其他 process 正在執行同一天的下架時 raise RolloverBusy。
+        """
+
+    @abstractmethod
+    def last_rollover_date(self):
+        """最近一次完成下架的 archive_date（YYYY-MM-DD）；從來沒有下架過回傳 None"""
+
+    @abstractmethod
+    def add_volunteer(self, task_id, volunteer_id, vol_name, vol_phone) -> bool:
+        """
+        志工（volunteer_id 為志工的 id_number）報名任務：新增報名關係、selected_worker + 1；
+        True 表示成功、False 表示已經報過；
+        額滿或找不到任務 raise ValueError。同一任務的報名不可超收。
+        """
+
+    def add_volunteers(self, signups) -> list:
+        """
+        一次報名多筆（協調者批次指派）：signups 為 (task_id, volunteer_id, vol_name, vol_phone) 的清單，
+        回傳對應的結果：True 成功、False 已經報過、字串為失敗原因。
+        預設逐筆呼叫 add_volunteer；每次報名都要打 API 的後端（Sheets）改成一起讀寫。
+        """
+        results = []
+        for task_id, volunteer_id, vol_name, vol_phone in signups:
+            try:
+                results.append(self.add_volunteer(task_id, volunteer_id, vol_name, vol_phone))
+            except ValueError as e:
+                results.append(str(e))
+        return results
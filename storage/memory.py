@@ -0,0 +1,152 @@
+"""
+記憶體後端：資料只放在 process 記憶體裡，重啟就消失。
+不需要網路也不需要檔案，用於壓力測試、效能量測與本機開發。
+列的位置與 Sheet 相同（第一筆資料 row_key = 2）。
+"""
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from sheet_store import ASSIGNMENT_COLUMNS, UserIndex, normalize_phone, prepare_dataframe, signup_values
+from storage.base import CLEARED_DEMAND, DEMAND_INPUT_COLUMNS, VolRepository, archive_records, rollover_mask
+
+_DATE_PATTERN = r"\d{4}-\d{2}-\d{2}"
+
+
+class InMemoryRepository(VolRepository):
+    def __init__(self, records=None):
+        self._lock = threading.RLock()
+        self._records = [dict(r) for r in (records or [])]
+        self._df = None
+        self._index = None
+        self._version = 0
+        self._last_id = None     # 最後發出的 id_number（第一次配號時由現有資料決定）
+        self.archive = []        # 每晚下架封存的需求（ARCHIVE_COLUMNS）
+        self.rollover_dates = set()
+        # 報名關係的雙向索引：mission_id -> {volunteer_id: record}、volunteer_id -> {mission_id}
+        self._by_mission = {}
+        self._by_volunteer = {}
+
+    def _view(self):
+        """回傳 (DataFrame, UserIndex)；資料有變動時才重建"""
+        with self._lock:
+            if self._df is None:
+                self._df = prepare_dataframe(self._records)
+                self._index = UserIndex(self._df)
+            return self._df, self._index
+
+    def _changed(self):
+        self._version += 1
+        self._df = None
+        self._index = None
+
+    # ---------- 讀取 ----------
+    def is_ready(self):
+        return True
+
+    def find_user(self, role, phone, name=None):
+        return self._view()[1].find_user(role, phone, name=name)
+
+    def find_by_id(self, id_number, role=None):
+        return self._view()[1].find_by_id(id_number, role=role)
+
+    def has_phone(self, phone):
+        return self._view()[1].has_phone(phone)
+
+    def rows_for_phone(self, phone):
+        df, index = self._view()
+        return df.iloc[index.positions_by_phone.get(normalize_phone(phone), [])]
+
+    def list_by_role(self, role):
+        df, _ = self._view()
+        return df[df["role"] == role]
+
+    def read_all(self):
+        return self._view()[0]
+
+    def data_version(self):
+        return self._version
+
+    def list_missions(self, since=None):
+        df, _ = self._view()
+        mask = (df["role"] == "victim") & (df["demand_worker"] > 0)
+        if since is not None:
+            mask &= df["date"].str.fullmatch(_DATE_PATTERN) & (df["date"] >= since)
+        return df[mask]
+
+    def volunteers_for_mission(self, mission_id):
+        with self._lock:
+            return list(self._by_mission.get(int(mission_id), {}).values())
+
+    def missions_for_volunteer(self, volunteer_id):
+        with self._lock:
+            return set(self._by_volunteer.get(int(volunteer_id), ()))
+
+    def list_assignments(self):
+        with self._lock:
+            rows = [a for members in self._by_mission.values() for a in members.values()]
+        return pd.DataFrame(rows, columns=ASSIGNMENT_COLUMNS)
+
+    # ---------- 寫入 ----------
+    def reserve_ids(self, count=1):
+        with self._lock:
+            if self._last_id is None:
+                self._last_id = max((int(r.get("id_number") or 0) for r in self._records), default=0)
+            self._last_id += count
+            return range(self._last_id - count + 1, self._last_id + 1)
+
+    def register_users(self, records):
+        with self._lock:
+            self._records.extend(dict(r) for r in records)
+            self._changed()
+
+    def upsert_demand(self, row_key, demand):
+        with self._lock:
+            self._records[int(row_key) - 2].update({c: demand.get(c, "") for c in DEMAND_INPUT_COLUMNS})
+            self._changed()
+
+    def update_fields(self, row_key, fields):
+        with self._lock:
+            self._records[int(row_key) - 2].update(fields)
+            self._changed()
+
+    def rollover_demands(self, archive_date):
+        with self._lock:
+            df, _ = self._view()
+            targets = df[rollover_mask(df)]
+            self.rollover_dates.add(archive_date)
+            if targets.empty:
+                return 0
+            self.archive.extend(archive_records(targets, archive_date))
+            for pos in targets.index:
+                self._records[pos].update(CLEARED_DEMAND)
+            for mission_id in targets["id_number"]:
+                for volunteer_id in self._by_mission.pop(int(mission_id), {}):
+                    self._by_volunteer[volunteer_id].discard(int(mission_id))
+            self._changed()
+            return len(targets)
+
+    def last_rollover_date(self):
+        return max(self.rollover_dates, default=None)
+
+    def add_volunteer(self, task_id, volunteer_id, vol_name, vol_phone):
+        task_id, volunteer_id = int(task_id), int(volunteer_id)
+        with self._lock:
+            row_key, _ = self.find_by_id(task_id, role="victim")
+            if row_key is None:
+                raise ValueError("找不到指定任務在資料表中的列")
+            members = self._by_mission.setdefault(task_id, {})
+            if volunteer_id in members:
+                return False
+            record = self._records[row_key - 2]
+            record["selected_worker"], record["accepted_volunteers"] = signup_values(record, vol_name, vol_phone)
+            members[volunteer_id] = {
+                "mission_id": task_id,
+                "volunteer_id": volunteer_id,
+                "volunteer_name": vol_name,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._by_volunteer.setdefault(volunteer_id, set()).add(task_id)
+            self._changed()
+            return True
@@ -0,0 +1,247 @@
+"""
+Google Sheets 後端：Sheet 是唯一的資料來源。
+- 讀取走本機 SQLite 鏡像（sqlite_mirror，背景同步）
+- 註冊 / 需求更新走背景寫入佇列（sheet_writer），報名走有鎖的 add_volunteer_to_mission
+- 報名關係存在 assignments 工作表，查詢同樣走鏡像
+"""
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+import sqlite_mirror as mirror
+from rollover import RolloverBusy
+from sheet_store import (
+    VOL_COLUMNS,
+    add_volunteer_to_mission,
+    add_volunteers_to_missions,
+    col_letter,
+    get_assignments_worksheet,
+    get_id_blocks_worksheet,
+    get_or_create_worksheet,
+    get_worksheet,
+    invalidate_snapshot,
+    load_snapshot,
+    read_assignments,
+    rows_in_range,
+)
+from sheet_writer import WRITE_ACK_TIMEOUT, get_writer
+from storage.base import (
+    ARCHIVE_COLUMNS,
+    CLEARED_DEMAND,
+    DEMAND_COLUMNS,
+    DEMAND_INPUT_COLUMNS,
+    VolRepository,
+    WriteQueued,
+    archive_records,
+    rollover_mask,
+)
+
+ARCHIVE_WORKSHEET = "vol_archive"
+ID_BLOCK_SIZE = 20        # 每次預約幾個 id_number（一次 API 呼叫可以給 20 次註冊用）
+
+# 下架的執行紀錄：claimed = 某個 process 開始執行（租約）、done = 完成
+ROLLOVER_RUNS_WORKSHEET = "rollover_runs"
+ROLLOVER_RUNS_COLUMNS = ["archive_date", "owner", "at", "status"]
+ROLLOVER_LEASE_TTL = timedelta(minutes=30)   # 執行者當掉時，租約多久後可以被其他 process 接手
+
+
+def row_blocks(rows):
+    """排序好的列號 → 連續區段 [(start, end), ...]（例如 [2, 3, 4, 7] -> [(2, 4), (7, 7)]）"""
+    blocks = []
+    for r in rows:
+        if blocks and r == blocks[-1][1] + 1:
+            blocks[-1][1] = r
+        else:
+            blocks.append([r, r])
+    return [tuple(b) for b in blocks]
+
+
+def column_runs(columns):
+    """把欄位切成 Sheet 上連續的幾段（例如 DEMAND_INPUT_COLUMNS -> F:I、L:M、O:S）"""
+    runs = []
+    for c in columns:
+        if runs and VOL_COLUMNS.index(c) == VOL_COLUMNS.index(runs[-1][-1]) + 1:
+            runs[-1].append(c)
+        else:
+            runs.append([c])
+    return runs
+
+
+class SheetsRepository(VolRepository):
+    def __init__(self):
+        mirror.start_mirror()
+        self._owner = uuid.uuid4().hex      # 這個 process 在 rollover_runs 上的身分
+
+    # ---------- 讀取（本機鏡像） ----------
+    def is_ready(self):
+        return mirror.is_ready()
+
+    def find_user(self, role, phone, name=None):
+        return mirror.find_user(role, phone, name=name)
+
+    def find_by_id(self, id_number, role=None):
+        return mirror.find_by_id(id_number, role=role)
+
+    def has_phone(self, phone):
+        return mirror.has_phone(phone)
+
+    def rows_for_phone(self, phone):
+        return mirror.rows_for_phone(phone)
+
+    def list_by_role(self, role):
+        return mirror.list_by_role(role)
+
+    def read_all(self):
+        return mirror.read_all()
+
+    def list_missions(self, since=None):
+        return mirror.list_missions(since=since)
+
+    def data_version(self):
+        return mirror.synced_version()
+
+    def volunteers_for_mission(self, mission_id):
+        return mirror.volunteers_for_mission(mission_id)
+
+    def missions_for_volunteer(self, volunteer_id):
+        return mirror.missions_for_volunteer(volunteer_id)
+
+    def list_assignments(self):
+        return mirror.list_assignments()
+
+    # ---------- 寫入（Google Sheet） ----------
+    def _wait(self, future):
+        try:
+            future.result(timeout=WRITE_ACK_TIMEOUT)
+        except FutureTimeoutError:
+            raise WriteQueued("系統忙碌中，資料將於稍後寫入")
+
+    def reserve_ids(self, count=1):
+        # append 由 Sheets 依序處理，每一次 append 拿到的列號都不同：第 n 列 = 第 n - 1 段號碼；
+        # 需要多段時一次 append 多列，拿到的是連續的幾段
+        ws, offset, block_size = get_id_blocks_worksheet(ID_BLOCK_SIZE)
+        blocks = -(-count // block_size)
+        now = datetime.now().isoformat(timespec="seconds")
+        resp = ws.append_rows([[block_size, now]] * blocks, value_input_option="RAW", table_range="A1")
+        rows = rows_in_range(resp["updates"]["updatedRange"].split("!")[-1])
+        return range(offset + (rows[0] - 2) * block_size + 1, offset + (rows[-1] - 1) * block_size + 1)
+
+    def register_users(self, records):
+        rows = []
+        for record in records:
+            row = [record.get(c, "") for c in VOL_COLUMNS]
+            # phone 加上單引號，確保 Sheet 維持文字格式（0 開頭不會消失）
+            row[VOL_COLUMNS.index("phone")] = "'" + str(record["phone"])
+            rows.append(row)
+        self._wait(get_writer().append_rows(rows))
+
+    def upsert_demand(self, row_key, demand):
+        # 跳過 J:K（媒合欄位）與 N（照片），分 F:I、L:M、O:S 三段寫入，背景寫入器會合併成同一次 batch_update
+        writer = get_writer()
+        futures = []
+        for cols in column_runs(DEMAND_INPUT_COLUMNS):
+            # 沒有座標（None / NaN）時寫空白
+            values = ["" if v is None or (isinstance(v, float) and pd.isna(v)) else v
+                      for v in (demand.get(c, "") for c in cols)]
+            cell_range = f"{col_letter(cols[0])}{row_key}:{col_letter(cols[-1])}{row_key}"
+            futures.append(writer.update_range(cell_range, [values]))
+        for future in futures:
+            self._wait(future)
+
+    def update_fields(self, row_key, fields):
+        # 每個欄位一筆範圍更新，背景寫入器會合併成同一次 batch_update
+        writer = get_writer()
+        futures = [
+            writer.update_range(f"{col_letter(c)}{row_key}", [[v]]) for c, v in fields.items()
+        ]
+        for future in futures:
+            self._wait(future)
+
+    # ---------- 下架 ----------
+    def _rollover_runs(self, runs, archive_date) -> list:
+        """rollover_runs 裡這一天的紀錄（Sheet 上的順序 = append 的先後）"""
+        rows = [dict(zip(ROLLOVER_RUNS_COLUMNS, r + [""] * len(ROLLOVER_RUNS_COLUMNS)))
+                for r in runs.get_all_values()[1:]]
+        return [r for r in rows if r["archive_date"].strip() == str(archive_date)]
+
+    def _claim_rollover(self, runs, archive_date) -> bool:
+        """
+        多個 process 只讓一個執行下架（Sheets 沒有條件式寫入，用 append 的先後當作租約）：
+        append 一列 claimed 再讀回來，這一天還沒過期的 claimed 列裡最早的一列就是執行者。
+        回傳 False 表示這一天已經下架完成；別的 process 持有租約時 raise RolloverBusy。
+        """
+        if any(r["status"] == "done" for r in self._rollover_runs(runs, archive_date)):
+            return False
+        now = datetime.now(timezone.utc)
+        runs.append_row([archive_date, self._owner, now.isoformat(timespec="seconds"), "claimed"],
+                        value_input_option="RAW")
+        rows = self._rollover_runs(runs, archive_date)
+        if any(r["status"] == "done" for r in rows):
+            return False
+        live = [
+            r for r in rows
+            if r["status"] == "claimed" and datetime.fromisoformat(r["at"]) > now - ROLLOVER_LEASE_TTL
+        ]
+        if live and live[0]["owner"] != self._owner:
+            raise RolloverBusy(f"{archive_date} 的下架正由其他 process 執行")
+        return True
+
+    def rollover_demands(self, archive_date):
+        runs = get_or_create_worksheet(ROLLOVER_RUNS_WORKSHEET, tuple(ROLLOVER_RUNS_COLUMNS))
+        if not self._claim_rollover(runs, archive_date):
+            return 0
+
+        # 以 Sheet 目前的內容為準（不用鏡像，避免漏掉剛寫入的需求）
+        invalidate_snapshot(full=True)
+        df = load_snapshot()
+        targets = df[rollover_mask(df)]
+        count = self._rollover_targets(targets, archive_date) if not targets.empty else 0
+
+        # 3. 刪除報名關係：清空之後任務沒有需求的都刪（不只這次的 targets，上次中途失敗留下的也一起清掉）；
+        #    只刪那幾列（連續的列一次刪），由下往上刪，上面的列號不會變；期間新增的報名 append 在表尾，不會被刪掉
+        df = load_snapshot()
+        still_open = {int(i) for i in df.loc[rollover_mask(df), "id_number"]}
+        assignments = get_assignments_worksheet()
+        doomed = sorted(a["row_number"] for a in read_assignments(assignments) if a["mission_id"] not in still_open)
+        for start, end in reversed(row_blocks(doomed)):
+            assignments.delete_rows(start, end)
+        invalidate_snapshot(assignments=True)
+
+        runs.append_row(
+            [archive_date, self._owner, datetime.now(timezone.utc).isoformat(timespec="seconds"), "done"],
+            value_input_option="RAW",
+        )
+        return count
+
+    def last_rollover_date(self):
+        runs = get_or_create_worksheet(ROLLOVER_RUNS_WORKSHEET, tuple(ROLLOVER_RUNS_COLUMNS))
+        done = [r[0].strip() for r in runs.get_all_values()[1:] if len(r) > 3 and r[3] == "done"]
+        return max(done, default=None)
+
+    def _rollover_targets(self, targets, archive_date) -> int:
+        # 1. 一次 append_rows 封存；2. 一次 batch_update 清空 F:S（selected_worker 歸零）
+        archive = get_or_create_worksheet(ARCHIVE_WORKSHEET, tuple(ARCHIVE_COLUMNS))
+        # 上次執行可能封存完才失敗（之後會重試）：同一天已經封存過的受災戶不再 append 一次
+        archived = {
+            int(row[1]) for row in archive.get("A2:B")
+            if len(row) > 1 and row[0].strip() == str(archive_date) and row[1].strip().isdigit()
+        }
+        records = [r for r in archive_records(targets, archive_date) if int(r["id_number"]) not in archived]
+        for r in records:
+            r["phone"] = "'" + str(r["phone"])     # 維持文字格式，0 開頭不會消失
+        if records:
+            archive.append_rows([[r[c] for c in ARCHIVE_COLUMNS] for r in records])
+        first, last = col_letter(DEMAND_COLUMNS[0]), col_letter(DEMAND_COLUMNS[-1])
+        cleared = [CLEARED_DEMAND[c] for c in DEMAND_COLUMNS]
+        rows = [int(r) for r in targets["row_number"]]
+        get_worksheet().batch_update([{"range": f"{first}{r}:{last}{r}", "values": [cleared]} for r in rows])
+        invalidate_snapshot(rows=rows)
+        return len(rows)
+
+    def add_volunteer(self, task_id, volunteer_id, vol_name, vol_phone):
+        return add_volunteer_to_mission(task_id, volunteer_id, vol_name, vol_phone)
+
+    def add_volunteers(self, signups):
+        return add_volunteers_to_missions(signups)
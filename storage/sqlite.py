@@ -0,0 +1,187 @@
+"""
+SQLite 後端：資料只存在本機 SQLite（WAL 模式），完全不經過 Google Sheets。
+結構與 sqlite_mirror 相同，查詢也直接共用 sqlite_mirror 的函式。
+適合負載大到 Sheets 撐不住時，把熱路徑整個搬離 Sheets。
+"""
+from datetime import datetime
+
+import sqlite_mirror as mirror
+from sheet_store import VOL_COLUMNS, normalize_phone, normalize_text, signup_values
+from storage.base import ARCHIVE_COLUMNS, CLEARED_DEMAND, DEMAND_COLUMNS, DEMAND_INPUT_COLUMNS, VolRepository
+
+_ARCHIVE_COLUMN_DEFS = ", ".join(
+    "archive_date TEXT" if c == "archive_date" else
+    "phone TEXT" if c == "phone" else f"{c} {mirror.column_type(c)}"
+    for c in ARCHIVE_COLUMNS
+)
+ARCHIVE_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS vol_archive ({_ARCHIVE_COLUMN_DEFS});
+CREATE TABLE IF NOT EXISTS rollover_runs (archive_date TEXT PRIMARY KEY, finished_at TEXT);
+"""
+
+# 與 storage.base.rollover_mask 相同的條件
+_ROLLOVER_WHERE = "role = 'victim' AND (demand_worker > 0 OR mission_name != '' OR date != '')"
+
+
+class SQLiteRepository(VolRepository):
+    def __init__(self, path):
+        self.path = path
+
+    def _conn(self):
+        return mirror.connection(self.path)
+
+    # ---------- 讀取 ----------
+    def is_ready(self):
+        return True
+
+    def find_user(self, role, phone, name=None):
+        return mirror.find_user(role, phone, name=name, path=self.path)
+
+    def find_by_id(self, id_number, role=None):
+        return mirror.find_by_id(id_number, role=role, path=self.path)
+
+    def has_phone(self, phone):
+        return mirror.has_phone(phone, path=self.path)
+
+    def rows_for_phone(self, phone):
+        return mirror.rows_for_phone(phone, path=self.path)
+
+    def list_by_role(self, role):
+        return mirror.list_by_role(role, path=self.path)
+
+    def read_all(self):
+        return mirror.read_all(path=self.path)
+
+    def list_missions(self, since=None):
+        return mirror.list_missions(since=since, path=self.path)
+
+    def data_version(self):
+        return mirror.synced_version(self.path) or 0
+
+    def volunteers_for_mission(self, mission_id):
+        return mirror.volunteers_for_mission(mission_id, path=self.path)
+
+    def missions_for_volunteer(self, volunteer_id):
+        return mirror.missions_for_volunteer(volunteer_id, path=self.path)
+
+    def list_assignments(self):
+        return mirror.list_assignments(path=self.path)
+
+    # ---------- 寫入 ----------
+    def reserve_ids(self, count=1):
+        with self._conn() as conn:
+            # 序號存在 sync_meta 的 id_sequence（第一次使用時以現有最大 id_number 起算）；
+            # BEGIN IMMEDIATE 讓「遞增 → 讀回」在同一個寫入鎖內完成，多個 process 也不會拿到同一號
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO sync_meta (key, value) "
+                    "SELECT 'id_sequence', COALESCE(MAX(id_number), 0) FROM vol"
+                )
+                conn.execute(
+                    "UPDATE sync_meta SET value = CAST(value AS INTEGER) + ? WHERE key = 'id_sequence'",
+                    (int(count),),
+                )
+                row = conn.execute("SELECT value FROM sync_meta WHERE key = 'id_sequence'").fetchone()
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            last = int(row["value"])
+            return range(last - count + 1, last + 1)
+
+    def register_users(self, records):
+        cols = VOL_COLUMNS + ["phone_norm", "name_norm"]
+        rows = [
+            [mirror.sql_value(c, r.get(c, "")) for c in VOL_COLUMNS]
+            + [normalize_phone(r["phone"]), normalize_text(r["name"])]
+            for r in records
+        ]
+        with self._conn() as conn, conn:
+            conn.executemany(
+                f"INSERT INTO vol ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})",
+                rows,
+            )
+            mirror.bump_version(conn)
+
+    def upsert_demand(self, row_key, demand):
+        assignments = ", ".join(f"{c} = ?" for c in DEMAND_INPUT_COLUMNS)
+        values = [mirror.sql_value(c, demand.get(c, "")) for c in DEMAND_INPUT_COLUMNS] + [int(row_key)]
+        with self._conn() as conn, conn:
+            conn.execute(f"UPDATE vol SET {assignments} WHERE row_number = ?", values)
+            mirror.bump_version(conn)
+
+    def update_fields(self, row_key, fields):
+        if not fields:
+            return
+        assignments = ", ".join(f"{c} = ?" for c in fields)
+        values = [mirror.sql_value(c, v) for c, v in fields.items()] + [int(row_key)]
+        with self._conn() as conn, conn:
+            conn.execute(f"UPDATE vol SET {assignments} WHERE row_number = ?", values)
+            mirror.bump_version(conn)
+
+    def rollover_demands(self, archive_date):
+        with self._conn() as conn:
+            conn.executescript(ARCHIVE_SCHEMA)
+            source = ["?", "id_number", "name", "phone_norm"] + DEMAND_COLUMNS
+            assignments = ", ".join(f"{c} = ?" for c in DEMAND_COLUMNS)
+            with conn:
+                # 封存、刪除報名關係與清空在同一個 transaction
+                conn.execute(
+                    f"DELETE FROM assignments WHERE mission_id IN (SELECT id_number FROM vol WHERE {_ROLLOVER_WHERE})"
+                )
+                count = conn.execute(
+                    f"INSERT INTO vol_archive ({', '.join(ARCHIVE_COLUMNS)}) "
+                    f"SELECT {', '.join(source)} FROM vol WHERE {_ROLLOVER_WHERE}",
+                    (archive_date,),
+                ).rowcount
+                if count:
+                    conn.execute(
+                        f"UPDATE vol SET {assignments} WHERE {_ROLLOVER_WHERE}",
+                        [mirror.sql_value(c, CLEARED_DEMAND[c]) for c in DEMAND_COLUMNS],
+                    )
+                    mirror.bump_version(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollover_runs VALUES (?, ?)",
+                    (archive_date, datetime.now().isoformat(timespec="seconds")),
+                )
+            return count
+
+    def last_rollover_date(self):
+        with self._conn() as conn:
+            conn.executescript(ARCHIVE_SCHEMA)
+            return conn.execute("SELECT MAX(archive_date) FROM rollover_runs").fetchone()[0]
+
+    def add_volunteer(self, task_id, volunteer_id, vol_name, vol_phone):
+        with self._conn() as conn:
+            # BEGIN IMMEDIATE：先拿寫入鎖再讀，讀 → 檢查名額 → 寫 在同一個 transaction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                task = conn.execute(
+                    "SELECT * FROM vol WHERE id_number = ? AND role = 'victim' ORDER BY row_number LIMIT 1",
+                    (int(task_id),),
+                ).fetchone()
+                if task is None:
+                    raise ValueError("找不到指定任務在資料表中的列")
+                exists = conn.execute(
+                    "SELECT 1 FROM assignments WHERE mission_id = ? AND volunteer_id = ?",
+                    (int(task_id), int(volunteer_id)),
+                ).fetchone()
+                if exists:
+                    conn.rollback()
+                    return False
+                updated = signup_values(dict(task), vol_name, vol_phone)
+                conn.execute(
+                    "UPDATE vol SET selected_worker = ?, accepted_volunteers = ? WHERE row_number = ?",
+                    (*updated, task["row_number"]),
+                )
+                conn.execute(
+                    "INSERT INTO assignments VALUES (?, ?, ?, ?)",
+                    (int(task_id), int(volunteer_id), vol_name, datetime.now().isoformat(timespec="seconds")),
+                )
+                mirror.bump_version(conn)
+                conn.commit()
+                return True
+            except Exception:
+                conn.rollback()
+                raise
@@ -0,0 +1,82 @@
+"""測試用的假工作表：值存在記憶體裡，介面與 gspread.Worksheet 相同（只實作用得到的方法）"""
+import re
+
+
+def _col(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+class FakeWorksheet:
+    """值一律存成字串，跟 Sheets API 回傳的一樣；calls 記錄每次 API 呼叫的方法名稱"""
+
+    def __init__(self, rows, title=""):
+        self.title = title
+        self.calls = []
+        self.rows = [[str(v) for v in r] for r in rows]
+        self.col_count = max(len(r) for r in rows)
+
+    def _cells(self, a1):
+        m = re.fullmatch(r"([A-Z]+)(\d+)(?::([A-Z]+)(\d*))?", a1)
+        c1, r1 = _col(m.group(1)), int(m.group(2))
+        c2 = _col(m.group(3) or m.group(1))
+        r2 = int(m.group(4)) if m.group(4) else (len(self.rows) if m.group(3) else r1)
+        return c1, r1, c2, r2
+
+    def _write(self, a1, values):
+        c1, r1, c2, _ = self._cells(a1)
+        assert c2 <= self.col_count, "超出工作表範圍"
+        for i, row_values in enumerate(values):
+            while len(self.rows) < r1 + i:
+                self.rows.append([])
+            row = self.rows[r1 - 1 + i]
+            row += [""] * (c1 - 1 + len(row_values) - len(row))
+            row[c1 - 1:c1 - 1 + len(row_values)] = [str(v) for v in row_values]
+
+    # ---------- 讀取 ----------
+    def get_all_values(self):
+        self.calls.append("get_all_values")
+        width = max(len(r) for r in self.rows)
+        return [r + [""] * (width - len(r)) for r in self.rows]
+
+    def get(self, a1):
+        c1, r1, c2, r2 = self._cells(a1)
+        out = [r[c1 - 1:c2] for r in self.rows[r1 - 1:r2]]
+        while out and not any(out[-1]):
+            out.pop()
+        return out
+
+    def batch_get(self, ranges):
+        self.calls.append("batch_get")
+        return [self.get(r) for r in ranges]
+
+    def acell(self, a1):
+        class Cell:
+            value = (self.get(a1) or [[""]])[0][0]
+        return Cell()
+
+    # ---------- 寫入 ----------
+    def add_cols(self, n):
+        self.col_count += n
+
+    def update(self, range_name, values):
+        self._write(range_name, values)
+
+    def batch_update(self, data):
+        self.calls.append("batch_update")
+        for d in data:
+            self._write(d["range"], d["values"])
+
+    def append_rows(self, rows, **kwargs):
+        self.calls.append("append_rows")
+        start = len(self.rows) + 1
+        self.rows += [[str(v) for v in r] for r in rows]
+        return {"updates": {"updatedRange": f"{self.title}!A{start}:A{len(self.rows)}"}}
+
+    def append_row(self, row, **kwargs):
+        return self.append_rows([row], **kwargs)
+
+    def delete_rows(self, start, end=None):
+        del self.rows[start - 1:(end or start)]
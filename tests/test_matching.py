@@ -0,0 +1,14 @@
+"""matching 的 bitmask 計算"""
+import numpy as np
+
+from matching import _popcount, _popcount_table
+
+
+def test_popcount_table_matches_bitwise_count():
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 2 ** 63, size=(7, 5), dtype=np.uint64) | np.uint64(1 << 63)
+    expected = np.array([[bin(int(v)).count("1") for v in row] for row in a], dtype=np.float32)
+    assert np.array_equal(_popcount_table(a), expected)
+    assert np.array_equal(_popcount(a), expected)
+    # 非連續的切片（例如廣播後的子陣列）也要正確
+    assert np.array_equal(_popcount_table(a[:, ::2]), expected[:, ::2])
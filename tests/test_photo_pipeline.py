@@ -0,0 +1,28 @@
+"""photo_pipeline：壞掉的照片一律變成 ValueError（頁面只接 ValueError）"""
+import io
+
+import pytest
+from PIL import Image
+
+pytest.importorskip("supabase")
+import photo_pipeline  # noqa: E402
+
+
+def _jpeg(size=(800, 600)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(buf, "JPEG", quality=95)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("data", [b"notanimage", _jpeg()[:400]])
+def test_undecodable_photo_raises_value_error(data):
+    # 截斷的 JPEG 檔頭正常，要到 convert / thumbnail 解碼像素時才出錯
+    with pytest.raises(ValueError):
+        photo_pipeline.prepare_photo(data)
+    with pytest.raises(ValueError):
+        photo_pipeline.fingerprint(data)
+
+
+def test_prepare_photo_resizes():
+    out = photo_pipeline.prepare_photo(_jpeg((4000, 3000)))
+    assert max(Image.open(io.BytesIO(out)).size) == photo_pipeline.MAX_EDGE
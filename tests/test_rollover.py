@@ -0,0 +1,33 @@
+"""rollover：錯過的下架要補跑（記憶體後端）"""
+from datetime import datetime
+
+from rollover import TAIWAN_TZ, missed_rollover, run_rollover
+from storage.base import new_user_record
+from storage.memory import InMemoryRepository
+
+
+def _repo():
+    repo = InMemoryRepository()
+    repo.register_users([new_user_record(1, "victim", "甲", "0911000001")])
+    row_key, _ = repo.find_by_id(1)
+    repo.upsert_demand(row_key, {"mission_name": "清掃", "demand_worker": 2, "date": "2026-10-17"})
+    return repo
+
+
+def test_no_history_no_catch_up():
+    assert missed_rollover(_repo(), datetime(2026, 10, 18, 9, tzinfo=TAIWAN_TZ)) is None
+
+
+def test_missed_rollover_runs_with_its_own_date():
+    repo = _repo()
+    repo.rollover_dates.add("2026-10-16")
+
+    # 10/17 20:00 時 process 沒在跑，10/18 早上啟動：補跑 10/17 的下架
+    missed = missed_rollover(repo, datetime(2026, 10, 18, 9, tzinfo=TAIWAN_TZ))
+    assert missed == datetime(2026, 10, 17, 20, tzinfo=TAIWAN_TZ)
+    assert run_rollover(repo, missed) == 1
+    assert repo.archive[0]["archive_date"] == "2026-10-17"
+
+    assert missed_rollover(repo, datetime(2026, 10, 18, 9, tzinfo=TAIWAN_TZ)) is None
+    # 當天 20:00 之後啟動、當天的下架還沒做：補跑當天的
+    assert missed_rollover(repo, datetime(2026, 10, 18, 20, 5, tzinfo=TAIWAN_TZ)).day == 18
@@ -0,0 +1,85 @@
+"""sheet_store 快照：用記憶體裡的假工作表測試，不連 Google Sheets"""
+import pandas as pd
+import pytest
+
+import sheet_store
+from fake_sheets import FakeWorksheet
+
+OLD_HEADER = sheet_store.VOL_COLUMNS[:17]   # 加上 lat / lng（R:S）之前的標題列
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    victim = ["1", "victim", "王小明", "0912345678", "", "清掃", "花蓮縣光復鄉", "", "3", "0", "",
+              "", "", "", "", "", "2026-10-18"]
+    vol = FakeWorksheet([OLD_HEADER, victim])
+    assignments = FakeWorksheet([sheet_store.ASSIGNMENT_COLUMNS])
+    holder = sheet_store._Snapshot()
+    monkeypatch.setattr(sheet_store, "get_worksheet", lambda name=None: vol)
+    monkeypatch.setattr(sheet_store, "get_assignments_worksheet", lambda: assignments)
+    monkeypatch.setattr(sheet_store, "_get_snapshot_holder", lambda: holder)
+    return vol
+
+
+def test_header_migration_adds_lat_lng(sheet):
+    sheet_store.load_snapshot()
+    assert sheet.rows[0] == sheet_store.VOL_COLUMNS
+    assert sheet.col_count == len(sheet_store.VOL_COLUMNS)
+
+    # 已經齊全時不再寫入
+    before = [list(r) for r in sheet.rows]
+    sheet_store.invalidate_snapshot(full=True)
+    sheet_store.load_snapshot()
+    assert sheet.rows == before
+
+
+def test_coordinates_read_back_through_snapshot(sheet):
+    df = sheet_store.load_snapshot()
+    assert pd.isna(df.loc[0, "lat"])
+
+    # 與 SheetsRepository.upsert_demand 一樣寫 R:S，增量同步要讀得回來
+    sheet.update(range_name="R2:S2", values=[[23.66, 121.42]])
+    sheet_store.invalidate_snapshot(rows=[2])
+    df = sheet_store.load_snapshot()
+    assert df.loc[0, "lat"] == pytest.approx(23.66)
+    assert df.loc[0, "lng"] == pytest.approx(121.42)
+
+    # 整張重讀也一樣
+    sheet_store.invalidate_snapshot(full=True)
+    df = sheet_store.load_snapshot()
+    assert df.loc[0, "lat"] == pytest.approx(23.66)
+
+
+def test_batch_signup_uses_fixed_number_of_calls(sheet):
+    assignments = sheet_store.get_assignments_worksheet()
+    sheet_store.load_snapshot()
+    sheet.calls.clear()
+    assignments.calls.clear()
+
+    signups = [(1, 10 + i, f"志工{i}", f"092200000{i}") for i in range(4)] + [
+        (1, 10, "志工0", "0922000000"),     # 同一批重複
+        (99, 20, "志工9", "0922000009"),    # 沒有這個任務
+    ]
+    results = sheet_store.add_volunteers_to_missions(signups)
+    assert results == [True, True, True, "任務已額滿", False, "找不到指定任務在資料表中的列"]
+
+    row = dict(zip(sheet_store.VOL_COLUMNS, sheet.rows[1]))
+    assert row["selected_worker"] == "3"
+    assert row["accepted_volunteers"].splitlines() == ["志工0(000)", "志工1(001)", "志工2(002)"]
+    assert [r[:2] for r in assignments.rows[1:]] == [["1", "10"], ["1", "11"], ["1", "12"]]
+    assert sheet.calls == ["batch_get", "batch_update", "batch_get"]
+    assert assignments.calls == ["append_rows"]
+
+    # 已經報過的不會再寫
+    assert sheet_store.add_volunteers_to_missions([(1, 10, "志工0", "0922000000")]) == [False]
+
+
+def test_demand_ranges_skip_matching_and_photo():
+    # 表單送出不寫 J:K（媒合）與 N（照片），照片網址只由背景上傳寫回
+    from storage.sheets import column_runs
+    from storage.base import DEMAND_INPUT_COLUMNS
+
+    spans = [(sheet_store.col_letter(cols[0]), sheet_store.col_letter(cols[-1]))
+             for cols in column_runs(DEMAND_INPUT_COLUMNS)]
+    assert spans == [("F", "I"), ("L", "M"), ("O", "S")]
+    assert sheet_store.col_letter("photo") == "N"
@@ -0,0 +1,28 @@
+"""sheet_writer：寫入失敗要記 log，並留在 dead-letter 清單"""
+import logging
+
+import pytest
+
+import sheet_writer
+
+
+class BrokenWorksheet:
+    def batch_update(self, data):
+        raise RuntimeError("quota exhausted")
+
+
+def test_failed_batch_is_logged_and_kept(monkeypatch, caplog):
+    monkeypatch.setattr(sheet_writer, "get_worksheet", lambda name: BrokenWorksheet())
+    writer = sheet_writer.SheetWriter(flush_interval=0)
+    with caplog.at_level(logging.ERROR, logger="sheet_writer"):
+        futures = [writer.update_range("F12:I12", [["清掃", "花蓮縣", "", 3]]),
+                   writer.update_range("O12", [["x"]])]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(timeout=5)
+
+    assert "F12:I12" in caplog.text and "O12" in caplog.text
+    failed = writer.failed()
+    assert [f["range"] for f in failed] == ["F12:I12", "O12"]
+    assert failed[0]["values"] == [["清掃", "花蓮縣", "", 3]]
+    assert "quota exhausted" in failed[0]["error"]
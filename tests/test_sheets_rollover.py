@@ -0,0 +1,96 @@
+"""SheetsRepository.rollover_demands：重試與多個 process 同時執行（假工作表，不連 Google Sheets）"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import sheet_store
+import storage.sheets as sheets
+from fake_sheets import FakeWorksheet
+from rollover import RolloverBusy
+from storage.base import ARCHIVE_COLUMNS
+
+DAY = "2026-10-18"
+
+
+def _user(id_number, role, name, phone, mission="", demand=0, selected=0):
+    row = [""] * len(sheet_store.VOL_COLUMNS)
+    row[:5] = [id_number, role, name, phone, ""]
+    row[5], row[8], row[9] = mission, demand, selected
+    row[16] = DAY if mission else ""
+    return row
+
+
+@pytest.fixture
+def sheet(monkeypatch):
+    books = {
+        sheet_store.WORKSHEET_NAME: FakeWorksheet([sheet_store.VOL_COLUMNS, _user(1, "victim", "甲", "0911000001", "清掃", 3, 2),
+                                                   _user(2, "victim", "乙", "0911000002", "搬運", 2, 1),
+                                                   _user(3, "volunteer", "丙", "0911000003")], "vol"),
+        sheet_store.ASSIGNMENTS_WORKSHEET: FakeWorksheet([sheet_store.ASSIGNMENT_COLUMNS, [1, 3, "丙", "t"], [2, 3, "丙", "t"],
+                                                          [1, 4, "丁", "t"]], "assignments"),
+        sheets.ARCHIVE_WORKSHEET: FakeWorksheet([ARCHIVE_COLUMNS], "vol_archive"),
+        sheets.ROLLOVER_RUNS_WORKSHEET: FakeWorksheet([sheets.ROLLOVER_RUNS_COLUMNS], "rollover_runs"),
+    }
+    holder = sheet_store._Snapshot()
+    for module in (sheet_store, sheets):
+        monkeypatch.setattr(module, "get_worksheet", lambda name=sheet_store.WORKSHEET_NAME: books[name])
+        monkeypatch.setattr(module, "get_assignments_worksheet", lambda: books[sheet_store.ASSIGNMENTS_WORKSHEET])
+    monkeypatch.setattr(sheets, "get_or_create_worksheet", lambda name, header: books[name])
+    monkeypatch.setattr(sheet_store, "_get_snapshot_holder", lambda: holder)
+    return books
+
+
+def _repo(owner="p1"):
+    repo = sheets.SheetsRepository.__new__(sheets.SheetsRepository)
+    repo._owner = owner
+    return repo
+
+
+def test_rollover_runs_once_per_day(sheet):
+    repo = _repo()
+    assert repo.rollover_demands(DAY) == 2
+    assert len(sheet["vol_archive"].rows) == 3
+    assert sheet["assignments"].rows == [sheet_store.ASSIGNMENT_COLUMNS]
+    assert [r[5] for r in sheet["vol"].rows[1:]] == ["", "", ""]
+
+    # 同一天再跑一次（例如另一個 process 的排程）不會再封存
+    assert _repo("p2").rollover_demands(DAY) == 0
+    assert len(sheet["vol_archive"].rows) == 3
+
+
+def test_retry_after_failed_delete_cleans_assignments(sheet, monkeypatch):
+    assignments = sheet["assignments"]
+    real_delete = assignments.delete_rows
+    calls = []
+
+    def flaky_delete(start, end=None):
+        calls.append(start)
+        if len(calls) == 1:
+            real_delete(start, end)
+            raise ConnectionError("連線中斷")
+        real_delete(start, end)
+
+    # 讓報名關係分成兩段才刪得完：第一段刪完就失敗
+    assignments.rows.insert(3, ["", "", "", ""])
+    monkeypatch.setattr(assignments, "delete_rows", flaky_delete)
+    repo = _repo()
+    with pytest.raises(ConnectionError):
+        repo.rollover_demands(DAY)
+
+    # 需求已經清空；重試要把剩下的報名關係刪掉，也不能重複封存
+    assert repo.rollover_demands(DAY) == 0
+    assert [r for r in assignments.rows[1:] if any(r)] == []
+    assert len(sheet["vol_archive"].rows) == 3
+
+
+def test_other_process_holds_lease(sheet):
+    runs = sheet["rollover_runs"]
+    now = datetime.now(timezone.utc)
+    runs.append_row([DAY, "p2", now.isoformat(timespec="seconds"), "claimed"])
+    with pytest.raises(RolloverBusy):
+        _repo().rollover_demands(DAY)
+    assert len(sheet["vol_archive"].rows) == 1
+
+    # 持有租約的 process 當掉：過期之後就可以接手
+    runs.rows[1][2] = (now - sheets.ROLLOVER_LEASE_TTL - timedelta(minutes=1)).isoformat(timespec="seconds")
+    assert _repo().rollover_demands(DAY) == 2